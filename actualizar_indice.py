@@ -0,0 +1,381 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from codificadores import config_codificador_entorno, crear_codificador
+from construir_indice import procesar_documentos
+from formato_indice import abrir_indice, concatenar_metadata, guardar_indice
+from indices_ann import crear_indice_faiss, vectores_exactos
+from motor_busqueda import NOMBRE_MODELO
+
+DIRECTORIO_EMBEDDINGS = 'embeddings'
+
+# ---------------- Almacén de embeddings por contenido ----------------
+
+def hash_oracion(oracion_limpia):
+    """Clave del almacén: SHA-1 de la oración limpia en UTF-8."""
+    return hashlib.sha1(str(oracion_limpia).encode('utf-8')).hexdigest()
+
+
+class AlmacenEmbeddings:
+    """
+    Embeddings del corpus indexados por el hash de la oración limpia.
+
+    Vive en la raíz del índice, fuera de las generaciones, para que cada
+    actualización solo codifique las oraciones que nunca se vieron.
+    """
+
+    def __init__(self, ruta_indice, nombre_modelo=NOMBRE_MODELO):
+        """
+        Parámetros:
+            ruta_indice (str): Directorio raíz del índice.
+            nombre_modelo (str): Modelo con el que se calcularon los embeddings.
+        """
+        self.directorio = os.path.join(ruta_indice, DIRECTORIO_EMBEDDINGS)
+        self.nombre_modelo = nombre_modelo
+        self._posicion = {}
+        self._vectores = []
+        self._nuevos = 0
+
+        ruta_info = os.path.join(self.directorio, 'info.json')
+        if not os.path.exists(ruta_info):
+            return
+        with open(ruta_info, encoding='utf-8') as f:
+            info = json.load(f)
+        # Embeddings de otro modelo no son comparables: se descartan
+        if info.get('modelo') != nombre_modelo:
+            print(f"⚠️ El almacén de embeddings es del modelo {info.get('modelo')}; se ignora")
+            return
+        claves = np.load(os.path.join(self.directorio, 'claves.npy'))
+        vectores = np.load(os.path.join(self.directorio, 'vectores.npy'))
+        self._posicion = {clave.decode('ascii'): i for i, clave in enumerate(claves)}
+        self._vectores = [vectores]
+
+    def __len__(self):
+        return len(self._posicion)
+
+    def obtener(self, claves):
+        """
+        Busca los embeddings de varias claves.
+
+        Parámetros:
+            claves (list): Hashes de oraciones.
+
+        Retorna:
+            tuple: (posiciones en el almacén o -1, máscara de claves encontradas).
+        """
+        posiciones = np.array([self._posicion.get(clave, -1) for clave in claves], dtype=np.int64)
+        return posiciones, posiciones >= 0
+
+    def vectores(self, posiciones):
+        """Embeddings (n x d, float32) de las posiciones dadas."""
+        self._consolidar()
+        return self._vectores[0][posiciones] if len(posiciones) else np.empty((0, 0), dtype='float32')
+
+    def agregar(self, claves, vectores):
+        """
+        Agrega embeddings nuevos (las claves ya presentes se ignoran).
+
+        Parámetros:
+            claves (list): Hashes de oraciones.
+            vectores (np.ndarray): Embeddings correspondientes (n x d).
+        """
+        vectores = np.asarray(vectores, dtype='float32')
+        seleccion = []
+        for i, clave in enumerate(claves):
+            if clave not in self._posicion:
+                self._posicion[clave] = len(self._posicion)
+                seleccion.append(i)
+        if seleccion:
+            self._vectores.append(vectores[seleccion])
+            self._nuevos += len(seleccion)
+
+    def guardar(self):
+        """Escribe el almacén si tiene embeddings nuevos, reemplazando los archivos de forma atómica."""
+        if not self._nuevos:
+            return
+        self._consolidar()
+        os.makedirs(self.directorio, exist_ok=True)
+        claves = np.array(sorted(self._posicion, key=self._posicion.get), dtype='S40')
+        for nombre, arreglo in (('claves', claves), ('vectores', self._vectores[0])):
+            temporal = os.path.join(self.directorio, f'{nombre}.tmp.npy')
+            np.save(temporal, arreglo)
+            os.replace(temporal, os.path.join(self.directorio, f'{nombre}.npy'))
+        with open(os.path.join(self.directorio, 'info.json'), 'w', encoding='utf-8') as f:
+            json.dump({'modelo': self.nombre_modelo, 'num_embeddings': len(self._posicion)}, f)
+        self._nuevos = 0
+
+    def _consolidar(self):
+        if len(self._vectores) > 1:
+            self._vectores = [np.vstack(self._vectores)]
+
+# ---------------- Selección de documentos ----------------
+
+def seleccionar_filas(metadata, listas=None, tipos=None, ids_oracion=None):
+    """
+    Marca las filas que cumplen todos los criterios indicados.
+
+    Parámetros:
+        metadata (list | MetadataColumnar): Metadata del sistema.
+        listas (list, opcional): Listas electorales.
+        tipos (list, opcional): Tipos de documento (plan, entrevista, biografia).
+        ids_oracion (list, opcional): Identificadores de oración.
+
+    Retorna:
+        np.ndarray: Máscara booleana por fila (todo False si no hay criterios).
+    """
+    if not (listas or tipos or ids_oracion):
+        return np.zeros(len(metadata), dtype=bool)
+
+    listas = {str(lista) for lista in listas or []}
+    tipos = {str(tipo).lower() for tipo in tipos or []}
+    ids_oracion = {str(id_oracion) for id_oracion in ids_oracion or []}
+    mascara = np.ones(len(metadata), dtype=bool)
+    for fila, meta in enumerate(metadata):
+        if listas and str(meta.get('lista')) not in listas:
+            mascara[fila] = False
+        elif tipos and str(meta.get('tipo')).lower() not in tipos:
+            mascara[fila] = False
+        elif ids_oracion and str(meta.get('id_oracion')) not in ids_oracion:
+            mascara[fila] = False
+    return mascara
+
+# ---------------- TF-IDF incremental ----------------
+
+def vocabulario_cambia(vectorizer, tfidf_matrix, textos_conservados, filas_conservadas, textos_nuevos):
+    """
+    Determina si reajustar el vectorizador sobre el corpus actualizado cambiaría su vocabulario.
+
+    La frecuencia documental de los términos del vocabulario se obtiene de la matriz
+    TF-IDF. Para los términos nuevos solo se analizan las oraciones conservadas que
+    contienen la palabra más larga del término.
+
+    Parámetros:
+        vectorizer (TfidfVectorizer): Vectorizador ajustado.
+        tfidf_matrix (sparse matrix): Matriz TF-IDF actual.
+        textos_conservados (np.ndarray): Oraciones limpias que se mantienen.
+        filas_conservadas (np.ndarray): Filas de la matriz que se mantienen.
+        textos_nuevos (list): Oraciones limpias que se agregan.
+
+    Retorna:
+        bool: True si el vocabulario cambiaría.
+    """
+    min_df, max_df = vectorizer.min_df, vectorizer.max_df
+    num_docs = len(textos_conservados) + len(textos_nuevos)
+    if isinstance(min_df, float) or (isinstance(max_df, float) and max_df < 1.0) or vectorizer.max_features:
+        # Los umbrales relativos dependen del tamaño del corpus: se reajusta siempre
+        return True
+    if num_docs == 0:
+        return True
+
+    analizador = vectorizer.build_analyzer()
+    terminos_nuevos = [set(analizador(texto)) for texto in textos_nuevos]
+
+    # Términos del vocabulario: frecuencia documental conservada + la de los documentos nuevos
+    conservada = sparse.csr_matrix(tfidf_matrix)[filas_conservadas]
+    frecuencia = np.bincount(conservada.indices, minlength=len(vectorizer.vocabulary_))
+    desconocidos = {}
+    for terminos in terminos_nuevos:
+        for termino in terminos:
+            columna = vectorizer.vocabulary_.get(termino)
+            if columna is None:
+                desconocidos[termino] = desconocidos.get(termino, 0) + 1
+            else:
+                frecuencia[columna] += 1
+    if frecuencia.min(initial=min_df) < min_df:
+        return True
+    maximo = max_df if isinstance(max_df, (int, np.integer)) else num_docs
+    if frecuencia.max(initial=0) > maximo:
+        return True
+
+    # Términos fuera del vocabulario: entran si alcanzan min_df contando el corpus conservado.
+    # Cada palabra de un término aparece tal cual en el texto preprocesado, así que basta
+    # analizar los documentos que contienen su palabra más larga.
+    preprocesador = vectorizer.build_preprocessor()
+    textos_preprocesados = np.asarray([preprocesador(texto) for texto in textos_conservados], dtype=str)
+    for termino, en_nuevos in desconocidos.items():
+        if en_nuevos >= min_df:
+            return True
+        faltan = min_df - en_nuevos
+        palabra = max(termino.split(' '), key=len)
+        for i in np.flatnonzero(np.char.find(textos_preprocesados, palabra) >= 0):
+            if termino in analizador(textos_conservados[i]):
+                faltan -= 1
+                if faltan == 0:
+                    return True
+    return False
+
+
+def actualizar_tfidf(vectorizer, tfidf_matrix, textos_conservados, filas_conservadas, textos_nuevos):
+    """
+    Obtiene el vectorizador y la matriz TF-IDF del corpus actualizado.
+
+    Si el vocabulario no cambia se conservan el vectorizador y sus pesos IDF: las
+    filas existentes se copian y solo se transforman las oraciones nuevas.
+
+    Retorna:
+        tuple: (vectorizador, matriz TF-IDF, True si se reajustó).
+    """
+    if not vocabulario_cambia(vectorizer, tfidf_matrix, textos_conservados, filas_conservadas, textos_nuevos):
+        filas = sparse.csr_matrix(tfidf_matrix)[filas_conservadas]
+        if textos_nuevos:
+            filas = sparse.vstack([filas, vectorizer.transform(textos_nuevos)], format='csr')
+        return vectorizer, filas, False
+
+    nuevo = TfidfVectorizer(**vectorizer.get_params())
+    textos = list(textos_conservados) + list(textos_nuevos)
+    return nuevo, nuevo.fit_transform(textos), True
+
+# ---------------- Actualización del índice ----------------
+
+def actualizar_indice(ruta_indice, eliminar=None, textos_nuevos=(), metadata_nueva=(), modelo=None):
+    """
+    Escribe una nueva generación del índice quitando y agregando documentos, sin
+    volver a codificar las oraciones cuyo embedding ya está en el almacén.
+
+    Parámetros:
+        ruta_indice (str): Directorio raíz del índice (formato en disco).
+        eliminar (dict, opcional): Criterios de seleccionar_filas() (listas, tipos, ids_oracion).
+        textos_nuevos (list): Oraciones limpias a agregar.
+        metadata_nueva (list | MetadataColumnar): Metadata de cada oración a agregar.
+        modelo (CodificadorTorch | CodificadorOnnx, opcional): Codificador ya cargado.
+            Sin él se crea el del backend de las variables de entorno CODIFICADOR*.
+
+    Retorna:
+        dict: Resumen con filas eliminadas y agregadas, embeddings codificados,
+        si se reajustó el TF-IDF, ruta de la generación y segundos empleados.
+    """
+    inicio = time.perf_counter()
+    actual = abrir_indice(ruta_indice)
+    metadata = actual['metadata']
+    textos = np.asarray(list(actual['textos_validos']), dtype=object)
+
+    eliminadas = seleccionar_filas(metadata, **(eliminar or {}))
+    filas_conservadas = np.flatnonzero(~eliminadas)
+    textos_conservados = textos[filas_conservadas]
+    textos_nuevos = [str(texto) for texto in textos_nuevos]
+
+    # Embeddings: primero el almacén, luego los vectores exactos del índice actual y por último el modelo
+    almacen = AlmacenEmbeddings(ruta_indice)
+    claves_actuales = [hash_oracion(texto) for texto in textos]
+    index_actual = actual['index']
+    exacto = vectores_exactos(index_actual)
+    if exacto is not None:
+        # Todo el índice actual (también lo que se elimina) sirve para un reemplazo posterior
+        _, encontradas = almacen.obtener(claves_actuales)
+        sin_guardar = np.flatnonzero(~encontradas)
+        if len(sin_guardar):
+            almacen.agregar([claves_actuales[i] for i in sin_guardar], exacto.reconstruct_batch(sin_guardar))
+
+    claves = [claves_actuales[i] for i in filas_conservadas] + [hash_oracion(t) for t in textos_nuevos]
+    posiciones, encontradas = almacen.obtener(claves)
+    faltantes = np.flatnonzero(~encontradas)
+    codificadas = 0
+    if len(faltantes):
+        if modelo is None:
+            modelo = crear_codificador(almacen.nombre_modelo, config_codificador_entorno())
+        todos = list(textos_conservados) + textos_nuevos
+        # Las oraciones repetidas comparten clave y se codifican una sola vez
+        unicas = {claves[i]: todos[i] for i in faltantes}
+        codificadas = len(unicas)
+        print(f"Codificando {len(unicas)} oraciones nuevas...")
+        almacen.agregar(list(unicas), modelo.encode(list(unicas.values()), batch_size=32))
+        posiciones, _ = almacen.obtener(claves)
+    embeddings = np.ascontiguousarray(almacen.vectores(posiciones), dtype='float32')
+
+    # Índice FAISS: los índices entrenados conservan su entrenamiento
+    if len(embeddings) == 0:
+        raise ValueError("La actualización dejaría el índice sin documentos")
+    config_indice = actual.get('config_indice') or {'tipo': 'flat'}
+    # Los planos (también los cuantizados o con PCA) y HNSW se reconstruyen completos
+    if config_indice.get('tipo', 'flat') in ('flat', 'hnsw'):
+        index, config_indice = crear_indice_faiss(embeddings, config_indice)
+    else:
+        # Copia serializada: clone_index() comparte los vectores abiertos con mmap y reset() falla sobre ellos
+        index = faiss.deserialize_index(faiss.serialize_index(index_actual))
+        index.reset()
+        index.add(embeddings)
+
+    vectorizer, tfidf_matrix, reajustado = actualizar_tfidf(
+        actual['vectorizer'], actual['tfidf_matrix'], textos_conservados, filas_conservadas, textos_nuevos)
+
+    # Datos de relevancia de las filas conservadas, sin recalcularlos
+    textos_normalizados = actual['textos_normalizados']
+    nueva_metadata = concatenar_metadata([(metadata, filas_conservadas), (metadata_nueva, None)])
+    normalizados = [textos_normalizados[int(fila)] for fila in filas_conservadas]
+    num_palabras = np.asarray(actual['num_palabras'])[filas_conservadas]
+    if len(metadata_nueva):
+        from relevancia import precalcular_textos
+        normalizados_nuevos, palabras_nuevas = precalcular_textos(list(metadata_nueva))
+        normalizados += normalizados_nuevos
+        num_palabras = np.concatenate([num_palabras, palabras_nuevas])
+
+    directorio = guardar_indice({
+        'index': index,
+        'metadata': nueva_metadata,
+        'vectorizer': vectorizer,
+        'tfidf_matrix': tfidf_matrix,
+        'textos_validos': list(textos_conservados) + textos_nuevos,
+        'textos_normalizados': normalizados,
+        'num_palabras': num_palabras,
+        'config_indice': config_indice,
+    }, ruta_indice)
+    almacen.guardar()
+
+    return {
+        'eliminadas': int(eliminadas.sum()),
+        'agregadas': len(textos_nuevos),
+        'codificadas': codificadas,
+        'tfidf_reajustado': reajustado,
+        'generacion': directorio,
+        'segundos': time.perf_counter() - inicio,
+    }
+
+
+def _documentos_desde_csv(planes=None, biografias=None, entrevistas=None):
+    vacio = pd.DataFrame()
+    return procesar_documentos(
+        pd.read_csv(planes) if planes else vacio,
+        pd.read_csv(biografias) if biografias else vacio,
+        pd.read_csv(entrevistas) if entrevistas else vacio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualiza el índice en disco sin reconstruirlo desde cero")
+    parser.add_argument('operacion', choices=['agregar', 'reemplazar', 'eliminar'])
+    parser.add_argument('--indice', default='indice_busqueda', help="Directorio raíz del índice")
+    parser.add_argument('--lista', action='append', help="Lista electoral a eliminar o reemplazar")
+    parser.add_argument('--tipo', action='append', choices=['plan', 'entrevista', 'biografia'])
+    parser.add_argument('--id-oracion', action='append')
+    parser.add_argument('--planes', help="CSV con oraciones de planes de trabajo a agregar")
+    parser.add_argument('--biografias', help="CSV con oraciones de biografías a agregar")
+    parser.add_argument('--entrevistas', help="CSV con oraciones de entrevistas a agregar")
+    args = parser.parse_args()
+
+    criterios = {'listas': args.lista, 'tipos': args.tipo, 'ids_oracion': args.id_oracion}
+    hay_criterios = any(criterios.values())
+    hay_csv = any((args.planes, args.biografias, args.entrevistas))
+    if args.operacion in ('reemplazar', 'eliminar') and not hay_criterios:
+        parser.error(f"'{args.operacion}' requiere --lista, --tipo o --id-oracion")
+    if args.operacion in ('agregar', 'reemplazar') and not hay_csv:
+        parser.error(f"'{args.operacion}' requiere --planes, --biografias o --entrevistas")
+
+    textos, metadata = ([], [])
+    if hay_csv:
+        textos, metadata = _documentos_desde_csv(args.planes, args.biografias, args.entrevistas)
+
+    resumen = actualizar_indice(args.indice,
+                                eliminar=criterios if args.operacion != 'agregar' else None,
+                                textos_nuevos=textos, metadata_nueva=metadata)
+    print(f"✅ Generación escrita en {resumen['generacion']}")
+    print(f"   Eliminadas: {resumen['eliminadas']} | agregadas: {resumen['agregadas']} | "
+          f"codificadas: {resumen['codificadas']} | TF-IDF reajustado: {resumen['tfidf_reajustado']} | "
+          f"{resumen['segundos']:.2f} s")
@@ -1,304 +1,404 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import re
-import pickle
-import faiss
-import unicodedata
+import logging
+import os
+import time
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import requests
 import json
 
+from cache_respuestas import CacheRespuestas, huella_prompt
+from cliente_llm import ClienteOllama, ClienteSaturado
+from codificadores import config_codificador_entorno
+from contexto_prompt import empaquetar_contexto, estimar_tokens
+from metricas import (DURACION_PETICIONES, PETICIONES, TOKENS_CONTEXTO, exponer_metricas, exponer_valores,
+                      iniciar_traza, registrar, terminar_traza, traza_actual, tramo)
+from motor_busqueda import MotorBusqueda, cargar_sistema
+from plan_consulta import QUERY_PATTERNS, clasificar_consulta, limpiar_query, planificar_consulta
+from prefiltro_tfidf import buscar_en_candidatos, buscar_lote_en_candidatos
+
 app = Flask(__name__)
 CORS(app)
 
+# Los mensajes de progreso de la búsqueda son de nivel DEBUG: con el nivel por
+# defecto (WARNING) no se formatean ni se escriben en el camino de cada petición.
+# El motor de búsqueda registra con su propio logger, al mismo nivel que la app
+log = logging.getLogger('app')
+for nombre_logger in ('app', 'motor_busqueda'):
+    logging.getLogger(nombre_logger).setLevel(os.environ.get('NIVEL_LOG', 'WARNING').upper())
+
+# Con TRAZAR_PETICIONES=1 se registra (con nivel INFO) la traza de todas las
+# peticiones, no solo de las que la piden con la cabecera X-Traza: 1 o ?traza=1
+TRAZAR_PETICIONES = os.environ.get('TRAZAR_PETICIONES') == '1'
+
 # ---------------- Cargar y preparar el sistema de búsqueda ----------------
 
-def cargar_sistema():
+# El motor conserva el índice y el modelo en memoria durante toda la vida del
+# proceso y recarga el sistema en segundo plano cuando cambia el archivo.
+# Se prefiere el formato en disco (mmap) cuando existe; si no, el pickle.
+# Las consultas se codifican con PyTorch salvo que CODIFICADOR=onnx indique el
+# grafo exportado por codificadores.py (CODIFICADOR_INT8=1 para el cuantizado).
+RUTA_INDICE = 'indice_busqueda' if os.path.isdir('indice_busqueda') else 'sistema_busqueda.pkl'
+motor = MotorBusqueda(RUTA_INDICE, config_codificador=config_codificador_entorno())
+
+# ---------------- Función de búsqueda de documentos ----------------
+def buscar(query, k=5, umbral_similitud=0.3):
     """
-    Carga el sistema de búsqueda deserializando el índice FAISS y la metadata almacenada.
+    Busca los documentos más relevantes en la base de datos utilizando coincidencias exactas y búsqueda semántica.
+    Los resultados se guardan en cache por consulta normalizada, partición, k, umbral y generación del índice.
+    
+    Parámetros:
+        query (str | PlanConsulta): Consulta del usuario o su plan ya calculado.
+        k (int): Número de resultados a devolver.
+        umbral_similitud (float): Umbral de similitud para considerar documentos relevantes.
     
     Retorna:
-        dict: Diccionario con los datos del sistema de búsqueda.
+        list: Lista de documentos relevantes ordenados por relevancia.
     """
+    generacion = motor.generacion()
+    
+    if generacion is None:
+        log.error("❌ Sistema de búsqueda no inicializado")
+        return []
+
+    plan = planificar_consulta(query)
+    log.debug("🔍 Query original: %s", plan.texto)
+
+    clave = _clave_resultados(plan, k, umbral_similitud, generacion)
+    en_cache = motor.cache_resultados.obtener(clave)
+    if en_cache is not None:
+        log.debug("⚡ Resultados obtenidos de la cache")
+        return [dict(resultado) for resultado in en_cache]
+    
     try:
-        with open('sistema_busqueda.pkl', 'rb') as f:
-            data = pickle.load(f)
-        data['index'] = faiss.deserialize_index(data['index'])
-        return data
+        resultados = _buscar_en_sistema(plan, generacion.sistema, k, umbral_similitud)
     except Exception as e:
-        print(f"Error al cargar el sistema: {e}")
-        return None
+        log.error("❌ Error en búsqueda: %s", e)
+        return []
+
+    motor.cache_resultados.guardar(clave, resultados)
+    return [dict(resultado) for resultado in resultados]
+
 
-# ---------------- Funciones de procesamiento de texto ----------------
+def _clave_resultados(plan, k, umbral_similitud, generacion):
+    """
+    Clave de la cache de resultados. El plan de una consulta ajustada puede heredar
+    la partición (candidato y tipo de documento) de la consulta original, así que
+    el mismo texto normalizado no basta para identificar la búsqueda.
+    """
+    return (plan.normalizada, plan.candidato, plan.tipo_documento, k, umbral_similitud, generacion.version)
 
-def normalizar_texto(texto):
+
+def buscar_lote(queries, k=5, umbral_similitud=0.3):
     """
-    Normaliza el texto eliminando tildes, caracteres especiales y convirtiéndolo a minúsculas.
+    Busca los documentos de varias consultas a la vez. Las consultas que necesitan
+    búsqueda semántica se codifican con una sola llamada al modelo y se buscan en
+    una sola pasada sobre el índice. Cada resultado es el mismo que devolvería buscar().
     
     Parámetros:
-        texto (str): Texto a normalizar.
+        queries (list): Consultas del usuario (texto o PlanConsulta).
+        k (int): Número de resultados a devolver por consulta.
+        umbral_similitud (float): Umbral de similitud para considerar documentos relevantes.
     
     Retorna:
-        str: Texto normalizado.
+        list: Por consulta, la lista de documentos relevantes ordenados por relevancia.
     """
-    if not isinstance(texto, str):
-        return ""
-    texto = texto.lower()
-    texto = ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
-    texto = re.sub(r'[^\w\s]', ' ', texto)
-    texto = re.sub(r'\s+', ' ', texto)
-    return texto.strip()
+    generacion = motor.generacion()
+    
+    if generacion is None:
+        log.error("❌ Sistema de búsqueda no inicializado")
+        return [[] for _ in queries]
+
+    log.debug("🔍 Lote de %d consultas", len(queries))
+
+    planes = [planificar_consulta(query) for query in queries]
+    resultados = [None] * len(queries)
+    claves = [_clave_resultados(plan, k, umbral_similitud, generacion) for plan in planes]
+    pendientes = []
+    for i, clave in enumerate(claves):
+        en_cache = motor.cache_resultados.obtener(clave)
+        if en_cache is not None:
+            resultados[i] = en_cache
+        else:
+            pendientes.append(i)
+
+    if len(pendientes) < len(queries):
+        log.debug("⚡ %d consultas obtenidas de la cache", len(queries) - len(pendientes))
+
+    if pendientes:
+        try:
+            nuevos = _buscar_lote_en_sistema([planes[i] for i in pendientes], generacion.sistema,
+                                             k, umbral_similitud)
+        except Exception as e:
+            log.error("❌ Error en búsqueda por lote: %s", e)
+            nuevos = [[] for _ in pendientes]
+        else:
+            for i, resultado in zip(pendientes, nuevos):
+                motor.cache_resultados.guardar(claves[i], resultado)
+        for i, resultado in zip(pendientes, nuevos):
+            resultados[i] = resultado
 
-# ---------------- Función para verificar nombres de candidatos ----------------
+    return [[dict(resultado) for resultado in lista] for lista in resultados]
 
-def es_nombre_presidente(query, presidente):
+
+def _ordenar_resultados(candidatos, plan, k):
     """
-    Verifica si el nombre en la consulta coincide con el nombre de un candidato.
-    
+    Ordena por relevancia (dando prioridad a biografías si corresponde), corta en k
+    y arma el contexto solo de los resultados que quedan.
+
     Parámetros:
-        query (str): Consulta del usuario.
-        presidente (str): Nombre del candidato.
+        candidatos (list): Pares (resultado, fila de la metadata).
+    """
+    def clave_ordenamiento(par):
+        x = par[0]
+        tipo_peso = 1.0
+        if plan.es_consulta_biografia:
+            tipo_peso = 3.0 if x['tipo'].lower() == 'biografia' else 1.0
+        return (-tipo_peso * x['relevancia'], x['distancia_ajustada'])
+
+    resultados = []
+    for resultado, meta in sorted(candidatos, key=clave_ordenamiento)[:k]:
+        resultado['texto_contexto'] = meta['texto_contexto']
+        # Posición de cada oración del contexto: el empaquetado del prompt reconoce
+        # con ella las ventanas que se solapan o son contiguas
+        if hasattr(meta, 'oraciones_contexto'):
+            resultado['oraciones_contexto'] = meta.oraciones_contexto()
+        resultados.append(resultado)
+    return resultados
+
+
+def _crear_resultado(meta, distancia, relevancia, distancia_ajustada):
+    """
+    Arma el diccionario de resultado de una fila de la metadata. El contexto
+    queda pendiente hasta que _ordenar_resultados() decide qué filas se devuelven.
+    """
+    resultado = {
+        'distancia_original': distancia,
+        'relevancia': relevancia,
+        'distancia_ajustada': distancia_ajustada,
+        'texto_original': meta['texto_original'],
+        'texto_contexto': None,
+        'tipo': meta['tipo'],
+        'lista': meta['lista'],
+        'partido': meta['partido'],
+        'presidente': meta['presidente'],
+        'id_oracion': meta['id_oracion']
+    }
+    if meta['tipo'] == 'entrevista':
+        resultado.update({
+            'numero_entrevista': meta['numero_entrevista'],
+            'descripcion': meta['descripcion'],
+            'tema': meta['tema']
+        })
+    return resultado
+
+
+def _mostrar_preview(titulo, documentos):
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+    lineas = [f"📝 Preview de documentos por {titulo}:"]
+    for i, doc in enumerate(documentos[:5], 1):
+        lineas.extend([
+            f"\nDocumento {i}:",
+            f"- Presidente: {doc['presidente']}",
+            f"- Tipo: {doc['tipo']}",
+            f"- Relevancia: {doc['relevancia']:.4f}",
+            f"- Partido: {doc['partido']}",
+        ])
+    log.debug("\n".join(lineas))
+
+
+def _buscar_exactos(plan, sistema, k):
+    """
+    Busca coincidencias exactas por nombre de candidato usando el índice de nombres normalizados.
     
     Retorna:
-        bool: True si el nombre coincide, False en caso contrario.
+        list: Resultados ordenados (vacía si no hay coincidencias exactas).
     """
-    query_norm = normalizar_texto(query)
-    presidente_norm = normalizar_texto(presidente)
-    query_words = set(query_norm.split())
-    presidente_words = set(presidente_norm.split())
-    palabras_coincidentes = query_words.intersection(presidente_words)
-    return query_norm in presidente_norm or presidente_norm in query_norm or len(palabras_coincidentes) >= 2
+    resultados_exactos = []
+    with tramo('coincidencia_exacta'):
+        filas_exactas = sistema['indices'].filas_presidente(plan.nombre_buscado)
+    if len(filas_exactas) == 0:
+        return []
+
+    with tramo('reordenamiento'):
+        relevancias = sistema['relevancia'].puntuar(plan.texto, filas_exactas, plan.normalizada, plan.palabras)
+        for idx, relevancia in zip(filas_exactas, relevancias):
+            meta = sistema['metadata'][idx]
+
+            # Aumentar relevancia para biografías si es consulta de biografía
+            if plan.es_consulta_biografia and meta['tipo'].lower() == 'biografia':
+                relevancia *= 3.0
+            elif plan.tipo == 'partido_candidato':
+                relevancia *= 2.0  # Dar más peso a documentos del candidato buscado
 
-# ---------------- Cálculo de relevancia de documentos ----------------
+            resultados_exactos.append((_crear_resultado(meta, 0, relevancia, 0), meta))
 
-def calcular_relevancia(query, texto, meta):
+        resultados_ordenados = _ordenar_resultados(resultados_exactos, plan, k)
+    log.debug("✅ Encontradas %d coincidencias exactas", len(resultados_exactos))
+    _mostrar_preview("coincidencia exacta", resultados_ordenados)
+    return resultados_ordenados
+
+
+def _particion(plan, sistema):
     """
-    Calcula un puntaje de relevancia basado en la coincidencia de palabras clave,
-    el tipo de documento, la exactitud y la posición de las palabras clave.
-    
-    Parámetros:
-        query (str): Consulta del usuario.
-        texto (str): Texto del documento.
-        meta (dict): Metadata del documento.
-    
+    Filas de la partición del índice a la que se refiere la consulta: las del candidato
+    nombrado, las del tipo de documento (biografía o entrevista) o ambas.
+
     Retorna:
-        float: Puntaje de relevancia del documento.
+        np.ndarray: Filas ordenadas de la partición, o None para buscar en todo el índice.
     """
-    factores = {'palabras_clave': 0, 'exactitud': 0, 'tipo_doc': 0, 'posicion': 0, 'longitud': 0}
-    texto_norm = normalizar_texto(texto)
-    query_norm = normalizar_texto(query)
-    query_words = set(query_norm.split())
-    palabras_encontradas = sum(1 for word in query_words if word in texto_norm)
-    factores['palabras_clave'] = palabras_encontradas / len(query_words) if query_words else 0
+    indices = sistema['indices']
+    codigos = indices.codigos_candidato(plan.candidato) if plan.candidato else None
+    # Una consulta de partido sin candidato reconocible no tiene resultados, como antes;
+    # las demás buscan en todo el índice (o en el tipo de documento)
+    if not codigos and plan.tipo != 'partido_candidato':
+        codigos = None
+    if codigos is None and plan.tipo_documento is None:
+        return None
+    return indices.filas_particion(codigos, plan.tipo_documento)
 
-    # Verificar coincidencia exacta
-    if query_norm in texto_norm:
-        factores['exactitud'] = 1.0
 
-    # Pesos por tipo de documento
-    pesos_tipo = {'plan': 1.3, 'entrevista': 1.2, 'biografia': 1.0}
-    peso_base = pesos_tipo.get(meta.get('tipo', ''), 1.0)
+def _candidatos_semanticos(plan, sistema, umbral_similitud, k):
+    """
+    Obtiene del índice invertido TF-IDF las filas que restringen la búsqueda semántica.
 
-    # Ajuste para biografías con coincidencia de nombre
-    if meta.get('tipo') == 'biografia' and es_nombre_presidente(query, meta.get('presidente', '')):
-        peso_base *= 2.5
-        factores['exactitud'] = 1.0
+    Si la consulta se refiere a un candidato o a un tipo de documento, solo son
+    candidatas las filas de esa partición; cuando el prefiltro deja menos de k,
+    se busca en toda la partición.
+    
+    Retorna:
+        np.ndarray: Filas candidatas ordenadas por similitud TF-IDF.
+    """
+    log.debug("⚠️ No se encontraron coincidencias exactas, usando búsqueda semántica...")
 
-    factores['tipo_doc'] = peso_base
+    with tramo('particion'):
+        particion = _particion(plan, sistema)
+    filtro = None
+    if particion is not None:
+        filtro = lambda filas: sistema['indices'].mascara_filas(filas, particion)
 
-    # Posición de las palabras clave
-    primera_aparicion = min((texto_norm.find(word) for word in query_words if word in texto_norm), default=len(texto_norm))
-    factores['posicion'] = 1.0 - (primera_aparicion / len(texto_norm))
+    with tramo('tfidf'):
+        indices_relevantes, _ = sistema['prefiltro'].candidatos(plan.texto, umbral_similitud, filtro=filtro)
 
-    # Factor de longitud
-    palabras_texto = len(texto.split())
-    factores['longitud'] = 1.0 if 10 <= palabras_texto <= 50 else 0.8
+    if particion is not None and len(indices_relevantes) < k:
+        log.debug("🧩 Buscando en la partición completa (%d filas)", len(particion))
+        indices_relevantes = particion
+    if len(indices_relevantes) == 0:
+        log.debug("⚠️ Ningún documento supera el umbral de similitud")
+    return indices_relevantes
 
-    # Pesos finales
-    pesos = {'palabras_clave': 0.35, 'exactitud': 0.25, 'tipo_doc': 0.20, 'posicion': 0.15, 'longitud': 0.05}
-    puntaje = sum(factor * pesos[nombre] for nombre, factor in factores.items())
-    return puntaje
 
-# ---------------- Función de búsqueda de documentos ----------------
-def buscar(query, k=5, umbral_similitud=0.3):
+def _resultados_semanticos(plan, sistema, k, D, I):
     """
-    Busca los documentos más relevantes en la base de datos utilizando coincidencias exactas y búsqueda semántica.
+    Puntúa y ordena los vecinos devueltos por FAISS para una consulta.
     
     Parámetros:
-        query (str): Consulta del usuario.
-        k (int): Número de resultados a devolver.
-        umbral_similitud (float): Umbral de similitud para considerar documentos relevantes.
+        D (np.ndarray): Distancias (1 x k') devueltas por la búsqueda.
+        I (np.ndarray): Filas (1 x k') devueltas por la búsqueda, -1 donde no hay resultado.
     
     Retorna:
-        list: Lista de documentos relevantes ordenados por relevancia.
+        list: Resultados ordenados.
     """
-    sistema = cargar_sistema()
-    
-    if sistema is None:
-        print("❌ Sistema de búsqueda no inicializado")
-        return []
-
-    print(f"\n🔍 Query original: {query}")
-    
-    try:
-        
-        # Detectar tipo de consulta al inicio
-        tipo_consulta, param = identificar_tipo_consulta(query)
-        
-        # Extraer nombre de la consulta y determinar si es biografía
-        query_norm = normalizar_texto(query)
-        nombre_buscado = query_norm
-        es_consulta_biografia = False
-        
-        if tipo_consulta == 'biografia' or "biografia de" in query_norm or "quien es" in query_norm:
-            es_consulta_biografia = True
-            if "biografia de" in query_norm:
-                nombre_buscado = query_norm.replace("biografia de", "").strip()
-            elif "quien es" in query_norm:
-                nombre_buscado = query_norm.replace("quien es", "").strip()
-            else:
-                nombre_buscado = param
-        elif tipo_consulta == 'partido_candidato':
-            nombre_buscado = param
-            
-            
-        print(f"🎯 Buscando nombre: '{nombre_buscado}'")
-
-        # Definir función de ordenamiento aquí para que esté disponible en todo el scope
-        def clave_ordenamiento(x):
-            tipo_peso = 1.0
-            if es_consulta_biografia:
-                tipo_peso = 3.0 if x['tipo'].lower() == 'biografia' else 1.0
-            return (-tipo_peso * x['relevancia'], x['distancia_ajustada'])
-
-        # Primero buscar coincidencias exactas
-        resultados_exactos = []
-        for idx, meta in enumerate(sistema['metadata']):
-            nombre_presidente = normalizar_texto(meta['presidente'])
-            if nombre_presidente == nombre_buscado:
-                relevancia = calcular_relevancia(query, meta['texto_original'], meta)
-                
-                # Aumentar relevancia para biografías si es consulta de biografía
-                if es_consulta_biografia and meta['tipo'].lower() == 'biografia':
-                    relevancia *= 3.0
-                elif tipo_consulta == 'partido_candidato':
-                    relevancia *= 2.0  # Dar más peso a documentos del candidato buscado
-                
-                resultado = {
-                    'distancia_original': 0,
-                    'relevancia': relevancia,
-                    'distancia_ajustada': 0,
-                    'texto_original': meta['texto_original'],
-                    'texto_contexto': meta['texto_contexto'],
-                    'tipo': meta['tipo'],
-                    'lista': meta['lista'],
-                    'partido': meta['partido'],
-                    'presidente': meta['presidente'],
-                    'id_oracion': meta['id_oracion']
-                }
-                if meta['tipo'] == 'entrevista':
-                    resultado.update({
-                        'numero_entrevista': meta['numero_entrevista'],
-                        'descripcion': meta['descripcion'],
-                        'tema': meta['tema']
-                    })
-                resultados_exactos.append(resultado)
-
-        # Si hay coincidencias exactas, ordenar y retornar
-        if resultados_exactos:
-            resultados_ordenados = sorted(resultados_exactos, key=clave_ordenamiento)[:k]
-            
-            print(f"\n✅ Encontradas {len(resultados_exactos)} coincidencias exactas")
-            print("\n📝 Preview de documentos por coincidencia exacta:")
-            for i, doc in enumerate(resultados_ordenados[:5], 1):
-                print(f"\nDocumento {i}:")
-                print(f"- Presidente: {doc['presidente']}")
-                print(f"- Tipo: {doc['tipo']}")
-                print(f"- Relevancia: {doc['relevancia']:.4f}")
-                print(f"- Partido: {doc['partido']}")
-            
-            return resultados_ordenados
-
-        print("\n⚠️ No se encontraron coincidencias exactas, usando búsqueda semántica...")
-
-        # Si no hay coincidencias exactas, usar embeddings
-        query_vec = sistema['vectorizer'].transform([query])
-        similitudes = cosine_similarity(query_vec, sistema['tfidf_matrix']).flatten()
-        indices_relevantes = np.where(similitudes > umbral_similitud)[0]
-
-        if len(indices_relevantes) == 0:
-            print("⚠️ Ningún documento supera el umbral de similitud")
-            return []
-
-        model = SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
-        query_embedding = model.encode([query]).astype('float32')
-        D, I = sistema['index'].search(query_embedding, k*2)
+    with tramo('reordenamiento'):
+        relevancias = sistema['relevancia'].puntuar(plan.texto, np.maximum(I[0], 0), plan.normalizada, plan.palabras)
 
         resultados = []
         for i, (dist, idx) in enumerate(zip(D[0], I[0])):
-            if idx < len(sistema['metadata']):
+            if idx >= 0:
                 meta = sistema['metadata'][idx]
-                relevancia = calcular_relevancia(query, meta['texto_original'], meta)
-                
+                relevancia = relevancias[i]
+
                 # Ajustar relevancia según el tipo de consulta
-                if es_consulta_biografia and meta['tipo'].lower() == 'biografia':
+                if plan.es_consulta_biografia and meta['tipo'].lower() == 'biografia':
                     relevancia *= 3.0
-                elif tipo_consulta == 'partido_candidato':
-                    # Aumentar relevancia si el documento corresponde al candidato buscado
-                    nombre_presidente = normalizar_texto(meta['presidente'])
-                    if nombre_buscado in nombre_presidente or nombre_presidente in nombre_buscado:
-                        relevancia *= 2.0
-                    
-                    
+                elif plan.tipo == 'partido_candidato':
+                    relevancia *= 2.0  # Todos los candidatos corresponden al candidato buscado
+
                 dist_ajustada = dist / (relevancia + 0.1)
+                resultados.append((_crear_resultado(meta, dist, relevancia, dist_ajustada), meta))
 
-                resultado = {
-                    'distancia_original': dist,
-                    'relevancia': relevancia,
-                    'distancia_ajustada': dist_ajustada,
-                    'texto_original': meta['texto_original'],
-                    'texto_contexto': meta['texto_contexto'],
-                    'tipo': meta['tipo'],
-                    'lista': meta['lista'],
-                    'partido': meta['partido'],
-                    'presidente': meta['presidente'],
-                    'id_oracion': meta['id_oracion']
-                }
-
-                if meta['tipo'] == 'entrevista':
-                    resultado.update({
-                        'numero_entrevista': meta['numero_entrevista'],
-                        'descripcion': meta['descripcion'],
-                        'tema': meta['tema']
-                    })
-
-                resultados.append(resultado)
-
-        # Filtrar resultados si es una consulta de partido_candidato
-        if tipo_consulta == 'partido_candidato':
-            resultados = [r for r in resultados 
-                         if nombre_buscado in normalizar_texto(r['presidente']) 
-                         or normalizar_texto(r['presidente']) in nombre_buscado]
-            
         # Usar la misma función de ordenamiento para resultados semánticos
-        resultados_finales = sorted(resultados, key=clave_ordenamiento)[:k]
+        resultados_finales = _ordenar_resultados(resultados, plan, k)
+    _mostrar_preview("búsqueda semántica", resultados_finales)
+    return resultados_finales
+
 
-        print("\n📝 Preview de documentos por búsqueda semántica:")
-        for i, doc in enumerate(resultados_finales[:5], 1):
-            print(f"\nDocumento {i}:")
-            print(f"- Presidente: {doc['presidente']}")
-            print(f"- Tipo: {doc['tipo']}")
-            print(f"- Relevancia: {doc['relevancia']:.4f}")
-            print(f"- Partido: {doc['partido']}")
+def _buscar_en_sistema(plan, sistema, k, umbral_similitud):
+    """
+    Ejecuta la búsqueda (coincidencias exactas y luego semántica) sobre una generación del sistema.
+    
+    Parámetros:
+        plan (PlanConsulta): Plan de la consulta del usuario.
+        sistema (dict): Sistema de búsqueda de la generación vigente.
+        k (int): Número de resultados a devolver.
+        umbral_similitud (float): Umbral de similitud para considerar documentos relevantes.
+    
+    Retorna:
+        list: Lista de documentos relevantes ordenados por relevancia.
+    """
+    log.debug("🎯 Buscando nombre: '%s'", plan.nombre_buscado)
 
-        return resultados_finales
+    # Si hay coincidencias exactas, se devuelven sin búsqueda semántica
+    resultados_exactos = _buscar_exactos(plan, sistema, k)
+    if resultados_exactos:
+        return resultados_exactos
 
-    except Exception as e:
-        print(f"❌ Error en búsqueda: {e}")
+    indices_relevantes = _candidatos_semanticos(plan, sistema, umbral_similitud, k)
+    if len(indices_relevantes) == 0:
         return []
 
+    with tramo('codificacion'):
+        if plan.embedding is None:
+            plan.embedding = motor.codificar(plan.texto, plan.normalizada)
+    with tramo('faiss'):
+        D, I = buscar_en_candidatos(sistema['index'], plan.embedding, indices_relevantes, k*2,
+                                    sistema['config_indice'])
+    return _resultados_semanticos(plan, sistema, k, D, I)
+
+
+def _buscar_lote_en_sistema(planes, sistema, k, umbral_similitud):
+    """
+    Versión por lote de _buscar_en_sistema(): clasifica todas las consultas, resuelve
+    las coincidencias exactas y codifica y busca juntas las que requieren búsqueda semántica.
+    
+    Parámetros:
+        planes (list): Planes de las consultas del usuario.
+        sistema (dict): Sistema de búsqueda de la generación vigente.
+        k (int): Número de resultados a devolver por consulta.
+        umbral_similitud (float): Umbral de similitud para considerar documentos relevantes.
+    
+    Retorna:
+        list: Por consulta, la lista de documentos relevantes ordenados por relevancia.
+    """
+    resultados = [[] for _ in planes]
+    semanticas = []
+    for i, plan in enumerate(planes):
+        log.debug("🎯 Buscando nombre: '%s'", plan.nombre_buscado)
+        resultados[i] = _buscar_exactos(plan, sistema, k)
+        if resultados[i]:
+            continue
+        indices_relevantes = _candidatos_semanticos(plan, sistema, umbral_similitud, k)
+        if len(indices_relevantes) > 0:
+            semanticas.append((i, indices_relevantes))
+
+    if not semanticas:
+        return resultados
+
+    with tramo('codificacion'):
+        pendientes = [planes[i] for i, _ in semanticas if planes[i].embedding is None]
+        if pendientes:
+            embeddings = motor.codificar_lote([plan.texto for plan in pendientes],
+                                              [plan.normalizada for plan in pendientes])
+            for j, plan in enumerate(pendientes):
+                plan.embedding = embeddings[j:j + 1]
+    with tramo('faiss'):
+        vecinos = buscar_lote_en_candidatos(sistema['index'], np.vstack([planes[i].embedding for i, _ in semanticas]),
+                                            [filas for _, filas in semanticas], k*2,
+                                            sistema['config_indice'])
+    for (i, _), (D, I) in zip(semanticas, vecinos):
+        resultados[i] = _resultados_semanticos(planes[i], sistema, k, D, I)
+    return resultados
+
 # Función para mostrar resultados de búsqueda
 def mostrar_resultados(query, k=5):
     """
@@ -335,34 +435,7 @@ def mostrar_resultados(query, k=5):
             print(f"Descripción: {r['descripcion']}")
 
 # Nuevas funciones para generación de respuesta
-QUERY_PATTERNS = {
-    'biografia': [
-        r'^quien es (.+)',
-        r'^quién es (.+)',
-        r'^biografia de (.+)',
-    ],
-    'propuestas_verbo': [
-        r'(?:que|qué) candidatos? proponen? (.+)',
-        r'quienes? proponen? (.+)',
-    ],
-    'entrevista': [
-        r'(?:que|qué) temas se tratan en (?:la )?entrevista de (.+)',
-        r'(?:temas|tema) de (?:la )?entrevista de (.+)',
-    ],
-    'partido_candidato': [
-        r'(?:el )?candidato (.+?) (?:a )?(?:que|qué|cual|cuál) partido pertenece',
-        r'(.+?) (?:a )?(?:que|qué|cual|cuál) partido pertenece',
-        r'(?:de )?(?:que|qué|cual|cuál) partido es (.+)',
-        r'(.+?) partido' 
-    ],
-    'partido_nombre': [
-        r'(?:que|qué|cual|cuál) candidatos? pertenecen? (?:a)?(?:l)? partido (.+)',
-    ],
-    'propuestas_candidato': [
-        r'propuestas (?:del candidato )?(.+)',
-        r'(?:que|qué) propone (.+)',
-    ]
-}
+# QUERY_PATTERNS, limpiar_query() y el plan de la consulta están en plan_consulta.py
 
 # ------------------------------
 # Función para identificar el tipo de consulta
@@ -370,6 +443,7 @@ QUERY_PATTERNS = {
 def identificar_tipo_consulta(query):
     """
     Identifica el tipo de consulta del usuario según patrones predefinidos.
+    Dentro de una petición se usa el tipo del plan de la consulta, que ya lo calculó.
     
     Parámetros:
     query (str): Consulta de búsqueda ingresada por el usuario.
@@ -377,48 +451,34 @@ def identificar_tipo_consulta(query):
     Retorna:
     tuple: (tipo de consulta, parámetro identificado)
     """
-    query = query.lower().strip()
-    
-    for tipo, patrones in QUERY_PATTERNS.items():
-        for patron in patrones:
-            match = re.search(patron, query, re.IGNORECASE)
-            if match:
-                return tipo, match.group(1).strip()
-    
-    return "general", query
+    with tramo('clasificacion'):
+        return clasificar_consulta(query)
 
-# ------------------------------
-# Función para limpiar la consulta
-# ------------------------------
-def limpiar_query(query, tipo, param):
+
+def generar_prompt_especifico(tipo, query, documentos, presupuesto_tokens=None):
     """
-    Limpia y ajusta la consulta según el tipo identificado.
-    
+    Arma el prompt para el modelo con la pregunta, los documentos y las instrucciones del tipo de consulta.
+
     Parámetros:
-    query (str): Consulta de búsqueda original.
-    tipo (str): Tipo de consulta identificado.
-    param (str): Parámetro extraído de la consulta.
-    
+    tipo (str): Tipo de consulta.
+    query (str): Consulta del usuario.
+    documentos (list): Documentos relevantes, en orden de relevancia.
+    presupuesto_tokens (int, opcional): Tokens máximos del prompt. Por defecto, TOKENS_PROMPT.
+
     Retorna:
-    str: Consulta ajustada.
+    str: Prompt completo.
     """
-    if tipo == "biografia":
-        return param
-    elif tipo == "propuestas_verbo":
-        return f"propuestas {param}"
-    elif tipo == "entrevista":
-        return f"entrevista {param}"
-    elif tipo == "partido_candidato":
-        return f"{param} partido"
-    elif tipo == "partido_nombre":
-        return f"partido {param}"
-    elif tipo == "propuestas_candidato":
-        return f"propuestas {param}"
-    
-    return query.lower().strip()
+    return _armar_prompt(tipo, query, documentos, presupuesto_tokens)[0]
 
 
-def generar_prompt_especifico(tipo, query, documentos):
+def _armar_prompt(tipo, query, documentos, presupuesto_tokens=None):
+    """
+    Igual que generar_prompt_especifico(), pero devuelve además las estadísticas del
+    empaquetado del contexto (ver contexto_prompt.empaquetar_contexto()).
+
+    Retorna:
+    tuple: (prompt, estadísticas del contexto)
+    """
     prompt_base = f"""Actúa como un asistente político especializado.
 Genera una respuesta completa y directa basada en la siguiente información.
 
@@ -426,19 +486,6 @@ Pregunta: {query}
 
 Documentos disponibles:"""
 
-    for i, doc in enumerate(documentos, 1):
-        prompt_base += f"""
-
-[Documento {i}]
-TIPO: {doc['tipo'].upper()}
-CANDIDATO: {doc['presidente']}
-PARTIDO: {doc['partido']}
-
-CONTENIDO:
-{doc['texto_contexto']}"""
-        if doc['tipo'] == 'entrevista':
-            prompt_base += f"\nTEMA: {doc.get('tema', 'No especificado')}"
-
     instrucciones = {
         'biografia': """
 INSTRUCCIONES:
@@ -488,13 +535,13 @@ INSTRUCCIONES:
 4. NO hagas referencia a documentos"""
     }
 
-    prompt_base += instrucciones.get(tipo, """
+    cierre = instrucciones.get(tipo, """
 INSTRUCCIONES:
 1. Resume la información de forma clara y directa
 2. Organiza el contenido lógicamente
 3. NO hagas referencia a fuentes o documentos""")
 
-    prompt_base += """
+    cierre += """
 
 REGLAS IMPORTANTES:
 1. Escribe de forma fluida y natural
@@ -503,7 +550,62 @@ REGLAS IMPORTANTES:
 4. Presenta la información de manera directa y objetiva
 5. Mantén un tono profesional y claro"""
 
-    return prompt_base
+    # Los documentos ocupan lo que dejan la pregunta y las instrucciones; las ventanas
+    # de contexto solapadas se fusionan y las oraciones repetidas se incluyen una vez
+    if presupuesto_tokens is None:
+        presupuesto_tokens = TOKENS_PROMPT
+    presupuesto_documentos = max(presupuesto_tokens - estimar_tokens(prompt_base + cierre), 0)
+    contexto, estadisticas = empaquetar_contexto(documentos, presupuesto_documentos)
+    TOKENS_CONTEXTO.incrementar('enviados', cantidad=estadisticas['tokens'])
+    TOKENS_CONTEXTO.incrementar('ahorrados', cantidad=estadisticas['tokens_ahorrados'])
+    if estadisticas['documentos_omitidos']:
+        log.debug("✂️ %d documentos no caben en el presupuesto de %d tokens",
+                  estadisticas['documentos_omitidos'], presupuesto_tokens)
+
+    return prompt_base + contexto + cierre, estadisticas
+
+# ------------------------------
+# Configuración del modelo de IA (Ollama)
+# ------------------------------
+URL_OLLAMA = "http://localhost:11434/api/generate"
+MODELO_OLLAMA = "mistral"
+OPCIONES_OLLAMA = {
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "num_predict": 1024,
+    "num_thread": 6,   
+    "num_ctx": 4096,
+    "stop": ["</s>"],
+    "repeat_penalty": 1.1
+}
+
+# Tokens del prompt: lo que queda de num_ctx después de reservar la respuesta (num_predict).
+# Con TOKENS_PROMPT se puede reducir, para acortar el prefill del modelo en CPU
+TOKENS_PROMPT = int(os.environ.get('TOKENS_PROMPT', OPCIONES_OLLAMA['num_ctx'] - OPCIONES_OLLAMA['num_predict']))
+
+# Cliente compartido: pool de conexiones, timeouts, backoff y límite de generaciones simultáneas
+cliente_llm = ClienteOllama(URL_OLLAMA, MODELO_OLLAMA, OPCIONES_OLLAMA)
+
+# Cache en disco de las respuestas generadas, compartida por todos los workers.
+# CACHE_RESPUESTAS indica el archivo SQLite; vacío para desactivarla
+RUTA_CACHE_RESPUESTAS = os.environ.get('CACHE_RESPUESTAS', 'cache_respuestas.sqlite3')
+MAX_RESPUESTAS_CACHE = int(os.environ.get('MAX_RESPUESTAS_CACHE', 5000))
+TTL_RESPUESTAS_CACHE = float(os.environ.get('TTL_RESPUESTAS_CACHE', 7 * 24 * 3600))
+cache_respuestas = (CacheRespuestas(RUTA_CACHE_RESPUESTAS, MAX_RESPUESTAS_CACHE, TTL_RESPUESTAS_CACHE)
+                    if RUTA_CACHE_RESPUESTAS else None)
+
+
+def _clave_respuesta(prompt):
+    """
+    Clave de la respuesta en la cache: huella del prompt, el modelo y sus opciones,
+    y la generación vigente del índice. None si la cache está desactivada.
+    """
+    if cache_respuestas is None:
+        return None
+    generacion = motor.generacion()
+    if generacion is None:
+        return None
+    return huella_prompt(prompt, cliente_llm.modelo, cliente_llm.opciones), generacion.identificador
 
 # ------------------------------
 # Función para generar una respuesta utilizando un modelo de IA
@@ -513,52 +615,106 @@ def generar_respuesta_ollama(query, documentos, max_intentos=3):
     Genera una respuesta utilizando un modelo IA basado en la consulta del usuario y los documentos relevantes.
     
     Parámetros:
-    query (str): Consulta de búsqueda del usuario.
+    query (str | PlanConsulta): Consulta de búsqueda del usuario o su plan ya calculado.
     documentos (list): Lista de documentos relevantes.
     max_intentos (int): Número máximo de intentos de solicitud al modelo. Por defecto, 3.
     
     Retorna:
     str: Respuesta generada por la IA o mensaje de error.
     """
+    return _generar_respuesta(query, documentos, max_intentos)[0]
+
+
+def _generar_respuesta(query, documentos, max_intentos=3):
+    """
+    Igual que generar_respuesta_ollama(), pero indica además de dónde salió la respuesta.
+
+    Retorna:
+    tuple: (respuesta, origen, estadísticas del contexto del prompt), con origen
+    "cache", "modelo" o "fallback". Las estadísticas son None si no hay documentos.
+    """
     if not documentos:
-        return "No se encontraron documentos relevantes."
+        return "No se encontraron documentos relevantes.", "fallback", None
 
-    tipo, param = identificar_tipo_consulta(query)
-    prompt = generar_prompt_especifico(tipo, query, documentos)
+    plan = planificar_consulta(query)
+    with tramo('prompt'):
+        prompt, contexto = _armar_prompt(plan.tipo, plan.texto, documentos)
 
-    for intento in range(max_intentos):
-        try:
-            session = requests.Session()
-            session.timeout = None
-            
-            respuesta = session.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": "mistral",
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "num_predict": 1024,
-                        "num_thread": 6,   
-                        "num_ctx": 4096,
-                        "stop": ["</s>"],
-                        "repeat_penalty": 1.1
-                    }
-                }
-            )
-
-            if respuesta.status_code == 200:
-                texto_respuesta = respuesta.json().get("response", "")
-                return texto_respuesta
-                
-        except Exception as e:
-            print(f"\n⚠️ Error en intento {intento + 1}: {str(e)}")
-            if intento == max_intentos - 1:
-                return generar_respuesta_fallback(tipo, documentos)
+    clave = _clave_respuesta(prompt)
+    if clave is not None:
+        with tramo('cache_respuestas'):
+            en_cache = cache_respuestas.obtener(*clave)
+        if en_cache is not None:
+            log.debug("⚡ Respuesta obtenida de la cache")
+            return en_cache, "cache", contexto
+
+    try:
+        with tramo('llm'):
+            respuesta = cliente_llm.generar(prompt, max_intentos=max_intentos)
+        # Solo se guardan las respuestas del modelo, nunca el fallback
+        if clave is not None:
+            cache_respuestas.guardar(*clave, respuesta)
+        return respuesta, "modelo", contexto
+    except ClienteSaturado as e:
+        log.warning("⚠️ Servidor de modelos saturado: %s", e)
+    except Exception as e:
+        log.warning("⚠️ Error al generar respuesta: %s", e)
+
+    return generar_respuesta_fallback(plan.tipo, documentos), "fallback", contexto
+
+
+def generar_respuesta_ollama_stream(query, documentos):
+    """
+    Genera la respuesta del modelo IA fragmento a fragmento, a medida que Ollama la produce.
     
-    return generar_respuesta_fallback(tipo, documentos)
+    Parámetros:
+    query (str | PlanConsulta): Consulta de búsqueda del usuario o su plan ya calculado.
+    documentos (list): Lista de documentos relevantes.
+    
+    Retorna:
+    generator: Tuplas (evento, contenido). Primero "contexto" con las estadísticas
+    del contexto del prompt; luego "token" para cada fragmento del modelo, "cache"
+    con la respuesta completa si ya estaba en la cache de respuestas o "fallback"
+    con la respuesta alternativa completa si el modelo falla; en ese caso el
+    fallback reemplaza el texto parcial ya enviado.
+    """
+    plan = planificar_consulta(query)
+    if not documentos:
+        yield "fallback", "No se encontraron documentos relevantes."
+        return
+
+    with tramo('prompt'):
+        prompt, contexto = _armar_prompt(plan.tipo, plan.texto, documentos)
+    yield "contexto", contexto
+
+    clave = _clave_respuesta(prompt)
+    if clave is not None:
+        with tramo('cache_respuestas'):
+            en_cache = cache_respuestas.obtener(*clave)
+        if en_cache is not None:
+            yield "cache", en_cache
+            return
+
+    try:
+        fragmentos = []
+        with tramo('llm'):
+            inicio = time.perf_counter()
+            for i, fragmento in enumerate(cliente_llm.generar_stream(prompt)):
+                if i == 0:
+                    registrar('llm_primer_token', inicio, time.perf_counter() - inicio)
+                fragmentos.append(fragmento)
+                yield "token", fragmento
+        # Solo se guarda la respuesta completa: si el cliente cierra el stream no se llega aquí
+        if clave is not None:
+            cache_respuestas.guardar(*clave, "".join(fragmentos))
+        return
+    except ClienteSaturado as e:
+        log.warning("⚠️ Servidor de modelos saturado: %s", e)
+    except Exception as e:
+        log.warning("⚠️ Error en el stream del modelo: %s", e)
+
+    # Una respuesta cortada a la mitad también se reemplaza por el fallback
+    yield "fallback", generar_respuesta_fallback(plan.tipo, documentos)
 
 
 def generar_respuesta_fallback(tipo, documentos):
@@ -621,25 +777,64 @@ def buscar_documentos():
         if not resultados:
             return jsonify({"mensaje": "No se encontraron documentos relevantes."}), 404
 
-        # Convertir resultados a tipos JSON serializables
-        resultados_serializables = []
-        for resultado in resultados:
-            resultado_serializable = {}
-            for key, value in resultado.items():
-                # Convertir numpy tipos a tipos Python estándar
-                if isinstance(value, (np.float32, np.float64)):
-                    resultado_serializable[key] = float(value)
-                elif isinstance(value, np.int32):
-                    resultado_serializable[key] = int(value)
-                else:
-                    resultado_serializable[key] = value
-            resultados_serializables.append(resultado_serializable)
-
-        return jsonify(resultados_serializables), 200
+        with tramo('serializacion'):
+            # Convertir resultados a tipos JSON serializables
+            resultados_serializables = []
+            for resultado in resultados:
+                resultado_serializable = {}
+                for key, value in resultado.items():
+                    # Convertir numpy tipos a tipos Python estándar
+                    if isinstance(value, (np.float32, np.float64)):
+                        resultado_serializable[key] = float(value)
+                    elif isinstance(value, np.int32):
+                        resultado_serializable[key] = int(value)
+                    else:
+                        resultado_serializable[key] = value
+                resultados_serializables.append(resultado_serializable)
+            cuerpo = jsonify(resultados_serializables)
+
+        return cuerpo, 200
 
     except Exception as e:
         return jsonify({"error": f"Error en la búsqueda: {str(e)}"}), 500
 
+@app.route('/buscar_lote', methods=['POST'])
+def buscar_documentos_lote():
+    try:
+        datos = request.get_json()
+        if not datos:
+            return jsonify({"error": "Datos de búsqueda no proporcionados"}), 400
+
+        queries = datos.get('queries', [])
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+            return jsonify({"error": "Se requiere una lista de consultas no vacías"}), 400
+
+        k = datos.get('k', 5)
+        resultados = buscar_lote(queries, k)
+
+        with tramo('serializacion'):
+            # Convertir resultados a tipos JSON serializables
+            respuesta = []
+            for query, documentos in zip(queries, resultados):
+                documentos_serializables = []
+                for resultado in documentos:
+                    resultado_serializable = {}
+                    for key, value in resultado.items():
+                        if isinstance(value, (np.float32, np.float64)):
+                            resultado_serializable[key] = float(value)
+                        elif isinstance(value, np.int32):
+                            resultado_serializable[key] = int(value)
+                        else:
+                            resultado_serializable[key] = value
+                    documentos_serializables.append(resultado_serializable)
+                respuesta.append({"query": query, "resultados": documentos_serializables})
+            cuerpo = jsonify(respuesta)
+
+        return cuerpo, 200
+
+    except Exception as e:
+        return jsonify({"error": f"Error en la búsqueda por lote: {str(e)}"}), 500
+
 # ------------------------------
 # Función para extraer fuentes de los documentos
 # ------------------------------
@@ -675,6 +870,34 @@ def extraer_fuentes(documentos):
     return list(set(fuentes))  # Eliminar duplicados
 
 
+def serializar_documentos(documentos):
+    """
+    Convierte los valores numpy de los documentos a tipos de Python serializables a JSON.
+    
+    Parámetros:
+    documentos (list): Lista de documentos relevantes.
+    
+    Retorna:
+    list: Copia de los documentos con valores serializables.
+    """
+    with tramo('serializacion'):
+        documentos_serializables = []
+        for doc in documentos:
+            doc_serializable = {}
+            for key, value in doc.items():
+                if isinstance(value, (np.float32, np.float64)):
+                    doc_serializable[key] = float(value)
+                else:
+                    doc_serializable[key] = value
+            documentos_serializables.append(doc_serializable)
+        return documentos_serializables
+
+
+def evento_sse(evento, datos):
+    """Formatea un evento Server-Sent Events con datos JSON."""
+    return f"event: {evento}\ndata: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
 @app.route('/generar_respuesta', methods=['POST'])
 def generar_respuesta():
     try:
@@ -685,40 +908,157 @@ def generar_respuesta():
         if not query:
             return jsonify({"error": "Consulta de búsqueda vacía"}), 400
 
-        tipo, param = identificar_tipo_consulta(query)
-        query_ajustada = limpiar_query(query, tipo, param)
-        
-        documentos = buscar(query_ajustada, k)
+        # La consulta se clasifica una sola vez; la búsqueda usa el plan de la consulta ajustada
+        plan = planificar_consulta(query)
+        documentos = buscar(plan.busqueda, k)
         
         if not documentos:
             return jsonify({"mensaje": "No se encontraron documentos relevantes."}), 404
 
-        documentos_serializables = []
-        for doc in documentos:
-            doc_serializable = {}
-            for key, value in doc.items():
-                if isinstance(value, (np.float32, np.float64)):
-                    doc_serializable[key] = float(value)
-                else:
-                    doc_serializable[key] = value
-            documentos_serializables.append(doc_serializable)
+        documentos_serializables = serializar_documentos(documentos)
 
-        respuesta = generar_respuesta_ollama(query, documentos_serializables)
+        respuesta, origen, contexto = _generar_respuesta(plan, documentos_serializables)
         fuentes = extraer_fuentes(documentos_serializables)
-        
-        return jsonify({
-            "query_original": query,
-            "query_ajustada": query_ajustada,
-            "tipo_consulta": tipo,
-            "documentos": documentos_serializables,
-            "respuesta": respuesta,
-            "fuentes": fuentes
-        }), 200
+
+        with tramo('serializacion'):
+            cuerpo = jsonify({
+                "query_original": query,
+                "query_ajustada": plan.query_ajustada,
+                "tipo_consulta": plan.tipo,
+                "documentos": documentos_serializables,
+                "respuesta": respuesta,
+                "origen": origen,
+                "contexto": contexto,
+                "fuentes": fuentes
+            })
+        return cuerpo, 200
 
     except Exception as e:
         return jsonify({"error": f"Error al generar respuesta: {str(e)}"}), 500
 
+@app.route('/generar_respuesta_stream', methods=['POST'])
+def generar_respuesta_stream():
+    """
+    Variante de /generar_respuesta que responde con Server-Sent Events:
+    primero un evento "documentos" con los documentos y fuentes, luego un evento
+    "token" por fragmento generado (uno solo con la respuesta completa si estaba en
+    la cache, o un "fallback" con la respuesta alternativa) y finalmente un evento
+    "fin" que indica el origen de la respuesta ("modelo", "cache" o "fallback") y
+    las estadísticas del contexto enviado al modelo.
+    """
+    datos = request.get_json(silent=True) or {}
+    query = datos.get('query', '')
+    k = datos.get('k', 5)
+
+    if not query:
+        return jsonify({"error": "Consulta de búsqueda vacía"}), 400
+
+    try:
+        plan = planificar_consulta(query)
+        documentos = buscar(plan.busqueda, k)
+    except Exception as e:
+        return jsonify({"error": f"Error al generar respuesta: {str(e)}"}), 500
+
+    if not documentos:
+        return jsonify({"mensaje": "No se encontraron documentos relevantes."}), 404
+
+    documentos_serializables = serializar_documentos(documentos)
+    fuentes = extraer_fuentes(documentos_serializables)
+
+    def eventos():
+        yield evento_sse("documentos", {
+            "query_original": query,
+            "query_ajustada": plan.query_ajustada,
+            "tipo_consulta": plan.tipo,
+            "documentos": documentos_serializables,
+            "fuentes": fuentes
+        })
+        origen, contexto = "modelo", None
+        for evento, contenido in generar_respuesta_ollama_stream(plan, documentos_serializables):
+            if evento == "contexto":
+                contexto = contenido
+            elif evento == "fallback":
+                origen = "fallback"
+                yield evento_sse("fallback", {"respuesta": contenido})
+            elif evento == "cache":
+                origen = "cache"
+                yield evento_sse("token", {"token": contenido})
+            else:
+                yield evento_sse("token", {"token": contenido})
+        fin = {"origen": origen, "contexto": contexto}
+        # Las cabeceras ya se enviaron: la traza pedida viaja en el último evento
+        traza = traza_actual()
+        if traza is not None:
+            fin["traza"] = traza.como_lista()
+        yield evento_sse("fin", fin)
+
+    return Response(stream_with_context(eventos()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/cache', methods=['GET'])
+def estadisticas_cache():
+    """Expone los contadores de las caches de embeddings, de resultados y de respuestas."""
+    estadisticas = motor.estadisticas_cache()
+    estadisticas['respuestas'] = cache_respuestas.estadisticas() if cache_respuestas is not None else None
+    return jsonify(estadisticas), 200
+
+@app.route('/metrics', methods=['GET'])
+def metricas():
+    """
+    Histogramas de duración por etapa y por endpoint, y contadores de las caches y
+    del cliente de Ollama, en el formato de texto de Prometheus.
+    """
+    caches = motor.estadisticas_cache()
+    if cache_respuestas is not None:
+        caches['respuestas'] = cache_respuestas.estadisticas()
+    nombres = [nombre for nombre in ('embeddings', 'resultados', 'respuestas') if nombre in caches]
+    llm = cliente_llm.estadisticas()
+    texto = exponer_metricas(
+        exponer_valores('rag_cache_aciertos_total', 'Aciertos de las caches de consultas.', 'counter', 'cache',
+                        {nombre: caches[nombre]['aciertos'] for nombre in nombres}),
+        exponer_valores('rag_cache_fallos_total', 'Fallos de las caches de consultas.', 'counter', 'cache',
+                        {nombre: caches[nombre]['fallos'] for nombre in nombres}),
+        exponer_valores('rag_llm_eventos_total', 'Peticiones al modelo rechazadas por saturación y reintentos.',
+                        'counter', 'evento', {'rechazadas': llm['rechazadas'], 'reintentos': llm['reintentos']}),
+        exponer_valores('rag_llm_en_cola', 'Peticiones esperando una plaza del servidor de modelos.',
+                        'gauge', 'modelo', {cliente_llm.modelo: llm['en_cola']}),
+    )
+    return Response(texto, mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# ----- Medición de las peticiones -----
+
+@app.before_request
+def iniciar_medicion():
+    g.inicio_peticion = time.perf_counter()
+    # Descarta la traza que haya dejado una petición anterior atendida por el mismo hilo
+    terminar_traza()
+    if TRAZAR_PETICIONES or request.headers.get('X-Traza') == '1' or request.args.get('traza') == '1':
+        iniciar_traza()
+
+
+@app.after_request
+def registrar_peticion(respuesta):
+    endpoint = request.endpoint or 'desconocido'
+    inicio = g.get('inicio_peticion', time.perf_counter())
+    metodo, ruta = request.method, request.path
+    traza = traza_actual()
+    # En un stream la traza aún no está completa; se envía en el evento "fin"
+    if traza is not None and not respuesta.is_streamed:
+        respuesta.headers['Server-Timing'] = traza.server_timing()
+
+    # Se mide al cerrar la respuesta, que en un stream es cuando se terminó de enviar
+    def al_cerrar():
+        DURACION_PETICIONES.observar(time.perf_counter() - inicio, endpoint)
+        PETICIONES.incrementar(endpoint, str(respuesta.status_code))
+        if traza is not None:
+            terminar_traza()
+            log.info("🧭 Traza %s %s: %s", metodo, ruta, json.dumps(traza.como_lista()))
+
+    respuesta.call_on_close(al_cerrar)
+    return respuesta
+
 # ----- Ejecutar Aplicación -----
 
 if __name__ == "__main__":
+    logging.basicConfig(format='%(message)s')
     app.run(port=4000, debug=True)
@@ -0,0 +1,154 @@
+import argparse
+import json
+import sys
+import time
+
+from benchmarks.medicion import comparar_resultados, guardar_resultados
+
+# Nombres de ESCENARIOS, TIPOS_INDICE y CODIFICACIONES, repetidos aquí para que
+# `comparar` funcione sin faiss ni el modelo instalados
+ESCENARIOS = ['buscar', 'buscar_cache', 'generar_respuesta', 'generar_respuesta_stream', 'generar_respuesta_cache']
+TIPOS_INDICE = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+CODIFICACIONES = ('float32', 'float16', 'int8')
+
+# ---------------- Subcomandos ----------------
+
+def comando_corpus(args):
+    from benchmarks.corpus_sintetico import construir_corpus_sintetico
+
+    config_indice = {'tipo': args.tipo_indice, 'codificacion': args.vectores, 'pca': args.pca,
+                     'reordenar': args.reordenar}
+    info = construir_corpus_sintetico(args.oraciones, args.destino, args.codificador, args.dimension,
+                                      config_indice, args.semilla)
+    print(f"✓ Corpus de {info['documentos']:,} documentos guardado en {args.destino}")
+    for etapa, segundos in info['segundos'].items():
+        print(f"   {etapa}: {segundos:.1f} s")
+
+
+def comando_ejecutar(args):
+    from benchmarks.aplicacion import preparar_app
+    from benchmarks.carga import ejecutar_carga
+    from benchmarks.consultas import CONSULTAS, cobertura_patrones
+    from benchmarks.corpus_sintetico import cargar_info
+    from benchmarks.medicion import entorno
+    from benchmarks.micro import ejecutar_micro
+    from benchmarks.servidor_ollama import ServidorOllamaSimulado
+    from plan_consulta import CONSULTAS_VERIFICACION, verificar_clasificacion
+
+    resultados = {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'entorno': entorno(),
+        'corpus': cargar_info(args.indice),
+        'config': {
+            'indice': args.indice,
+            'repeticiones': args.repeticiones,
+            'concurrencias': args.concurrencias,
+            'peticiones': args.peticiones,
+            'ollama': {'latencia_inicial': args.latencia_inicial, 'latencia_token': args.latencia_token,
+                       'tokens': args.tokens, 'max_concurrentes': args.ollama_concurrentes},
+            'llm_concurrentes': args.llm_concurrentes,
+        },
+    }
+
+    with ServidorOllamaSimulado(args.latencia_inicial, args.latencia_token, args.tokens,
+                                args.ollama_concurrentes) as ollama:
+        print("Cargando el índice...")
+        app = preparar_app(args.indice, ollama.url, args.llm_concurrentes)
+        resultados['corpus']['documentos'] = len(app.motor.sistema()['metadata'])
+
+        cobertura = cobertura_patrones(app.identificar_tipo_consulta, app.QUERY_PATTERNS)
+        resultados['consultas'] = cobertura
+        for distinta in cobertura['distintos']:
+            print(f"⚠️ '{distinta['consulta']}' apunta a {distinta['patron']} pero se clasifica como {distinta['detectado']}")
+        # El patrón combinado debe clasificar igual que los patrones uno por uno
+        cobertura['diferencias_patron_combinado'] = verificar_clasificacion(
+            [query for _, query in CONSULTAS] + CONSULTAS_VERIFICACION)
+        for diferencia in cobertura['diferencias_patron_combinado']:
+            print(f"❌ '{diferencia['consulta']}': patrón combinado {diferencia['combinado']}, "
+                  f"patrones uno por uno {diferencia['secuencial']}")
+
+        print("Ejecutando microbenchmarks...")
+        resultados['micro'] = ejecutar_micro(app, CONSULTAS, args.repeticiones)
+        if not args.sin_carga:
+            print("Ejecutando pruebas de carga...")
+            resultados['carga'] = ejecutar_carga(app, CONSULTAS, args.concurrencias, args.peticiones,
+                                                 args.escenarios)
+
+    guardar_resultados(resultados, args.salida)
+    imprimir_resumen(resultados)
+    print(f"\n✓ Resultados guardados en {args.salida}")
+
+
+def imprimir_resumen(resultados):
+    print(f"\n{'medición':<45} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'op/s':>9}")
+    filas = [(nombre, r) for nombre, r in resultados['micro'].items() if 'p95_ms' in r]
+    for escenario, niveles in resultados.get('carga', {}).items():
+        filas.extend((f"{escenario} [{nivel}]", r) for nivel, r in niveles.items())
+    for nombre, r in filas:
+        print(f"{nombre:<45} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['por_segundo']:>9.1f}")
+
+
+def comando_comparar(args):
+    with open(args.base, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(args.nuevo, encoding='utf-8') as f:
+        nuevo = json.load(f)
+
+    comparacion = comparar_resultados(base, nuevo, args.tolerancia, args.diferencia_minima)
+    regresiones = [c for c in comparacion if c['regresion']]
+    for c in comparacion:
+        if c['regresion'] or args.todas:
+            marca = "❌" if c['regresion'] else "  "
+            print(f"{marca} {c['medicion']:<45} {c['metrica']:<12} {c['base']:>10.2f} → {c['nuevo']:>10.2f} "
+                  f"({c['cambio']:+.1%})")
+    print(f"\n{len(regresiones)} regresiones de {len(comparacion)} métricas comparadas "
+          f"(tolerancia {args.tolerancia:.0%})")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmarks de búsqueda y generación de respuestas")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    corpus = subparsers.add_parser('corpus', help="Genera un índice sintético compatible con app.py")
+    corpus.add_argument('--oraciones', type=int, default=10000, help="Tamaño del corpus (10 mil a 1 millón)")
+    corpus.add_argument('--destino', default='benchmarks/indice_sintetico', help="Archivo .pkl o directorio")
+    corpus.add_argument('--codificador', choices=['sintetico', 'modelo'], default='sintetico')
+    corpus.add_argument('--dimension', type=int, default=768)
+    corpus.add_argument('--tipo-indice', choices=TIPOS_INDICE, default='flat')
+    corpus.add_argument('--vectores', choices=CODIFICACIONES, default='float32',
+                        help="Codificación de los vectores del índice (cuantización escalar)")
+    corpus.add_argument('--pca', type=int, help="Dimensiones tras reducir con PCA")
+    corpus.add_argument('--reordenar', type=int, help="Candidatos por resultado reordenados con la distancia exacta")
+    corpus.add_argument('--semilla', type=int, default=0)
+
+    ejecutar = subparsers.add_parser('ejecutar', help="Ejecuta microbenchmarks y pruebas de carga")
+    ejecutar.add_argument('--indice', default='benchmarks/indice_sintetico')
+    ejecutar.add_argument('--salida', default=f"benchmarks/resultados/benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    ejecutar.add_argument('--repeticiones', type=int, default=20)
+    ejecutar.add_argument('--concurrencias', type=int, nargs='+', default=[1, 4, 16])
+    ejecutar.add_argument('--peticiones', type=int, default=200, help="Peticiones por prueba de carga")
+    ejecutar.add_argument('--escenarios', nargs='+', choices=ESCENARIOS)
+    ejecutar.add_argument('--sin-carga', action='store_true', help="Solo microbenchmarks")
+    ejecutar.add_argument('--latencia-inicial', type=float, default=0.05, help="Segundos antes del primer token")
+    ejecutar.add_argument('--latencia-token', type=float, default=0.02, help="Segundos por token")
+    ejecutar.add_argument('--tokens', type=int, default=64, help="Tokens por respuesta")
+    ejecutar.add_argument('--ollama-concurrentes', type=int, help="Generaciones simultáneas del servidor simulado")
+    ejecutar.add_argument('--llm-concurrentes', type=int, default=2, help="Plazas del ClienteOllama")
+
+    comparar = subparsers.add_parser('comparar', help="Compara dos ejecuciones y marca regresiones")
+    comparar.add_argument('base')
+    comparar.add_argument('nuevo')
+    comparar.add_argument('--tolerancia', type=float, default=0.15, help="Empeoramiento relativo admitido")
+    comparar.add_argument('--diferencia-minima', type=float, default=0.5,
+                          help="Cambio mínimo de latencia (ms) para contar como regresión")
+    comparar.add_argument('--todas', action='store_true', help="Muestra también las métricas sin regresión")
+
+    args = parser.parse_args()
+    if args.comando == 'corpus':
+        comando_corpus(args)
+    elif args.comando == 'ejecutar':
+        comando_ejecutar(args)
+    else:
+        sys.exit(comando_comparar(args))
@@ -0,0 +1,86 @@
+import logging
+import os
+import tempfile
+import threading
+
+from werkzeug.serving import make_server
+
+from benchmarks.corpus_sintetico import CodificadorSintetico, cargar_info
+from benchmarks.medicion import silencio
+from cache_respuestas import CacheRespuestas
+from cliente_llm import ClienteOllama
+from motor_busqueda import MotorBusqueda
+
+# ---------------- Motor y cliente de la aplicación bajo prueba ----------------
+
+class MotorSintetico(MotorBusqueda):
+    """MotorBusqueda que codifica las consultas con el mismo CodificadorSintetico que el corpus."""
+
+    def __init__(self, ruta, dimension, **kwargs):
+        super().__init__(ruta, **kwargs)
+        self._codificador_sintetico = CodificadorSintetico(dimension)
+
+    def modelo(self):
+        return self._codificador_sintetico
+
+
+def preparar_app(ruta_indice, url_ollama, max_concurrentes_llm=2, max_cola_llm=8):
+    """
+    Importa app.py y reemplaza su motor y su cliente de Ollama por los del benchmark.
+
+    El motor abre el índice indicado (sin vigilar cambios en disco) y usa el
+    codificador sintético si el corpus se generó con él; el cliente apunta al
+    servidor simulado con los mismos límites de concurrencia que en producción.
+    La cache de respuestas se guarda en un directorio temporal, para no mezclar
+    las respuestas del servidor simulado con las de la aplicación real.
+
+    Parámetros:
+        ruta_indice (str): Archivo .pkl o directorio del índice.
+        url_ollama (str): URL /api/generate del servidor simulado.
+        max_concurrentes_llm (int): Plazas del ClienteOllama.
+        max_cola_llm (int): Cola de espera del ClienteOllama.
+
+    Retorna:
+        module: El módulo app listo para usar.
+    """
+    # La cache de respuestas de app.py se desactiva antes de importarlo
+    os.environ['CACHE_RESPUESTAS'] = ''
+    with silencio():
+        import app
+
+    info = cargar_info(ruta_indice)
+    if info['codificador'] == 'sintetico':
+        app.motor = MotorSintetico(ruta_indice, info['dimension'], intervalo_revision=0)
+    else:
+        app.motor = MotorBusqueda(ruta_indice, intervalo_revision=0)
+    app.cliente_llm = ClienteOllama(url_ollama, app.MODELO_OLLAMA, app.OPCIONES_OLLAMA,
+                                    max_concurrentes=max_concurrentes_llm, max_cola=max_cola_llm)
+    app.cache_respuestas = CacheRespuestas(os.path.join(tempfile.mkdtemp(prefix='benchmark_'), 'respuestas.sqlite3'))
+
+    with silencio():
+        if app.motor.generacion() is None:
+            raise RuntimeError(f"No se pudo cargar el índice {ruta_indice}")
+        # El modelo se instancia antes de medir, como en un servidor ya en marcha
+        app.motor.codificar("consulta de calentamiento")
+    return app
+
+
+class ServidorApp:
+    """Servidor WSGI con hilos para la aplicación Flask, en un puerto libre de 127.0.0.1."""
+
+    def __init__(self, aplicacion):
+        # El registro de cada petición de werkzeug se escribe en stderr durante la medición
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self._servidor = make_server('127.0.0.1', 0, aplicacion, threaded=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._servidor.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self._servidor.serve_forever, name="app-benchmark", daemon=True).start()
+        return self
+
+    def __exit__(self, *excepcion):
+        self._servidor.shutdown()
+        self._servidor.server_close()
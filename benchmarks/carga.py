@@ -0,0 +1,157 @@
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from benchmarks.aplicacion import ServidorApp
+from benchmarks.medicion import resumir, silencio
+
+# (nombre, ruta del endpoint, caches del motor activas, cache de respuestas activa).
+# Sin cache cada petición recorre la búsqueda completa; con cache las consultas
+# repetidas se sirven de memoria y las respuestas ya generadas, de la base SQLite.
+ESCENARIOS = [
+    ('buscar', '/buscar', False, False),
+    ('buscar_cache', '/buscar', True, False),
+    ('generar_respuesta', '/generar_respuesta', True, False),
+    ('generar_respuesta_stream', '/generar_respuesta_stream', True, False),
+    ('generar_respuesta_cache', '/generar_respuesta', True, True),
+]
+
+# ---------------- Clientes concurrentes ----------------
+
+def _peticion(sesion, url, cuerpo, stream, timeout):
+    # Devuelve (estado, segundos hasta el primer token o None, origen de la respuesta)
+    inicio = time.perf_counter()
+    if not stream:
+        respuesta = sesion.post(url, json=cuerpo, timeout=timeout)
+        origen = None
+        if respuesta.ok and url.endswith('/generar_respuesta'):
+            origen = respuesta.json().get('origen')
+        return respuesta.status_code, None, origen
+
+    primer_token, origen = None, None
+    with sesion.post(url, json=cuerpo, stream=True, timeout=timeout) as respuesta:
+        evento = None
+        for linea in respuesta.iter_lines(decode_unicode=True):
+            if linea.startswith('event: '):
+                evento = linea[len('event: '):]
+                if evento in ('token', 'fallback') and primer_token is None:
+                    primer_token = time.perf_counter() - inicio
+                if evento == 'fallback':
+                    origen = 'fallback'
+            elif evento == 'fin' and linea.startswith('data: '):
+                origen = json.loads(linea[len('data: '):]).get('origen')
+        return respuesta.status_code, primer_token, origen
+
+
+def prueba_carga(url, cuerpos, concurrencia, num_peticiones, stream=False, timeout=120):
+    """
+    Envía num_peticiones al endpoint desde `concurrencia` clientes simultáneos.
+
+    Cada cliente tiene su propia sesión keep-alive y toma la siguiente petición
+    en cuanto termina la anterior (carga de lazo cerrado).
+
+    Parámetros:
+        url (str): URL completa del endpoint.
+        cuerpos (list): Cuerpos JSON que se envían en orden circular.
+        concurrencia (int): Clientes simultáneos.
+        num_peticiones (int): Peticiones totales.
+        stream (bool): Lee la respuesta como Server-Sent Events y mide el primer token.
+        timeout (float): Segundos máximos por petición.
+
+    Retorna:
+        dict: Resumen de latencias con rendimiento real (peticiones/s de reloj), conteo
+        por código de estado y, si aplica, tiempo al primer token y origen de las respuestas.
+    """
+    contador = itertools.count()
+    lock = threading.Lock()
+    latencias, primeros_tokens = [], []
+    estados, origenes = Counter(), Counter()
+
+    def cliente():
+        with requests.Session() as sesion:
+            while True:
+                i = next(contador)
+                if i >= num_peticiones:
+                    return
+                inicio = time.perf_counter()
+                try:
+                    estado, primer_token, origen = _peticion(sesion, url, cuerpos[i % len(cuerpos)], stream, timeout)
+                except requests.RequestException:
+                    estado, primer_token, origen = 'error', None, None
+                latencia = (time.perf_counter() - inicio) * 1000
+                with lock:
+                    latencias.append(latencia)
+                    estados[str(estado)] += 1
+                    if primer_token is not None:
+                        primeros_tokens.append(primer_token * 1000)
+                    if origen:
+                        origenes[origen] += 1
+
+    hilos = [threading.Thread(target=cliente) for _ in range(concurrencia)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    segundos = time.perf_counter() - inicio
+
+    resumen = resumir(latencias, segundos)
+    resumen['concurrencia'] = concurrencia
+    resumen['estados'] = dict(estados)
+    if origenes:
+        resumen['origen'] = dict(origenes)
+    if primeros_tokens:
+        resumen['primer_token'] = resumir(primeros_tokens, segundos)
+    return resumen
+
+
+def ejecutar_carga(app, consultas, concurrencias=(1, 4, 16), num_peticiones=200, escenarios=None, k=5):
+    """
+    Levanta la aplicación Flask en un servidor con hilos y ejecuta cada escenario
+    de ESCENARIOS con cada nivel de concurrencia.
+
+    Parámetros:
+        app (module): Módulo app preparado con aplicacion.preparar_app().
+        consultas (list): Pares (patrón, consulta).
+        concurrencias (tuple): Clientes simultáneos de cada prueba.
+        num_peticiones (int): Peticiones por prueba.
+        escenarios (list, opcional): Nombres de los escenarios a ejecutar (por defecto todos).
+        k (int): Documentos pedidos en cada consulta.
+
+    Retorna:
+        dict: {escenario: {"c<concurrencia>": resumen}}.
+    """
+    motor = app.motor
+    cache_respuestas = app.cache_respuestas
+    cuerpos = [{'query': query, 'k': k} for _, query in consultas]
+    capacidades = (motor.cache_embeddings.max_entradas, motor.cache_resultados.max_entradas)
+    resultados = {}
+
+    with silencio(), ServidorApp(app.app) as servidor:
+        for nombre, ruta, con_cache, con_cache_respuestas in ESCENARIOS:
+            if escenarios and nombre not in escenarios:
+                continue
+            # Una cache de capacidad 0 descarta cada entrada apenas se guarda
+            motor.cache_embeddings.max_entradas = capacidades[0] if con_cache else 0
+            motor.cache_resultados.max_entradas = capacidades[1] if con_cache else 0
+            app.cache_respuestas = cache_respuestas if con_cache_respuestas else None
+            resultados[nombre] = {}
+            for concurrencia in concurrencias:
+                motor.cache_embeddings.limpiar()
+                motor.cache_resultados.limpiar()
+                if app.cache_respuestas is not None:
+                    app.cache_respuestas.limpiar()
+                rechazadas = app.cliente_llm.rechazadas
+                resumen = prueba_carga(servidor.url + ruta, cuerpos, concurrencia, num_peticiones,
+                                       stream=ruta.endswith('_stream'))
+                if ruta.startswith('/generar'):
+                    resumen['llm_rechazadas'] = app.cliente_llm.rechazadas - rechazadas
+                resultados[nombre][f"c{concurrencia}"] = resumen
+
+    motor.cache_embeddings.max_entradas, motor.cache_resultados.max_entradas = capacidades
+    app.cache_respuestas = cache_respuestas
+    return resultados
@@ -0,0 +1,62 @@
+from benchmarks.corpus_sintetico import CANDIDATOS
+
+# ---------------- Conjunto fijo de consultas ----------------
+
+def _nombre(i):
+    return CANDIDATOS[i]['presidente'].lower()
+
+
+# (patrón de QUERY_PATTERNS al que apunta la consulta, consulta). El conjunto no
+# cambia entre ejecuciones para que los resultados sean comparables.
+CONSULTAS = [
+    ('biografia', f"quien es {_nombre(4)}"),
+    ('biografia', f"quién es {_nombre(6)}"),
+    ('biografia', f"biografia de {_nombre(11)}"),
+    ('propuestas_verbo', "que candidatos proponen reducir la inseguridad"),
+    ('propuestas_verbo', "qué candidato propone crear empleo juvenil"),
+    ('propuestas_verbo', "quienes proponen medicinas gratuitas"),
+    ('entrevista', f"que temas se tratan en la entrevista de {_nombre(2)}"),
+    ('entrevista', f"temas de la entrevista de {_nombre(9)}"),
+    ('partido_candidato', f"el candidato {_nombre(5)} a que partido pertenece"),
+    ('partido_candidato', f"{_nombre(13)} a qué partido pertenece"),
+    ('partido_candidato', f"de que partido es {_nombre(7)}"),
+    ('partido_nombre', "que candidatos pertenecen al partido social cristiano"),
+    ('partido_nombre', "cuáles candidatos pertenecen al partido avanza"),
+    ('propuestas_candidato', f"propuestas del candidato {_nombre(0)}"),
+    ('propuestas_candidato', f"que propone {_nombre(15)}"),
+    ('general', "seguridad en las cárceles de Guayas"),
+    ('general', "mejorar las becas de las universidades públicas"),
+    ('general', "reducir los impuestos y la deuda pública"),
+    ('general', "controlar la minería ilegal en Napo"),
+]
+
+
+def cobertura_patrones(identificar_tipo_consulta, query_patterns, consultas=CONSULTAS):
+    """
+    Clasifica cada consulta del conjunto y verifica que todos los patrones estén representados.
+
+    El tipo detectado puede diferir del patrón buscado cuando un patrón anterior
+    de QUERY_PATTERNS también coincide; se informa en lugar de fallar, porque el
+    benchmark mide el comportamiento actual.
+
+    Parámetros:
+        identificar_tipo_consulta (callable): Función de app.py.
+        query_patterns (dict): QUERY_PATTERNS de app.py.
+        consultas (list): Pares (patrón, consulta).
+
+    Retorna:
+        dict: Patrones sin consulta, tipos detectados por patrón y consultas cuyo tipo difiere.
+    """
+    detectados, distintos = {}, []
+    for patron, query in consultas:
+        tipo, _ = identificar_tipo_consulta(query)
+        detectados.setdefault(patron, {}).setdefault(tipo, 0)
+        detectados[patron][tipo] += 1
+        if tipo != patron:
+            distintos.append({'consulta': query, 'patron': patron, 'detectado': tipo})
+
+    return {
+        'sin_consulta': sorted((set(query_patterns) | {'general'}) - set(detectados)),
+        'detectados': detectados,
+        'distintos': distintos,
+    }
@@ -0,0 +1,295 @@
+import json
+import random
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from construir_indice import guardar_sistema, procesar_documentos
+from indices_ann import crear_indice_faiss
+from procesamiento_texto import normalizar_texto
+
+# Candidatos de las elecciones 2025 (los mismos del notebook): las consultas de
+# nombre y de partido se resuelven igual que con el corpus real
+CANDIDATOS = [
+    {'lista': 1, 'partido': 'MOVIMIENTO CENTRO DEMOCRÁTICO', 'presidente': 'JIMMY JAIRALA VALLAZZA', 'vicepresidente': 'LUCIA VALLECILLA SUAREZ'},
+    {'lista': 2, 'partido': 'PARTIDO UNIDAD POPULAR', 'presidente': 'JORGE ESCALA', 'vicepresidente': 'PACHA TERAN'},
+    {'lista': 3, 'partido': 'PARTIDO SOCIEDAD PATRIÓTICA 21 DE ENERO', 'presidente': 'ANDREA GONZALEZ', 'vicepresidente': 'GALO MONCAYO'},
+    {'lista': 4, 'partido': 'MOVIMIENTO PUEBLO IGUALDAD DEMOCRACIA', 'presidente': 'VICTOR ARAUS', 'vicepresidente': 'CRISTINA CARRERA'},
+    {'lista': 5, 'partido': 'REVOLUCIÓN CIUDADANA - RETO', 'presidente': 'LUISA GONZALEZ', 'vicepresidente': 'DIEGO BORJA'},
+    {'lista': 6, 'partido': 'PARTIDO SOCIAL CRISTIANO', 'presidente': 'HENRY KRONFLE KOZHAYA', 'vicepresidente': 'DALLYANA PASSAILAIGUE'},
+    {'lista': 7, 'partido': 'MOVIMIENTO ACCION DEMOCRATICA NACIONAL, ADN', 'presidente': 'DANIEL NOBOA AZIN', 'vicepresidente': 'MARIA JOSE PINTO'},
+    {'lista': 8, 'partido': 'PARTIDO AVANZA', 'presidente': 'LUIS FELIPE TILLERIA', 'vicepresidente': 'KARLA PAULINA ROSERO'},
+    {'lista': 12, 'partido': 'PARTIDO IZQUIERDA DEMOCRÁTICA', 'presidente': 'CARLOS RABASCALL', 'vicepresidente': 'ALEJANDRA RIVAS MANTILLA'},
+    {'lista': 16, 'partido': 'MOVIMIENTO AMIGO, ACCIÓN MOVILIZADORA INDEPENDIENTE GENERANDO OPORTUNIDADES', 'presidente': 'JUAN IVAN CUEVA', 'vicepresidente': 'CRISTINA REYES'},
+    {'lista': 17, 'partido': 'PARTIDO SOCIALISTA ECUATORIANO', 'presidente': 'PEDRO GRANJA', 'vicepresidente': 'VERONICA SILVA'},
+    {'lista': 18, 'partido': 'MOVIMIENTO DE UNIDAD PLURINACIONAL PACHAKUTIK', 'presidente': 'LEONIDAS IZA', 'vicepresidente': 'KATIUSKA MOLINA'},
+    {'lista': 20, 'partido': 'MOVIMIENTO DEMOCRACIA SÍ', 'presidente': 'IVAN SAQUICELA', 'vicepresidente': 'MARIA LUISA COELLO'},
+    {'lista': 21, 'partido': 'MOVIMIENTO CREO, CREANDO OPORTUNIDADES', 'presidente': 'FRANCESCO TABACCHI', 'vicepresidente': 'BLANCA SACANCELA'},
+    {'lista': 23, 'partido': 'PARTIDO SOCIEDAD UNIDA MÁS ACCIÓN, SUMA', 'presidente': 'ENRIQUE GOMEZ', 'vicepresidente': 'INES DIAZ'},
+    {'lista': 25, 'partido': 'MOVIMIENTO CONSTRUYE', 'presidente': 'HENRY CUCALON', 'vicepresidente': 'CARLA LARREA'},
+]
+
+TEMAS = {
+    'seguridad': ['la inseguridad', 'la policía nacional', 'las cárceles', 'el crimen organizado', 'los controles de frontera'],
+    'empleo': ['el empleo juvenil', 'el emprendimiento', 'el salario básico', 'el trabajo formal', 'las pasantías pagadas'],
+    'salud': ['los hospitales públicos', 'las medicinas gratuitas', 'la atención primaria', 'los médicos rurales'],
+    'educación': ['las escuelas fiscales', 'las universidades públicas', 'las becas', 'la formación docente'],
+    'economía': ['los impuestos', 'la inversión extranjera', 'la dolarización', 'la deuda pública', 'las exportaciones'],
+    'ambiente': ['el agua potable', 'la minería ilegal', 'los bosques protectores', 'la energía renovable'],
+    'vivienda': ['la vivienda social', 'los créditos hipotecarios', 'los barrios populares'],
+    'corrupción': ['la corrupción', 'la contratación pública', 'la transparencia fiscal', 'la contraloría'],
+}
+VERBOS = ['Proponemos', 'Vamos a', 'Impulsaremos la decisión de', 'Garantizaremos el compromiso de', 'Nuestro plan busca']
+ACCIONES = ['reducir', 'crear', 'ampliar', 'mejorar', 'financiar', 'modernizar', 'controlar', 'fortalecer']
+PROVINCIAS = ['Guayas', 'Pichincha', 'Manabí', 'Azuay', 'El Oro', 'Los Ríos', 'Esmeraldas', 'Loja', 'Imbabura',
+              'Chimborazo', 'Tungurahua', 'Cotopaxi', 'Santa Elena', 'Orellana', 'Sucumbíos', 'Napo']
+GRUPOS = ['las familias', 'los jóvenes', 'los agricultores', 'las mujeres', 'los adultos mayores',
+          'los pequeños comerciantes', 'los pescadores artesanales']
+PLAZOS = ['el primer año', 'los próximos cuatro años', 'los primeros cien días', 'todo el periodo de gobierno']
+CARRERAS = ['derecho', 'economía', 'administración de empresas', 'ingeniería civil', 'medicina', 'sociología']
+CARGOS = ['asambleísta', 'alcalde', 'ministro', 'concejal', 'dirigente social', 'empresario', 'docente universitario']
+
+# Proporción de oraciones de cada corpus (aproximada a la del corpus real)
+PROPORCIONES = {'plan': 0.6, 'entrevista': 0.3, 'biografia': 0.1}
+ORACIONES_POR_PAGINA = 25
+
+# ---------------- Generación de oraciones ----------------
+
+def _oracion_plan(rng, tema):
+    objeto = rng.choice(TEMAS[tema])
+    return (f"{rng.choice(VERBOS)} {rng.choice(ACCIONES)} {objeto} en {rng.choice(PROVINCIAS)} para "
+            f"{rng.choice(GRUPOS)} durante {rng.choice(PLAZOS)}, con una meta de {rng.randint(1, 5000)} beneficiarios.")
+
+
+def _oracion_entrevista(rng, candidato, tema):
+    nombre = candidato['presidente'].title()
+    objeto = rng.choice(TEMAS[tema])
+    return (f"En la entrevista {nombre} afirmó que es urgente {rng.choice(ACCIONES)} {objeto} "
+            f"porque {rng.choice(GRUPOS)} de {rng.choice(PROVINCIAS)} lo reclaman desde hace {rng.randint(2, 40)} años.")
+
+
+def _oracion_biografia(rng, candidato):
+    nombre = candidato['presidente'].title()
+    plantillas = [
+        f"{nombre} nació en {rng.choice(PROVINCIAS)} y estudió {rng.choice(CARRERAS)} en una universidad pública.",
+        f"{nombre} trabajó como {rng.choice(CARGOS)} en {rng.choice(PROVINCIAS)} durante {rng.randint(2, 20)} años.",
+        f"Antes de su candidatura {nombre} fue {rng.choice(CARGOS)} y participó en {rng.randint(1, 6)} procesos electorales.",
+    ]
+    return rng.choice(plantillas)
+
+
+def _fila(candidato, oracion, id_oracion):
+    return {
+        'Lista': candidato['lista'],
+        'Partido': candidato['partido'],
+        'Presidente': candidato['presidente'],
+        'Vicepresidente': candidato['vicepresidente'],
+        'oracion_original': oracion,
+        'oracion_limpia': normalizar_texto(oracion),
+        'id_oracion': id_oracion,
+    }
+
+
+def generar_corpus(num_oraciones, semilla=0):
+    """
+    Genera los tres corpus sintéticos con las mismas columnas que los CSV procesados.
+
+    Las oraciones se reparten por igual entre los candidatos y se agrupan por
+    documento (páginas del plan, entrevistas, biografía) para que el contexto de
+    cada oración tenga vecinos reales.
+
+    Parámetros:
+        num_oraciones (int): Total aproximado de oraciones de los tres corpus.
+        semilla (int): Semilla del generador, para obtener siempre el mismo corpus.
+
+    Retorna:
+        tuple: (planes, biografias, entrevistas) como pd.DataFrame.
+    """
+    rng = random.Random(semilla)
+    temas = list(TEMAS)
+    por_candidato = {tipo: max(1, round(num_oraciones * proporcion / len(CANDIDATOS)))
+                     for tipo, proporcion in PROPORCIONES.items()}
+
+    planes, entrevistas, biografias = [], [], []
+    for candidato in CANDIDATOS:
+        lista = candidato['lista']
+        for n in range(por_candidato['plan']):
+            pagina = n // ORACIONES_POR_PAGINA + 1
+            tema = temas[(pagina - 1) % len(temas)]
+            planes.append(_fila(candidato, _oracion_plan(rng, tema), f"{lista}_{pagina}_{n}"))
+
+        # Tres entrevistas por candidato (Ecuavisa, Teleamazonas, Vistazo en extraer_fuentes)
+        for n in range(por_candidato['entrevista']):
+            numero = n % 3 + 1
+            tema = temas[(n // 10) % len(temas)]
+            fila = _fila(candidato, _oracion_entrevista(rng, candidato, tema), f"{lista}_{numero}_{n}")
+            fila.update({'numero_entrevista': numero, 'tema_original': tema,
+                         'descripcion_original': f"Entrevista sobre {tema} con {candidato['presidente'].title()}"})
+            entrevistas.append(fila)
+
+        for n in range(por_candidato['biografia']):
+            biografias.append(_fila(candidato, _oracion_biografia(rng, candidato), f"{lista}_0_{n}"))
+
+    # Las entrevistas se ordenan por número de entrevista, como en el CSV real
+    entrevistas.sort(key=lambda fila: (fila['Lista'], fila['numero_entrevista']))
+    return pd.DataFrame(planes), pd.DataFrame(biografias), pd.DataFrame(entrevistas)
+
+# ---------------- Codificador sintético ----------------
+
+class CodificadorSintetico:
+    """
+    Reemplazo determinista de SentenceTransformer para corpus de prueba.
+
+    Cada palabra normalizada recibe un vector aleatorio fijo (derivado de su
+    CRC32) y una oración es la suma normalizada de los vectores de sus palabras,
+    así que textos con palabras en común quedan cerca. Codifica un millón de
+    oraciones en segundos y no necesita descargar el modelo.
+    """
+
+    def __init__(self, dimension=768):
+        """
+        Parámetros:
+            dimension (int): Dimensión de los embeddings (768 como el modelo real).
+        """
+        self.dimension = dimension
+        self._vocabulario = {}
+        self._vectores = np.zeros((0, dimension), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _ids(self, palabras):
+        with self._lock:
+            return self._ids_sin_lock(palabras)
+
+    def _ids_sin_lock(self, palabras):
+        nuevas = [p for p in dict.fromkeys(palabras) if p not in self._vocabulario]
+        if nuevas:
+            vectores = [np.random.default_rng(zlib.crc32(p.encode())).standard_normal(self.dimension)
+                        for p in nuevas]
+            for palabra in nuevas:
+                self._vocabulario[palabra] = len(self._vocabulario)
+            self._vectores = np.vstack([self._vectores, np.asarray(vectores, dtype=np.float32)])
+        return [self._vocabulario[p] for p in palabras]
+
+    def encode(self, textos, batch_size=10000, show_progress_bar=False, **kwargs):
+        """
+        Codifica los textos en lotes de batch_size oraciones.
+
+        Retorna:
+            np.ndarray: Embeddings normalizados (n x dimension, float32).
+        """
+        if isinstance(textos, str):
+            textos = [textos]
+        resultado = np.zeros((len(textos), self.dimension), dtype=np.float32)
+        for inicio in range(0, len(textos), batch_size):
+            palabras = [normalizar_texto(texto).split() for texto in textos[inicio:inicio + batch_size]]
+            ids = self._ids([palabra for p in palabras for palabra in p])
+            vectores = self._vectores
+            # Matriz dispersa de conteos (oraciones x vocabulario) por la matriz de vectores de palabras
+            punteros = np.concatenate([[0], np.cumsum([len(p) for p in palabras])])
+            conteos = sparse.csr_matrix((np.ones(len(ids), dtype=np.float32), ids, punteros),
+                                        shape=(len(palabras), len(vectores)))
+            resultado[inicio:inicio + len(palabras)] = conteos @ vectores
+        normas = np.linalg.norm(resultado, axis=1, keepdims=True)
+        return resultado / np.maximum(normas, 1e-12)
+
+# ---------------- Construcción del índice de prueba ----------------
+
+def ruta_info(destino):
+    """Archivo con la descripción del corpus, junto al índice (sirve para .pkl y directorios)."""
+    return destino.rstrip('/') + '.benchmark.json'
+
+
+def construir_corpus_sintetico(num_oraciones, destino, codificador='sintetico', dimension=768,
+                               config_indice=None, semilla=0):
+    """
+    Genera un corpus sintético y lo guarda como sistema de búsqueda compatible con app.py.
+
+    Se usa el mismo camino que construir_indice.py (procesar_documentos, TF-IDF,
+    crear_indice_faiss y guardar_sistema); solo cambian las oraciones y, con
+    codificador='sintetico', los embeddings.
+
+    Parámetros:
+        num_oraciones (int): Oraciones del corpus (de 10 mil a 1 millón).
+        destino (str): Archivo .pkl o directorio del índice.
+        codificador (str): 'sintetico' (CodificadorSintetico) o 'modelo' (SentenceTransformer real).
+        dimension (int): Dimensión de los embeddings sintéticos.
+        config_indice (dict | str, opcional): Tipo de índice FAISS y sus parámetros.
+        semilla (int): Semilla del corpus.
+
+    Retorna:
+        dict: Descripción del corpus y tiempos de cada etapa (también se guarda en ruta_info(destino)).
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+    planes, biografias, entrevistas = generar_corpus(num_oraciones, semilla)
+    tiempos['generar'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    textos_validos, metadata = procesar_documentos(planes, biografias, entrevistas)
+    tiempos['procesar'] = time.perf_counter() - inicio
+    print(f"Total de textos válidos procesados: {len(textos_validos)}")
+
+    inicio = time.perf_counter()
+    vectorizer = TfidfVectorizer(min_df=2, ngram_range=(1, 2))
+    tfidf_matrix = vectorizer.fit_transform(textos_validos)
+    tiempos['tfidf'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    if codificador == 'modelo':
+        from motor_busqueda import NOMBRE_MODELO
+        from sentence_transformers import SentenceTransformer
+        modelo = SentenceTransformer(NOMBRE_MODELO)
+        embeddings = modelo.encode(textos_validos, batch_size=32, show_progress_bar=True)
+    else:
+        embeddings = CodificadorSintetico(dimension).encode(textos_validos)
+    tiempos['embeddings'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    index, config_indice = crear_indice_faiss(embeddings, config_indice)
+    tiempos['indice'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    guardar_sistema({
+        'index': index,
+        'metadata': metadata,
+        'vectorizer': vectorizer,
+        'tfidf_matrix': tfidf_matrix,
+        'textos_validos': textos_validos,
+        'config_indice': config_indice
+    }, destino)
+    tiempos['guardar'] = time.perf_counter() - inicio
+
+    info = {
+        'oraciones_solicitadas': num_oraciones,
+        'documentos': len(textos_validos),
+        'codificador': codificador,
+        'dimension': int(embeddings.shape[1]),
+        'semilla': semilla,
+        'config_indice': config_indice,
+        'segundos': tiempos,
+    }
+    with open(ruta_info(destino), 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    return info
+
+
+def cargar_info(destino):
+    """
+    Lee la descripción de un corpus sintético; un índice sin ella se trata como corpus real.
+
+    Retorna:
+        dict: Descripción del corpus.
+    """
+    try:
+        with open(ruta_info(destino), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'codificador': 'modelo'}
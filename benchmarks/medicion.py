@@ -0,0 +1,155 @@
+import contextlib
+import json
+import os
+import platform
+import time
+
+import numpy as np
+
+# Métricas que se comparan entre ejecuciones: las de latencia empeoran al subir
+# y el rendimiento al bajar
+METRICAS_LATENCIA = ('p50_ms', 'p95_ms', 'p99_ms')
+METRICA_RENDIMIENTO = 'por_segundo'
+
+# ---------------- Resumen de latencias ----------------
+
+def resumir(latencias_ms, segundos_totales=None):
+    """
+    Resume una serie de latencias.
+
+    Parámetros:
+        latencias_ms (list): Latencia de cada operación en milisegundos.
+        segundos_totales (float, opcional): Tiempo de reloj de toda la prueba. Si no se
+            indica, el rendimiento se calcula como si las operaciones fueran secuenciales.
+
+    Retorna:
+        dict: n, media, p50, p95, p99 y máximo en ms, y operaciones por segundo.
+    """
+    latencias = np.asarray(latencias_ms, dtype=np.float64)
+    if len(latencias) == 0:
+        return {'n': 0}
+    if segundos_totales is None:
+        segundos_totales = latencias.sum() / 1000
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+    return {
+        'n': int(len(latencias)),
+        'media_ms': float(latencias.mean()),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'max_ms': float(latencias.max()),
+        'por_segundo': float(len(latencias) / segundos_totales) if segundos_totales > 0 else None,
+    }
+
+
+def medir(funcion, argumentos, repeticiones=1, preparar=None):
+    """
+    Mide la latencia de cada llamada a una función.
+
+    Parámetros:
+        funcion (callable): Función a medir.
+        argumentos (list): Tuplas de argumentos; se recorren todas en cada repetición.
+        repeticiones (int): Vueltas sobre la lista de argumentos.
+        preparar (callable, opcional): Se llama antes de cada medición, fuera del tiempo medido
+            (por ejemplo, para vaciar una cache).
+
+    Retorna:
+        list: Latencias en milisegundos.
+    """
+    latencias = []
+    for _ in range(repeticiones):
+        for args in argumentos:
+            if preparar is not None:
+                preparar()
+            inicio = time.perf_counter()
+            funcion(*args)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+    return latencias
+
+
+@contextlib.contextmanager
+def silencio():
+    """Descarta lo que imprimen las funciones medidas, para no medir la escritura en la terminal."""
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        yield
+
+# ---------------- Resultados en JSON ----------------
+
+def entorno():
+    """Datos de la máquina y de las bibliotecas, para saber si dos ejecuciones son comparables."""
+    import faiss
+    import sklearn
+
+    return {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'procesador': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'faiss': getattr(faiss, '__version__', None),
+        'sklearn': sklearn.__version__,
+    }
+
+
+def guardar_resultados(resultados, ruta):
+    """Guarda los resultados de una ejecución como JSON."""
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+
+def _metricas(resultados, prefijo=''):
+    # Recorre el JSON y devuelve {ruta.de.la.medicion: resumen} para cada resumen de latencias
+    encontradas = {}
+    for clave, valor in resultados.items():
+        if not isinstance(valor, dict):
+            continue
+        ruta = f"{prefijo}{clave}"
+        if 'p95_ms' in valor:
+            encontradas[ruta] = valor
+        # Un resumen puede anidar otros, como el tiempo al primer token de la carga
+        encontradas.update(_metricas(valor, ruta + '.'))
+    return encontradas
+
+
+def comparar_resultados(base, nuevo, tolerancia=0.15, diferencia_minima_ms=0.5):
+    """
+    Compara dos ejecuciones y marca las mediciones que empeoraron más que la tolerancia.
+
+    Parámetros:
+        base (dict): Resultados de referencia.
+        nuevo (dict): Resultados a evaluar.
+        tolerancia (float): Empeoramiento relativo admitido (0.15 = 15 %).
+        diferencia_minima_ms (float): Las latencias que cambian menos que esto no cuentan como
+            regresión, para no marcar el ruido de las mediciones de microsegundos.
+
+    Retorna:
+        list: Una entrada por métrica comparada con medición, métrica, valores,
+        cambio relativo y si es una regresión.
+    """
+    metricas_base = _metricas(base)
+    comparacion = []
+    for ruta, actual in _metricas(nuevo).items():
+        anterior = metricas_base.get(ruta)
+        if not anterior:
+            continue
+        for metrica in METRICAS_LATENCIA + (METRICA_RENDIMIENTO,):
+            a, b = anterior.get(metrica), actual.get(metrica)
+            if not a or b is None:
+                continue
+            cambio = (b - a) / a
+            if metrica == METRICA_RENDIMIENTO:
+                empeora = -cambio
+            else:
+                empeora = cambio if b - a >= diferencia_minima_ms else 0.0
+            comparacion.append({
+                'medicion': ruta,
+                'metrica': metrica,
+                'base': a,
+                'nuevo': b,
+                'cambio': cambio,
+                'regresion': empeora > tolerancia,
+            })
+    return comparacion
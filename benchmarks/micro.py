@@ -0,0 +1,79 @@
+import numpy as np
+
+from benchmarks.medicion import medir, resumir, silencio
+
+# ---------------- Microbenchmarks de las funciones de app.py ----------------
+
+def ejecutar_micro(app, consultas, repeticiones=20, documentos_relevancia=200, candidatos=1000):
+    """
+    Mide por separado las funciones del camino de una consulta, en el mismo proceso.
+
+    - identificar_tipo_consulta: una llamada por consulta (patrón combinado).
+    - clasificacion_secuencial: la misma clasificación probando los patrones uno por uno.
+    - planificar_consulta: plan completo de la consulta (clasificación y normalización).
+    - calcular_relevancia: una llamada por (consulta, documento) sobre una muestra del corpus.
+    - relevancia_vectorizada: RelevanciaPrecalculada.puntuar() sobre `candidatos` filas.
+    - buscar_frio: buscar() con las caches de embeddings y de resultados vacías,
+      también desglosado por tipo de consulta.
+    - buscar_cache: buscar() de una consulta ya resuelta.
+    - generar_prompt: generar_prompt_especifico() con los documentos de cada consulta.
+
+    Parámetros:
+        app (module): Módulo app preparado con aplicacion.preparar_app().
+        consultas (list): Pares (patrón, consulta).
+        repeticiones (int): Vueltas sobre el conjunto de consultas.
+        documentos_relevancia (int): Documentos de la muestra para calcular_relevancia.
+        candidatos (int): Filas puntuadas por la relevancia vectorizada.
+
+    Retorna:
+        dict: Resumen de latencias de cada medición.
+    """
+    from plan_consulta import clasificar_consulta_secuencial
+    from relevancia import calcular_relevancia
+
+    motor = app.motor
+    sistema = motor.sistema()
+    metadata = sistema['metadata']
+    queries = [query for _, query in consultas]
+    # Cada consulta se busca ajustada, como lo hace /generar_respuesta
+    tipos = [app.identificar_tipo_consulta(query) for query in queries]
+    ajustadas = [app.limpiar_query(query, tipo, param) for query, (tipo, param) in zip(queries, tipos)]
+
+    def vaciar_caches():
+        motor.cache_embeddings.limpiar()
+        motor.cache_resultados.limpiar()
+
+    resultados = {}
+    with silencio():
+        resultados['identificar_tipo_consulta'] = resumir(
+            medir(app.identificar_tipo_consulta, [(query,) for query in queries], repeticiones))
+        resultados['clasificacion_secuencial'] = resumir(
+            medir(clasificar_consulta_secuencial, [(query,) for query in queries], repeticiones))
+        resultados['planificar_consulta'] = resumir(
+            medir(app.planificar_consulta, [(query,) for query in queries], repeticiones))
+
+        muestra = np.linspace(0, len(metadata) - 1, min(documentos_relevancia, len(metadata))).astype(int)
+        filas = [metadata[int(i)] for i in muestra]
+        resultados['calcular_relevancia'] = resumir(
+            medir(calcular_relevancia, [(query, meta['texto_original'], meta) for query in queries for meta in filas]))
+
+        filas_candidatas = np.linspace(0, len(metadata) - 1, min(candidatos, len(metadata))).astype(np.int64)
+        resultados['relevancia_vectorizada'] = resumir(
+            medir(sistema['relevancia'].puntuar, [(query, filas_candidatas) for query in queries], repeticiones))
+        resultados['relevancia_vectorizada']['candidatos'] = len(filas_candidatas)
+
+        por_tipo = {}
+        for query, (tipo, _) in zip(ajustadas, tipos):
+            por_tipo.setdefault(tipo, []).extend(medir(app.buscar, [(query,)], repeticiones, preparar=vaciar_caches))
+        resultados['buscar_frio'] = resumir([latencia for latencias in por_tipo.values() for latencia in latencias])
+        resultados['buscar_frio_por_tipo'] = {tipo: resumir(latencias) for tipo, latencias in por_tipo.items()}
+
+        documentos = [app.serializar_documentos(app.buscar(query)) for query in ajustadas]
+        resultados['buscar_cache'] = resumir(medir(app.buscar, [(query,) for query in ajustadas], repeticiones))
+
+        resultados['generar_prompt'] = resumir(medir(
+            app.generar_prompt_especifico,
+            [(tipo, query, docs) for query, (tipo, _), docs in zip(queries, tipos, documentos) if docs],
+            repeticiones))
+
+    return resultados
@@ -0,0 +1,137 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------------- Servidor local que imita a Ollama ----------------
+
+class _ServidorHTTP(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # El cliente cierra la conexión sin leer el último trozo del stream al recibir "done"
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class ServidorOllamaSimulado:
+    """
+    Servidor HTTP local con la API /api/generate de Ollama y latencia configurable.
+
+    Cada generación espera latencia_inicial segundos (carga del prompt) y luego
+    latencia_token segundos por cada uno de los num_tokens fragmentos. Con
+    "stream": true envía un objeto JSON por línea, como Ollama; sin stream
+    devuelve la respuesta completa al final. Para probar el cliente puede
+    responder 503 a las primeras peticiones o cortar el stream antes de "done".
+    Se usa como context manager:
+
+        with ServidorOllamaSimulado(latencia_token=0.02) as servidor:
+            cliente = ClienteOllama(servidor.url, "mistral")
+    """
+
+    def __init__(self, latencia_inicial=0.05, latencia_token=0.02, num_tokens=64, max_concurrentes=None,
+                 errores_iniciales=0, cortar_tras=None):
+        """
+        Parámetros:
+            latencia_inicial (float): Segundos antes del primer token.
+            latencia_token (float): Segundos entre tokens.
+            num_tokens (int): Tokens de cada respuesta.
+            max_concurrentes (int, opcional): Generaciones simultáneas que atiende el servidor;
+                el resto espera, como un Ollama con OLLAMA_NUM_PARALLEL. Sin límite por defecto.
+            errores_iniciales (int): Peticiones iniciales que se responden con 503.
+            cortar_tras (int, opcional): Tokens tras los que se cierra el stream sin enviar "done".
+        """
+        self.latencia_inicial = latencia_inicial
+        self.latencia_token = latencia_token
+        self.num_tokens = num_tokens
+        self.errores_iniciales = errores_iniciales
+        self.cortar_tras = cortar_tras
+        self._plazas = threading.Semaphore(max_concurrentes) if max_concurrentes else None
+        self._lock = threading.Lock()
+        self.peticiones = 0
+        self.instantes = []
+        self._servidor = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._servidor.server_port}/api/generate"
+
+    def iniciar(self):
+        simulado = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                cuerpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])) or b'{}')
+                with simulado._lock:
+                    simulado.peticiones += 1
+                    simulado.instantes.append(time.perf_counter())
+                    fallar = simulado.peticiones <= simulado.errores_iniciales
+                if fallar:
+                    simulado._responder_error(self)
+                elif simulado._plazas:
+                    with simulado._plazas:
+                        simulado._responder(self, cuerpo.get('stream', False))
+                else:
+                    simulado._responder(self, cuerpo.get('stream', False))
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = _ServidorHTTP(('127.0.0.1', 0), Manejador)
+        threading.Thread(target=self._servidor.serve_forever, name="ollama-simulado", daemon=True).start()
+        return self
+
+    def detener(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *excepcion):
+        self.detener()
+
+    def _responder_error(self, manejador):
+        datos = json.dumps({"error": "servidor de modelos no disponible"}).encode()
+        manejador.send_response(503)
+        manejador.send_header('Content-Type', 'application/json')
+        manejador.send_header('Content-Length', str(len(datos)))
+        manejador.end_headers()
+        manejador.wfile.write(datos)
+
+    def _responder(self, manejador, stream):
+        time.sleep(self.latencia_inicial)
+        if not stream:
+            time.sleep(self.latencia_token * self.num_tokens)
+            texto = "".join(f"palabra{i} " for i in range(self.num_tokens))
+            datos = json.dumps({"response": texto, "done": True}).encode()
+            manejador.send_response(200)
+            manejador.send_header('Content-Type', 'application/json')
+            manejador.send_header('Content-Length', str(len(datos)))
+            manejador.end_headers()
+            manejador.wfile.write(datos)
+            return
+
+        # Transferencia por trozos: una línea JSON por token
+        manejador.send_response(200)
+        manejador.send_header('Content-Type', 'application/x-ndjson')
+        manejador.send_header('Transfer-Encoding', 'chunked')
+        manejador.end_headers()
+        for i in range(self.num_tokens + 1):
+            if i == self.cortar_tras:
+                # Cierre limpio de la transferencia sin la línea con "done": true
+                break
+            if i < self.num_tokens:
+                time.sleep(self.latencia_token)
+                linea = {"response": f"palabra{i} ", "done": False}
+            else:
+                linea = {"response": "", "done": True}
+            datos = (json.dumps(linea) + "\n").encode()
+            manejador.wfile.write(f"{len(datos):x}\r\n".encode() + datos + b"\r\n")
+            manejador.wfile.flush()
+        manejador.wfile.write(b"0\r\n\r\n")
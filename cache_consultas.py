@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+# ---------------- Cache LRU con expiración ----------------
+
+class CacheLRU:
+    """
+    Cache de tamaño acotado con política LRU y expiración por tiempo (TTL).
+
+    Es seguro usarla desde varios hilos y lleva contadores de aciertos, fallos,
+    desalojos y expiraciones para poder dimensionarla.
+    """
+
+    def __init__(self, max_entradas=1024, ttl=None):
+        """
+        Parámetros:
+            max_entradas (int): Número máximo de entradas antes de desalojar la menos usada.
+            ttl (float, opcional): Segundos de vida de cada entrada. None para no expirar.
+        """
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.expiraciones = 0
+
+    def obtener(self, clave):
+        """
+        Obtiene un valor de la cache.
+
+        Parámetros:
+            clave (hashable): Clave de la entrada.
+
+        Retorna:
+            object: Valor almacenado o None si no existe o expiró.
+        """
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            valor, guardado_en = entrada
+            if self.ttl is not None and time.monotonic() - guardado_en > self.ttl:
+                del self._datos[clave]
+                self.expiraciones += 1
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        """
+        Guarda un valor en la cache, desalojando la entrada menos usada si está llena.
+
+        Parámetros:
+            clave (hashable): Clave de la entrada.
+            valor (object): Valor a guardar.
+        """
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic())
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+
+    def limpiar(self):
+        """Elimina todas las entradas sin reiniciar los contadores."""
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores de uso de la cache.
+
+        Retorna:
+            dict: Entradas, capacidad, aciertos, fallos, desalojos, expiraciones y tasa de aciertos.
+        """
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'max_entradas': self.max_entradas,
+                'ttl': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'expiraciones': self.expiraciones,
+                'tasa_aciertos': self.aciertos / total if total else 0.0,
+            }
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# ---------------- Huella del prompt ----------------
+
+def huella_prompt(prompt, modelo, opciones):
+    """
+    Calcula la clave de una respuesta generada: el mismo prompt enviado al mismo
+    modelo con las mismas opciones produce la misma huella.
+
+    Parámetros:
+        prompt (str): Prompt completo enviado al modelo.
+        modelo (str): Nombre del modelo.
+        opciones (dict): Opciones de generación.
+
+    Retorna:
+        str: Huella SHA-256 en hexadecimal.
+    """
+    contenido = json.dumps({'prompt': prompt, 'modelo': modelo, 'opciones': opciones},
+                           sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+# ---------------- Cache persistente de respuestas ----------------
+
+class CacheRespuestas:
+    """
+    Cache de respuestas generadas guardada en SQLite, compartida por todos los
+    procesos que atienden peticiones.
+
+    La base usa el modo WAL, así que las lecturas de un proceso no bloquean las
+    escrituras de otro; cada hilo abre su propia conexión. Las entradas llevan la
+    generación del índice con que se generaron: una respuesta de otra generación
+    cuenta como fallo, y al cambiar de generación se borran las anteriores. Cada
+    cierto número de escrituras se eliminan las entradas expiradas y las menos
+    usadas que exceden la capacidad.
+
+    Los errores de SQLite (por ejemplo, una base bloqueada demasiado tiempo) no
+    interrumpen la petición: se cuentan y la respuesta se genera como si no
+    estuviera en cache.
+    """
+
+    def __init__(self, ruta, max_entradas=5000, ttl=7 * 24 * 3600, intervalo_limpieza=100,
+                 espera_bloqueo=5.0):
+        """
+        Parámetros:
+            ruta (str): Archivo de la base SQLite.
+            max_entradas (int): Número máximo de respuestas antes de desalojar las menos usadas.
+            ttl (float, opcional): Segundos de vida de cada respuesta. None para no expirar.
+            intervalo_limpieza (int): Escrituras entre dos limpiezas de la base.
+            espera_bloqueo (float): Segundos que una conexión espera a que otra libere la base.
+        """
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.intervalo_limpieza = intervalo_limpieza
+        self.espera_bloqueo = espera_bloqueo
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generacion = None
+        self._escrituras = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.expiraciones = 0
+        self.invalidadas = 0
+        self.desalojos = 0
+        self.errores = 0
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._conexion() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS respuestas (
+                    huella TEXT PRIMARY KEY,
+                    generacion TEXT NOT NULL,
+                    respuesta TEXT NOT NULL,
+                    creada REAL NOT NULL,
+                    ultimo_uso REAL NOT NULL
+                )""")
+            conexion.execute("CREATE INDEX IF NOT EXISTS respuestas_ultimo_uso ON respuestas (ultimo_uso)")
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso: las conexiones heredadas de un fork no se reutilizan
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=self.espera_bloqueo, isolation_level=None,
+                                       check_same_thread=False)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion, self._local.pid = conexion, os.getpid()
+        return conexion
+
+    def _contar(self, contador, cantidad=1):
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + cantidad)
+
+    def obtener(self, huella, generacion):
+        """
+        Obtiene una respuesta de la cache.
+
+        Parámetros:
+            huella (str): Huella del prompt (ver huella_prompt()).
+            generacion (str): Identificador de la generación vigente del índice.
+
+        Retorna:
+            str: Respuesta guardada o None si no existe, expiró o es de otra generación.
+        """
+        self._cambiar_generacion(generacion)
+        try:
+            conexion = self._conexion()
+            fila = conexion.execute("SELECT respuesta, generacion, creada FROM respuestas WHERE huella = ?",
+                                    (huella,)).fetchone()
+            if fila is None:
+                self._contar('fallos')
+                return None
+            respuesta, generacion_guardada, creada = fila
+            ahora = time.time()
+            if generacion_guardada != generacion:
+                self._contar('invalidadas')
+                self._contar('fallos')
+                return None
+            if self.ttl is not None and ahora - creada > self.ttl:
+                conexion.execute("DELETE FROM respuestas WHERE huella = ?", (huella,))
+                self._contar('expiraciones')
+                self._contar('fallos')
+                return None
+            conexion.execute("UPDATE respuestas SET ultimo_uso = ? WHERE huella = ?", (ahora, huella))
+        except sqlite3.Error as e:
+            log.warning("⚠️ Error al leer la cache de respuestas: %s", e)
+            self._contar('errores')
+            self._contar('fallos')
+            return None
+        self._contar('aciertos')
+        return respuesta
+
+    def guardar(self, huella, generacion, respuesta):
+        """
+        Guarda una respuesta generada, reemplazando la que tuviera la misma huella.
+
+        Parámetros:
+            huella (str): Huella del prompt.
+            generacion (str): Identificador de la generación del índice con que se generó.
+            respuesta (str): Texto de la respuesta.
+        """
+        self._cambiar_generacion(generacion)
+        ahora = time.time()
+        try:
+            self._conexion().execute(
+                "INSERT OR REPLACE INTO respuestas (huella, generacion, respuesta, creada, ultimo_uso) "
+                "VALUES (?, ?, ?, ?, ?)", (huella, generacion, respuesta, ahora, ahora))
+        except sqlite3.Error as e:
+            log.warning("⚠️ Error al guardar en la cache de respuestas: %s", e)
+            self._contar('errores')
+            return
+
+        with self._lock:
+            self._escrituras += 1
+            limpiar = self._escrituras % self.intervalo_limpieza == 0
+        if limpiar:
+            self.desalojar()
+
+    def desalojar(self):
+        """Elimina las respuestas expiradas y las menos usadas que exceden la capacidad."""
+        try:
+            conexion = self._conexion()
+            # BEGIN IMMEDIATE toma el bloqueo de escritura: dos procesos no desalojan a la vez
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                if self.ttl is not None:
+                    expiradas = conexion.execute("DELETE FROM respuestas WHERE creada < ?",
+                                                 (time.time() - self.ttl,)).rowcount
+                    self._contar('expiraciones', expiradas)
+                desalojadas = conexion.execute(
+                    "DELETE FROM respuestas WHERE huella IN "
+                    "(SELECT huella FROM respuestas ORDER BY ultimo_uso DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entradas,)).rowcount
+                self._contar('desalojos', desalojadas)
+                conexion.execute("COMMIT")
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            log.warning("⚠️ Error al limpiar la cache de respuestas: %s", e)
+            self._contar('errores')
+
+    def _cambiar_generacion(self, generacion):
+        # La primera generación que ve el proceso solo se recuerda: otro proceso puede
+        # estar todavía en la anterior o ya en la siguiente. Al cambiar, las respuestas
+        # de las demás generaciones ya no sirven.
+        with self._lock:
+            anterior, self._generacion = self._generacion, generacion
+        if anterior is None or anterior == generacion:
+            return
+        try:
+            borradas = self._conexion().execute("DELETE FROM respuestas WHERE generacion != ?",
+                                                (generacion,)).rowcount
+        except sqlite3.Error as e:
+            log.warning("⚠️ Error al invalidar la cache de respuestas: %s", e)
+            self._contar('errores')
+            return
+        self._contar('invalidadas', borradas)
+        log.info("🗑️ Cache de respuestas: %d respuestas de generaciones anteriores eliminadas", borradas)
+
+    def limpiar(self):
+        """Elimina todas las respuestas sin reiniciar los contadores."""
+        self._conexion().execute("DELETE FROM respuestas")
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores de uso de la cache. Las entradas son las de la base,
+        compartida por todos los procesos; los contadores son los de este proceso.
+
+        Retorna:
+            dict: Entradas, capacidad, ttl, aciertos, fallos, expiraciones, invalidadas,
+            desalojos, errores y tasa de aciertos.
+        """
+        try:
+            entradas = self._conexion().execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+        except sqlite3.Error:
+            entradas = None
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'ruta': self.ruta,
+                'entradas': entradas,
+                'max_entradas': self.max_entradas,
+                'ttl': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'expiraciones': self.expiraciones,
+                'invalidadas': self.invalidadas,
+                'desalojos': self.desalojos,
+                'errores': self.errores,
+                'tasa_aciertos': self.aciertos / total if total else 0.0,
+            }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Estadísticas y limpieza de la cache de respuestas")
+    parser.add_argument('ruta', nargs='?', default='cache_respuestas.sqlite3')
+    parser.add_argument('--vaciar', action='store_true', help="Elimina todas las respuestas")
+    parser.add_argument('--desalojar', action='store_true', help="Elimina las expiradas y las que exceden la capacidad")
+    args = parser.parse_args()
+
+    cache = CacheRespuestas(args.ruta)
+    if args.vaciar:
+        cache.limpiar()
+        print("✓ Cache de respuestas vaciada")
+    elif args.desalojar:
+        cache.desalojar()
+        print(f"✓ {cache.expiraciones} respuestas expiradas y {cache.desalojos} desalojadas")
+    print(json.dumps(cache.estadisticas(), ensure_ascii=False, indent=2))
@@ -0,0 +1,316 @@
+import json
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+# ---------------- Cliente compartido para el servidor de modelos ----------------
+
+class ClienteSaturado(Exception):
+    """El servidor de modelos ya tiene todas sus plazas ocupadas y la cola de espera está llena."""
+
+
+class ClienteOllama:
+    """
+    Cliente reutilizable para la API /api/generate de Ollama.
+
+    Mantiene un pool de conexiones keep-alive, aplica timeouts reales de conexión
+    y lectura, reintenta con backoff exponencial con jitter y limita cuántas
+    generaciones corren a la vez. Las peticiones que no consiguen plaza esperan
+    en una cola acotada; si la cola está llena se rechazan de inmediato con
+    ClienteSaturado para que el llamador responda con el fallback.
+    """
+
+    def __init__(self, url, modelo, opciones=None, max_concurrentes=2, max_cola=8,
+                 espera_maxima=10.0, timeout_conexion=3.0, timeout_lectura=120.0,
+                 max_intentos=3, backoff_base=0.5, backoff_maximo=8.0):
+        """
+        Parámetros:
+            url (str): URL del endpoint /api/generate.
+            modelo (str): Nombre del modelo en Ollama.
+            opciones (dict, opcional): Opciones de generación enviadas en cada petición.
+            max_concurrentes (int): Generaciones simultáneas permitidas contra el servidor.
+            max_cola (int): Peticiones que pueden esperar una plaza libre.
+            espera_maxima (float): Segundos máximos de espera en la cola.
+            timeout_conexion (float): Segundos para establecer la conexión.
+            timeout_lectura (float): Segundos máximos sin recibir datos del servidor.
+            max_intentos (int): Intentos por petición ante errores transitorios.
+            backoff_base (float): Espera base (segundos) del backoff exponencial.
+            backoff_maximo (float): Tope de la espera entre intentos.
+        """
+        self.url = url
+        self.modelo = modelo
+        self.opciones = dict(opciones or {})
+        self.max_concurrentes = max_concurrentes
+        self.max_cola = max_cola
+        self.espera_maxima = espera_maxima
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self.max_intentos = max_intentos
+        self.backoff_base = backoff_base
+        self.backoff_maximo = backoff_maximo
+
+        self._sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrentes)
+        self._sesion.mount('http://', adaptador)
+        self._sesion.mount('https://', adaptador)
+
+        self._plazas = threading.BoundedSemaphore(max_concurrentes)
+        self._lock = threading.Lock()
+        self._en_cola = 0
+        self.rechazadas = 0
+        self.reintentos = 0
+
+    def generar(self, prompt, max_intentos=None):
+        """
+        Genera la respuesta completa del modelo para un prompt.
+
+        Parámetros:
+            prompt (str): Prompt a enviar al modelo.
+            max_intentos (int, opcional): Reemplaza el número de intentos del cliente.
+
+        Retorna:
+            str: Texto generado.
+
+        Lanza:
+            ClienteSaturado: Si no hay plaza libre ni lugar en la cola.
+            requests.RequestException: Si se agotan los intentos.
+        """
+        self._ocupar_plaza()
+        try:
+            respuesta = self._enviar(prompt, stream=False, max_intentos=max_intentos)
+            try:
+                return respuesta.json().get("response", "")
+            finally:
+                respuesta.close()
+        finally:
+            self._plazas.release()
+
+    def generar_stream(self, prompt):
+        """
+        Genera la respuesta del modelo fragmento a fragmento.
+
+        La plaza de concurrencia se mantiene ocupada mientras se consume el stream.
+        Solo se reintenta antes de recibir el primer fragmento.
+
+        Parámetros:
+            prompt (str): Prompt a enviar al modelo.
+
+        Retorna:
+            generator: Fragmentos de texto; termina cuando Ollama indica "done".
+
+        Lanza:
+            ClienteSaturado: Si no hay plaza libre ni lugar en la cola.
+            RuntimeError: Si el stream se corta antes de terminar.
+        """
+        self._ocupar_plaza()
+        try:
+            respuesta = self._enviar(prompt, stream=True)
+            with respuesta:
+                # Ollama envía un objeto JSON por línea hasta el que trae "done": true
+                for linea in respuesta.iter_lines():
+                    if not linea:
+                        continue
+                    fragmento = json.loads(linea)
+                    if fragmento.get("error"):
+                        raise RuntimeError(fragmento["error"])
+                    if fragmento.get("response"):
+                        yield fragmento["response"]
+                    if fragmento.get("done"):
+                        return
+            raise RuntimeError("El stream del modelo terminó sin 'done'")
+        finally:
+            self._plazas.release()
+
+    def estadisticas(self):
+        """
+        Devuelve el estado de la concurrencia del cliente.
+
+        Retorna:
+            dict: Plazas, cola actual, rechazos y reintentos acumulados.
+        """
+        with self._lock:
+            return {
+                'max_concurrentes': self.max_concurrentes,
+                'max_cola': self.max_cola,
+                'en_cola': self._en_cola,
+                'rechazadas': self.rechazadas,
+                'reintentos': self.reintentos,
+            }
+
+    def _ocupar_plaza(self):
+        if self._plazas.acquire(blocking=False):
+            return
+
+        with self._lock:
+            if self._en_cola >= self.max_cola:
+                self.rechazadas += 1
+                raise ClienteSaturado("Cola del servidor de modelos llena")
+            self._en_cola += 1
+        try:
+            obtenida = self._plazas.acquire(timeout=self.espera_maxima)
+        finally:
+            with self._lock:
+                self._en_cola -= 1
+        if not obtenida:
+            with self._lock:
+                self.rechazadas += 1
+            raise ClienteSaturado(f"Sin plaza libre tras {self.espera_maxima} s de espera")
+
+    def _enviar(self, prompt, stream, max_intentos=None):
+        max_intentos = max_intentos or self.max_intentos
+        cuerpo = {
+            "model": self.modelo,
+            "prompt": prompt,
+            "stream": stream,
+            "options": self.opciones
+        }
+        for intento in range(max_intentos):
+            try:
+                respuesta = self._sesion.post(self.url, json=cuerpo, stream=stream, timeout=self.timeout)
+                # Los 4xx (salvo 429) son errores de la petición y no se reintentan
+                if respuesta.status_code < 500 and respuesta.status_code != 429:
+                    respuesta.raise_for_status()
+                    return respuesta
+                respuesta.close()
+                error = requests.HTTPError(f"{respuesta.status_code} del servidor de modelos", response=respuesta)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if intento == max_intentos - 1:
+                raise error
+            log.warning("⚠️ Error en intento %d: %s", intento + 1, error)
+            with self._lock:
+                self.reintentos += 1
+            # Backoff exponencial con jitter completo para no sincronizar los reintentos
+            time.sleep(random.uniform(0, min(self.backoff_maximo, self.backoff_base * 2 ** intento)))
+
+# ---------------- Verificación contra el servidor local simulado ----------------
+
+def verificar_cliente():
+    """
+    Comprueba el comportamiento del cliente contra benchmarks/servidor_ollama.py:
+    timeout de lectura, reintento de los 5xx con backoff creciente, rechazo con
+    ClienteSaturado cuando la cola está llena y detección de un stream cortado.
+
+    Retorna:
+        list[str]: Descripción de cada comprobación fallida (vacía si todo va bien).
+    """
+    from benchmarks.servidor_ollama import ServidorOllamaSimulado
+
+    fallos = []
+
+    def comprobar(condicion, mensaje):
+        if not condicion:
+            fallos.append(mensaje)
+
+    # Timeout: el servidor tarda 1 s y el cliente solo espera 0,2 s sin datos
+    with ServidorOllamaSimulado(latencia_inicial=1.0, latencia_token=0, num_tokens=4) as servidor:
+        cliente = ClienteOllama(servidor.url, "prueba", timeout_lectura=0.2, max_intentos=2, backoff_base=0.01)
+        inicio = time.perf_counter()
+        try:
+            cliente.generar("hola")
+            fallos.append("timeout: la petición lenta no lanzó requests.Timeout")
+        except requests.Timeout:
+            transcurrido = time.perf_counter() - inicio
+            comprobar(transcurrido < 0.9, f"timeout: se esperó {transcurrido:.2f} s pese al timeout de 0,2 s")
+        comprobar(servidor.peticiones == 2, f"timeout: {servidor.peticiones} peticiones, se esperaban 2")
+        comprobar(cliente.reintentos == 1, f"timeout: {cliente.reintentos} reintentos, se esperaba 1")
+
+    # 5xx: dos 503 seguidos se reintentan con esperas de tope base·2^intento
+    topes = []
+    uniforme = random.uniform
+
+    def espera_maxima(a, b):
+        # Sustituye el jitter por el tope para que las esperas sean deterministas
+        topes.append(b)
+        return b
+
+    random.uniform = espera_maxima
+    try:
+        with ServidorOllamaSimulado(latencia_inicial=0, latencia_token=0, num_tokens=4,
+                                    errores_iniciales=2) as servidor:
+            cliente = ClienteOllama(servidor.url, "prueba", max_intentos=3, backoff_base=0.1)
+            try:
+                texto = cliente.generar("hola")
+                comprobar(texto.startswith("palabra0"), f"5xx: respuesta inesperada {texto!r}")
+            except requests.RequestException as e:
+                fallos.append(f"5xx: no se recuperó tras los reintentos ({e})")
+            comprobar(servidor.peticiones == 3, f"5xx: {servidor.peticiones} peticiones, se esperaban 3")
+            comprobar(topes == [0.1, 0.2], f"5xx: topes de backoff {topes}, se esperaban [0.1, 0.2]")
+            pausas = [b - a for a, b in zip(servidor.instantes, servidor.instantes[1:])]
+            comprobar(len(pausas) == 2 and all(p >= t for p, t in zip(pausas, topes)),
+                      f"5xx: pausas entre intentos {[round(p, 3) for p in pausas]} menores que el backoff")
+
+        with ServidorOllamaSimulado(latencia_inicial=0, latencia_token=0, num_tokens=4,
+                                    errores_iniciales=5) as servidor:
+            cliente = ClienteOllama(servidor.url, "prueba", max_intentos=2, backoff_base=0.01)
+            try:
+                cliente.generar("hola")
+                fallos.append("5xx: no se lanzó error al agotar los intentos")
+            except requests.HTTPError as e:
+                comprobar(e.response is not None and e.response.status_code == 503,
+                          f"5xx: error inesperado al agotar los intentos ({e})")
+            comprobar(servidor.peticiones == 2, f"5xx: {servidor.peticiones} peticiones al agotar 2 intentos")
+    finally:
+        random.uniform = uniforme
+
+    # Cola llena: 1 plaza + 1 en cola; de 4 peticiones simultáneas se rechazan 2 al instante
+    with ServidorOllamaSimulado(latencia_inicial=0.5, latencia_token=0, num_tokens=4) as servidor:
+        cliente = ClienteOllama(servidor.url, "prueba", max_concurrentes=1, max_cola=1, espera_maxima=10)
+        atendidas, rechazadas = [], []
+
+        def peticion():
+            inicio = time.perf_counter()
+            try:
+                cliente.generar("hola")
+                atendidas.append(time.perf_counter() - inicio)
+            except ClienteSaturado:
+                rechazadas.append(time.perf_counter() - inicio)
+
+        hilos = [threading.Thread(target=peticion) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        comprobar(len(atendidas) == 2 and len(rechazadas) == 2,
+                  f"cola llena: {len(atendidas)} atendidas y {len(rechazadas)} rechazadas, se esperaban 2 y 2")
+        comprobar(all(t < 0.25 for t in rechazadas),
+                  f"cola llena: los rechazos tardaron {[round(t, 3) for t in rechazadas]} s")
+        comprobar(cliente.estadisticas()['rechazadas'] == len(rechazadas),
+                  "cola llena: el contador de rechazos no coincide")
+
+    # Stream cortado: el servidor cierra tras 3 tokens sin enviar "done"
+    with ServidorOllamaSimulado(latencia_inicial=0, latencia_token=0, num_tokens=8, cortar_tras=3) as servidor:
+        cliente = ClienteOllama(servidor.url, "prueba", max_concurrentes=1, max_cola=0)
+        recibidos = []
+        try:
+            for fragmento in cliente.generar_stream("hola"):
+                recibidos.append(fragmento)
+            fallos.append("stream cortado: terminó sin error pese a faltar 'done'")
+        except RuntimeError:
+            pass
+        comprobar(len(recibidos) == 3, f"stream cortado: {len(recibidos)} fragmentos, se esperaban 3")
+        # La plaza debe quedar libre tras el corte
+        servidor.cortar_tras = None
+        try:
+            completo = list(cliente.generar_stream("hola"))
+            comprobar(len(completo) == 8, f"stream completo: {len(completo)} fragmentos, se esperaban 8")
+        except ClienteSaturado:
+            fallos.append("stream cortado: la plaza no se liberó tras el corte")
+
+    return fallos
+
+
+if __name__ == "__main__":
+    import sys
+
+    fallos = verificar_cliente()
+    for fallo in fallos:
+        print(f"❌ {fallo}")
+    print("✓ Verificación superada" if not fallos else f"❌ {len(fallos)} comprobaciones fallidas")
+    sys.exit(1 if fallos else 0)
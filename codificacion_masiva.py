@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from codificadores import completar_config_codificador, crear_codificador
+
+ARCHIVO_INFO = 'info.json'
+ARCHIVO_EMBEDDINGS = 'embeddings.npy'
+TAM_FRAGMENTO = 4096
+
+# ---------------- Fragmentos por longitud ----------------
+
+def fragmentos_por_longitud(textos, tam_fragmento=TAM_FRAGMENTO):
+    """
+    Reparte los textos en fragmentos de longitud parecida.
+
+    Los textos se ordenan por longitud y se cortan en tramos consecutivos, así
+    cada lote que arma el modelo dentro de un fragmento rellena muy poco. El
+    fragmento es además la unidad de trabajo de los procesos y del checkpoint.
+
+    Parámetros:
+        textos (list): Textos a codificar.
+        tam_fragmento (int): Textos por fragmento.
+
+    Retorna:
+        list: Arreglos con las posiciones de los textos de cada fragmento, del más largo al más corto.
+    """
+    longitudes = np.fromiter((len(texto) for texto in textos), dtype=np.int64, count=len(textos))
+    orden = np.argsort(-longitudes, kind='stable')
+    return [orden[inicio:inicio + tam_fragmento] for inicio in range(0, len(textos), tam_fragmento)]
+
+
+def relleno_estimado(textos, batch_size=32, orden=None):
+    """
+    Fracción de posiciones de relleno en los lotes, contando palabras como tokens.
+
+    Parámetros:
+        textos (list): Textos a codificar.
+        batch_size (int): Textos por lote.
+        orden (np.ndarray, opcional): Orden en que se arman los lotes (por defecto el del corpus).
+
+    Retorna:
+        float: Posiciones de relleno sobre el total de posiciones de los lotes.
+    """
+    longitudes = np.fromiter((len(texto.split()) for texto in textos), dtype=np.int64, count=len(textos))
+    if orden is not None:
+        longitudes = longitudes[orden]
+    total = relleno = 0
+    for inicio in range(0, len(longitudes), batch_size):
+        lote = longitudes[inicio:inicio + batch_size]
+        total += lote.max() * len(lote)
+        relleno += lote.max() * len(lote) - lote.sum()
+    return relleno / total if total else 0.0
+
+# ---------------- Tareas de los procesos de trabajo ----------------
+
+_codificador = None
+
+
+def _iniciar_proceso(nombre_modelo, config_codificador, hilos_por_proceso):
+    # Fijar los hilos antes de importar torch u onnxruntime para que cada proceso use solo los suyos
+    if hilos_por_proceso:
+        for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+            os.environ[variable] = str(hilos_por_proceso)
+    global _codificador
+    _codificador = crear_codificador(nombre_modelo, dict(config_codificador, hilos=hilos_por_proceso))
+
+
+def codificar_fragmento(textos, batch_size):
+    """
+    Codifica un fragmento con el codificador cargado en el proceso.
+
+    Parámetros:
+        textos (list): Textos del fragmento.
+        batch_size (int): Textos por pasada del modelo.
+
+    Retorna:
+        np.ndarray: Embeddings (n x d, float32).
+    """
+    return np.asarray(_codificador.encode(textos, batch_size=batch_size), dtype=np.float32)
+
+# ---------------- Checkpoint en disco ----------------
+
+def _escribir_json(ruta, datos):
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def _ruta_fragmento(directorio, indice):
+    return os.path.join(directorio, f"fragmento_{indice:05d}.listo")
+
+
+def huella_textos(textos):
+    """SHA-256 de los textos en orden: identifica el corpus de un checkpoint."""
+    h = hashlib.sha256()
+    for texto in textos:
+        h.update(texto.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _preparar_checkpoint(directorio, config):
+    """
+    Devuelve la información guardada del checkpoint si se generó con la misma
+    configuración y el mismo corpus; si no, lo descarta.
+    """
+    ruta_info = os.path.join(directorio, ARCHIVO_INFO)
+    if os.path.exists(ruta_info):
+        with open(ruta_info, encoding='utf-8') as f:
+            info = json.load(f)
+        if info['config'] == config:
+            return info
+        print(f"⚠️ El checkpoint de {directorio} es de otro corpus o configuración: se descarta")
+        shutil.rmtree(directorio)
+    os.makedirs(directorio, exist_ok=True)
+    return None
+
+# ---------------- Orquestación ----------------
+
+def codificar_corpus(textos, nombre_modelo, config_codificador=None, directorio=None, procesos=1,
+                     hilos_por_proceso=None, tam_fragmento=TAM_FRAGMENTO, batch_size=32):
+    """
+    Codifica un corpus completo por fragmentos de longitud parecida, con varios
+    procesos y, si se indica un directorio, guardando el avance en disco.
+
+    Con directorio, los embeddings se escriben en un arreglo .npy abierto con mmap
+    y cada fragmento terminado deja una marca; una ejecución interrumpida continúa
+    desde los fragmentos que faltan. El checkpoint se descarta si cambian los
+    textos, el modelo, el backend o el tamaño de fragmento.
+
+    Parámetros:
+        textos (list): Oraciones a codificar.
+        nombre_modelo (str): Modelo SentenceTransformer.
+        config_codificador (dict | str, opcional): Backend de inferencia (ver codificadores.py).
+        directorio (str, opcional): Carpeta del checkpoint. None para codificar en memoria.
+        procesos (int): Procesos de codificación, cada uno con su copia del modelo
+            (1 para codificar en este proceso).
+        hilos_por_proceso (int, opcional): Hilos intra-op de cada proceso.
+        tam_fragmento (int): Textos por fragmento.
+        batch_size (int): Textos por pasada del modelo.
+
+    Retorna:
+        tuple: (embeddings n x d float32, en el orden de `textos`; estadísticas con
+        fragmentos, fragmentos reanudados, segundos y oraciones por segundo).
+    """
+    textos = [str(texto) for texto in textos]
+    config_codificador = completar_config_codificador(config_codificador)
+    inicio = time.perf_counter()
+    fragmentos = fragmentos_por_longitud(textos, tam_fragmento)
+
+    info, pendientes = None, list(range(len(fragmentos)))
+    embeddings = None
+    if directorio is not None:
+        config = {'modelo': nombre_modelo, 'backend': config_codificador['backend'],
+                  'cuantizado': config_codificador['cuantizado'] if config_codificador['backend'] == 'onnx' else False,
+                  'num_textos': len(textos), 'huella': huella_textos(textos), 'tam_fragmento': tam_fragmento}
+        info = _preparar_checkpoint(directorio, config)
+        if info is None:
+            info = {'config': config, 'dimension': None}
+            _escribir_json(os.path.join(directorio, ARCHIVO_INFO), info)
+        else:
+            pendientes = [i for i in pendientes if not os.path.exists(_ruta_fragmento(directorio, i))]
+            if info['dimension'] is not None:
+                embeddings = np.load(os.path.join(directorio, ARCHIVO_EMBEDDINGS), mmap_mode='r+')
+    reanudados = len(fragmentos) - len(pendientes)
+    print(f"{len(textos):,} oraciones en {len(fragmentos)} fragmentos, {len(pendientes)} por codificar"
+          f"{f' ({reanudados} desde el checkpoint)' if reanudados else ''}")
+
+    def guardar(i, resultado):
+        nonlocal embeddings
+        if embeddings is None:
+            if directorio is None:
+                embeddings = np.empty((len(textos), resultado.shape[1]), dtype=np.float32)
+            else:
+                embeddings = np.lib.format.open_memmap(os.path.join(directorio, ARCHIVO_EMBEDDINGS), mode='w+',
+                                                       dtype=np.float32, shape=(len(textos), resultado.shape[1]))
+                info['dimension'] = int(resultado.shape[1])
+                _escribir_json(os.path.join(directorio, ARCHIVO_INFO), info)
+        embeddings[fragmentos[i]] = resultado
+        if directorio is not None:
+            # La marca se escribe después de bajar las filas a disco
+            embeddings.flush()
+            open(_ruta_fragmento(directorio, i), 'w').close()
+        codificadas.append(len(resultado))
+        print(f"  ✓ fragmento {reanudados + len(codificadas)}/{len(fragmentos)} "
+              f"({sum(codificadas) / (time.perf_counter() - inicio):,.0f} oraciones/s)")
+
+    codificadas = []
+    if pendientes and procesos <= 1:
+        _iniciar_proceso(nombre_modelo, config_codificador, hilos_por_proceso)
+        for i in pendientes:
+            guardar(i, codificar_fragmento([textos[j] for j in fragmentos[i]], batch_size))
+    elif pendientes:
+        por_enviar = list(reversed(pendientes))
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso,
+                                 initargs=(nombre_modelo, config_codificador, hilos_por_proceso)) as pool:
+            tareas = {}
+            while por_enviar or tareas:
+                # Pocos fragmentos en vuelo para no acumular embeddings en memoria
+                while por_enviar and len(tareas) < 2 * procesos:
+                    i = por_enviar.pop()
+                    tareas[pool.submit(codificar_fragmento, [textos[j] for j in fragmentos[i]], batch_size)] = i
+                terminadas, _ = wait(tareas, return_when=FIRST_COMPLETED)
+                for tarea in terminadas:
+                    guardar(tareas.pop(tarea), tarea.result())
+
+    if embeddings is None:
+        embeddings = np.empty((0, 0), dtype=np.float32)
+    elif directorio is not None:
+        embeddings.flush()
+        embeddings = np.load(os.path.join(directorio, ARCHIVO_EMBEDDINGS), mmap_mode='r')
+    segundos = time.perf_counter() - inicio
+    return embeddings, {
+        'oraciones': len(textos),
+        'fragmentos': len(fragmentos),
+        'fragmentos_reanudados': reanudados,
+        'procesos': procesos,
+        'segundos': segundos,
+        'oraciones_por_segundo': sum(codificadas) / segundos if segundos else 0.0,
+        'relleno_orden_corpus': relleno_estimado(textos, batch_size),
+        'relleno_por_longitud': relleno_estimado(textos, batch_size, np.concatenate(fragmentos) if fragmentos else None),
+    }
@@ -0,0 +1,181 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# ---------------- Codificación de consultas por micro-lotes ----------------
+
+class CodificadorPorLotes:
+    """
+    Servicio compartido que agrupa las consultas de peticiones concurrentes y las
+    codifica en una sola pasada del modelo.
+
+    Un hilo de trabajo toma la primera consulta pendiente y espera a lo sumo
+    espera_maxima segundos a que lleguen más, hasta completar max_lote. Si no hay
+    otras peticiones en curso no espera, de modo que con poco tráfico la latencia
+    es la de codificar una sola consulta.
+    """
+
+    def __init__(self, obtener_modelo, max_lote=16, espera_maxima=0.005):
+        """
+        Parámetros:
+            obtener_modelo (callable): Devuelve el codificador (ver codificadores.py) a usar.
+            max_lote (int): Número máximo de consultas por pasada del modelo.
+            espera_maxima (float): Segundos que se retiene la primera consulta de un lote.
+        """
+        self.obtener_modelo = obtener_modelo
+        self.max_lote = max_lote
+        self.espera_maxima = espera_maxima
+        self._pendientes = queue.Queue()
+        self._lock = threading.Lock()
+        self._en_curso = 0
+        self._hilo = None
+        self.lotes = 0
+        self.consultas = 0
+
+    def codificar(self, query):
+        """
+        Codifica una consulta junto con las de otras peticiones concurrentes.
+
+        Parámetros:
+            query (str): Consulta del usuario.
+
+        Retorna:
+            np.ndarray: Embedding de la consulta (1 x d, float32).
+        """
+        if self.max_lote <= 1:
+            return self.obtener_modelo().encode([query]).astype('float32')
+
+        futuro = Future()
+        with self._lock:
+            self._en_curso += 1
+            self._iniciar_hilo()
+        try:
+            self._pendientes.put((query, futuro))
+            return futuro.result()
+        finally:
+            with self._lock:
+                self._en_curso -= 1
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores del servicio.
+
+        Retorna:
+            dict: Lotes ejecutados, consultas codificadas y tamaño medio de lote.
+        """
+        with self._lock:
+            return {
+                'max_lote': self.max_lote,
+                'espera_maxima': self.espera_maxima,
+                'lotes': self.lotes,
+                'consultas': self.consultas,
+                'tamano_medio_lote': self.consultas / self.lotes if self.lotes else 0.0,
+            }
+
+    def _iniciar_hilo(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._trabajar, name="codificador-lotes", daemon=True)
+            self._hilo.start()
+
+    def _reunir_lote(self):
+        lote = [self._pendientes.get()]
+        limite = time.monotonic() + self.espera_maxima
+        while len(lote) < self.max_lote:
+            try:
+                lote.append(self._pendientes.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            # Solo vale la pena esperar si hay otras peticiones en curso que aún no llegaron a la cola
+            with self._lock:
+                esperadas = min(self.max_lote, self._en_curso)
+            restante = limite - time.monotonic()
+            if len(lote) >= esperadas or restante <= 0:
+                break
+            try:
+                lote.append(self._pendientes.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _trabajar(self):
+        while True:
+            lote = self._reunir_lote()
+            queries = [query for query, _ in lote]
+            try:
+                embeddings = self.obtener_modelo().encode(queries).astype('float32')
+            except Exception as e:
+                for _, futuro in lote:
+                    futuro.set_exception(e)
+                continue
+
+            with self._lock:
+                self.lotes += 1
+                self.consultas += len(lote)
+            for i, (_, futuro) in enumerate(lote):
+                futuro.set_result(embeddings[i:i + 1])
+
+# ---------------- Benchmark de codificación concurrente ----------------
+
+def benchmark_codificacion(modelo, num_hilos=16, consultas_por_hilo=8, max_lote=16, espera_maxima=0.005):
+    """
+    Compara la codificación individual por petición con el micro-lote compartido
+    bajo peticiones concurrentes.
+
+    Parámetros:
+        modelo (SentenceTransformer): Modelo de embeddings.
+        num_hilos (int): Peticiones concurrentes.
+        consultas_por_hilo (int): Consultas que envía cada petición, una tras otra.
+        max_lote (int): Tamaño máximo de lote del servicio.
+        espera_maxima (float): Espera máxima del servicio en segundos.
+
+    Retorna:
+        dict: Consultas por segundo y latencias p50/p95 (ms) de cada método.
+    """
+    consultas = [f"propuestas de seguridad y empleo número {i}" for i in range(num_hilos * consultas_por_hilo)]
+    codificador = CodificadorPorLotes(lambda: modelo, max_lote, espera_maxima)
+    metodos = {
+        'individual': lambda q: modelo.encode([q]),
+        'micro_lotes': codificador.codificar,
+    }
+    modelo.encode(consultas[:2])  # Calentar el modelo
+
+    resultados = {}
+    for nombre, codificar in metodos.items():
+        latencias = []
+
+        def trabajador(inicio):
+            for query in consultas[inicio:inicio + consultas_por_hilo]:
+                t0 = time.perf_counter()
+                codificar(query)
+                latencias.append((time.perf_counter() - t0) * 1000)
+
+        hilos = [threading.Thread(target=trabajador, args=(i * consultas_por_hilo,)) for i in range(num_hilos)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        total = time.perf_counter() - inicio
+
+        resultados[nombre] = {
+            'consultas_por_segundo': len(consultas) / total,
+            'p50_ms': float(np.percentile(latencias, 50)),
+            'p95_ms': float(np.percentile(latencias, 95)),
+        }
+    resultados['micro_lotes'].update(codificador.estadisticas())
+    return resultados
+
+
+if __name__ == "__main__":
+    from codificadores import config_codificador_entorno, crear_codificador
+    from motor_busqueda import NOMBRE_MODELO
+
+    # El backend se elige con las mismas variables de entorno que app.py (CODIFICADOR=onnx, ...)
+    modelo = crear_codificador(NOMBRE_MODELO, config_codificador_entorno())
+    for nombre, r in benchmark_codificacion(modelo).items():
+        print(f"{nombre:>12}: {r['consultas_por_segundo']:8.1f} consultas/s | "
+              f"p50 {r['p50_ms']:8.2f} ms | p95 {r['p95_ms']:8.2f} ms")
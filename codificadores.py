@@ -0,0 +1,387 @@
+import json
+import os
+import time
+
+import numpy as np
+
+BACKENDS = ('torch', 'onnx')
+RUTA_ONNX = 'modelo_onnx'
+ARCHIVO_ONNX = 'modelo.onnx'
+ARCHIVO_ONNX_INT8 = 'modelo_int8.onnx'
+ARCHIVO_CONFIG = 'codificador.json'
+
+CONFIG_CODIFICADOR_POR_DEFECTO = {
+    'backend': 'torch',
+    'ruta_onnx': RUTA_ONNX,   # Directorio con el grafo exportado por exportar_onnx()
+    'cuantizado': False,      # Usa el grafo con pesos int8 (cuantización dinámica)
+    'hilos': None,            # Hilos intra-op de la inferencia (None: los de la biblioteca)
+}
+
+# ---------------- Configuración ----------------
+
+def completar_config_codificador(config=None):
+    """
+    Completa una configuración del codificador con los valores por defecto.
+
+    Parámetros:
+        config (dict | str, opcional): Configuración parcial o solo el backend.
+
+    Retorna:
+        dict: Configuración completa.
+    """
+    if isinstance(config, str):
+        config = {'backend': config}
+    completa = dict(CONFIG_CODIFICADOR_POR_DEFECTO)
+    completa.update({clave: valor for clave, valor in (config or {}).items() if valor is not None})
+    if completa['backend'] not in BACKENDS:
+        raise ValueError(f"Backend de codificación desconocido: {completa['backend']} (use uno de {BACKENDS})")
+    return completa
+
+
+def config_codificador_entorno():
+    """
+    Lee la configuración del codificador de las variables de entorno CODIFICADOR
+    ('torch' u 'onnx'), CODIFICADOR_ONNX (directorio del grafo), CODIFICADOR_INT8
+    ('1' para el grafo cuantizado) y CODIFICADOR_HILOS.
+
+    Retorna:
+        dict: Configuración completa.
+    """
+    hilos = os.environ.get('CODIFICADOR_HILOS')
+    return completar_config_codificador({
+        'backend': os.environ.get('CODIFICADOR'),
+        'ruta_onnx': os.environ.get('CODIFICADOR_ONNX'),
+        'cuantizado': os.environ.get('CODIFICADOR_INT8') == '1',
+        'hilos': int(hilos) if hilos else None,
+    })
+
+# ---------------- Backend PyTorch ----------------
+
+class CodificadorTorch:
+    """
+    Modelo SentenceTransformer sobre PyTorch, la referencia con que se construyen
+    los índices.
+    """
+
+    def __init__(self, nombre_modelo, hilos=None):
+        """
+        Parámetros:
+            nombre_modelo (str): Modelo SentenceTransformer.
+            hilos (int, opcional): Hilos de PyTorch para la inferencia en CPU.
+        """
+        from sentence_transformers import SentenceTransformer
+
+        if hilos:
+            import torch
+            torch.set_num_threads(hilos)
+        self.nombre_modelo = nombre_modelo
+        self.modelo = SentenceTransformer(nombre_modelo)
+
+    def get_sentence_embedding_dimension(self):
+        return self.modelo.get_sentence_embedding_dimension()
+
+    def encode(self, textos, batch_size=32, show_progress_bar=False):
+        """
+        Codifica textos.
+
+        Parámetros:
+            textos (list): Textos a codificar.
+            batch_size (int): Textos por pasada del modelo.
+            show_progress_bar (bool): Muestra el avance.
+
+        Retorna:
+            np.ndarray: Embeddings (n x d, float32).
+        """
+        embeddings = self.modelo.encode(list(textos), batch_size=batch_size, show_progress_bar=show_progress_bar)
+        return np.asarray(embeddings, dtype='float32')
+
+# ---------------- Backend ONNX Runtime ----------------
+
+class CodificadorOnnx:
+    """
+    Grafo ONNX del transformer ejecutado con ONNX Runtime en CPU.
+
+    El tokenizador (biblioteca tokenizers) y el pooling se hacen fuera del grafo,
+    igual que en SentenceTransformer, así que no se necesita PyTorch para consultar.
+    Los textos de un lote se ordenan por longitud antes de dividirlos en pasadas
+    para rellenar lo menos posible.
+    """
+
+    def __init__(self, ruta=RUTA_ONNX, cuantizado=False, hilos=None):
+        """
+        Parámetros:
+            ruta (str): Directorio creado por exportar_onnx().
+            cuantizado (bool): Usa el grafo con pesos int8.
+            hilos (int, opcional): intra_op_num_threads de la sesión.
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(ruta, ARCHIVO_CONFIG), encoding='utf-8') as f:
+            self.config = json.load(f)
+        archivo = ARCHIVO_ONNX_INT8 if cuantizado else ARCHIVO_ONNX
+        if not os.path.exists(os.path.join(ruta, archivo)):
+            raise FileNotFoundError(f"No existe {archivo} en {ruta}: expórtelo con "
+                                    f"`python codificadores.py exportar{' --int8' if cuantizado else ''}`")
+        self.nombre_modelo = self.config['modelo']
+        self.cuantizado = cuantizado
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if hilos:
+            opciones.intra_op_num_threads = hilos
+        # Cada llamada es una sola pasada; los hilos se reparten dentro de cada operador
+        opciones.inter_op_num_threads = 1
+        self.sesion = ort.InferenceSession(os.path.join(ruta, archivo), opciones,
+                                           providers=['CPUExecutionProvider'])
+        self.entradas = [entrada.name for entrada in self.sesion.get_inputs()]
+
+        self.tokenizador = Tokenizer.from_file(os.path.join(ruta, 'tokenizer.json'))
+        self.tokenizador.enable_truncation(max_length=self.config['max_longitud'])
+        self.tokenizador.enable_padding(pad_id=self.config['pad_id'], pad_token=self.config['pad_token'])
+
+    def get_sentence_embedding_dimension(self):
+        return self.config['dimension']
+
+    def _pasada(self, textos):
+        codificados = self.tokenizador.encode_batch(textos)
+        datos = {
+            'input_ids': np.array([c.ids for c in codificados], dtype=np.int64),
+            'attention_mask': np.array([c.attention_mask for c in codificados], dtype=np.int64),
+            'token_type_ids': np.array([c.type_ids for c in codificados], dtype=np.int64),
+        }
+        estados = self.sesion.run(None, {nombre: datos[nombre] for nombre in self.entradas})[0]
+
+        if self.config['pooling'] == 'cls':
+            embeddings = estados[:, 0]
+        else:
+            mascara = datos['attention_mask'][:, :, None].astype(np.float32)
+            embeddings = (estados * mascara).sum(axis=1) / np.clip(mascara.sum(axis=1), 1e-9, None)
+        if self.config['normalizar']:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+    def encode(self, textos, batch_size=32, show_progress_bar=False):
+        """
+        Codifica textos.
+
+        Parámetros:
+            textos (list): Textos a codificar.
+            batch_size (int): Textos por pasada del grafo.
+            show_progress_bar (bool): Muestra el avance.
+
+        Retorna:
+            np.ndarray: Embeddings (n x d, float32).
+        """
+        textos = [str(texto) for texto in textos]
+        embeddings = np.empty((len(textos), self.config['dimension']), dtype=np.float32)
+        orden = np.argsort([-len(texto) for texto in textos], kind='stable')
+        for inicio in range(0, len(textos), batch_size):
+            filas = orden[inicio:inicio + batch_size]
+            embeddings[filas] = self._pasada([textos[i] for i in filas])
+            if show_progress_bar:
+                print(f"\r   {min(inicio + batch_size, len(textos)):,}/{len(textos):,} textos", end='', flush=True)
+        if show_progress_bar and len(textos):
+            print()
+        return embeddings
+
+
+def exportar_onnx(nombre_modelo, destino=RUTA_ONNX, cuantizar=False, opset=14):
+    """
+    Exporta el transformer de un modelo SentenceTransformer a ONNX, junto con su
+    tokenizador y la configuración de pooling, y opcionalmente una versión con
+    cuantización dinámica de los pesos a int8.
+
+    Parámetros:
+        nombre_modelo (str): Modelo SentenceTransformer.
+        destino (str): Directorio de salida.
+        cuantizar (bool): Genera también el grafo int8.
+        opset (int): Versión del opset de ONNX.
+
+    Retorna:
+        dict: Configuración guardada en codificador.json.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    modelo = SentenceTransformer(nombre_modelo, device='cpu')
+    transformer = modelo[0]
+    modulos = [type(modulo).__name__ for modulo in modelo]
+    pooling = 'cls' if 'Pooling' in modulos and modelo[modulos.index('Pooling')].pooling_mode_cls_token else 'mean'
+
+    class Transformer(torch.nn.Module):
+        # Solo el último estado oculto: el pooling se hace fuera del grafo
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, input_ids, attention_mask):
+            return self.auto_model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    os.makedirs(destino, exist_ok=True)
+    ejemplo = transformer.tokenizer(["ejemplo de oración para exportar el modelo"], return_tensors='pt')
+    ruta = os.path.join(destino, ARCHIVO_ONNX)
+    ejes = {'lote': 0, 'secuencia': 1}
+    with torch.no_grad():
+        torch.onnx.export(Transformer(transformer.auto_model.eval()),
+                          (ejemplo['input_ids'], ejemplo['attention_mask']), ruta,
+                          input_names=['input_ids', 'attention_mask'], output_names=['last_hidden_state'],
+                          dynamic_axes={nombre: {eje: etiqueta for etiqueta, eje in ejes.items()}
+                                        for nombre in ('input_ids', 'attention_mask', 'last_hidden_state')},
+                          opset_version=opset, do_constant_folding=True)
+    transformer.tokenizer.save_pretrained(destino)
+    print(f"✓ Grafo exportado en {ruta}")
+
+    if cuantizar:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(ruta, os.path.join(destino, ARCHIVO_ONNX_INT8), weight_type=QuantType.QInt8)
+        print(f"✓ Grafo int8 en {os.path.join(destino, ARCHIVO_ONNX_INT8)}")
+
+    config = {
+        'modelo': nombre_modelo,
+        'dimension': modelo.get_sentence_embedding_dimension(),
+        'max_longitud': transformer.max_seq_length,
+        'pooling': pooling,
+        'normalizar': 'Normalize' in modulos,
+        'pad_id': transformer.tokenizer.pad_token_id,
+        'pad_token': transformer.tokenizer.pad_token,
+        'opset': opset,
+    }
+    with open(os.path.join(destino, ARCHIVO_CONFIG), 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    return config
+
+# ---------------- Creación del codificador ----------------
+
+def crear_codificador(nombre_modelo, config=None):
+    """
+    Crea el codificador de embeddings del backend configurado. Todos exponen
+    encode(textos, batch_size, show_progress_bar) como SentenceTransformer.
+
+    Parámetros:
+        nombre_modelo (str): Modelo SentenceTransformer.
+        config (dict | str, opcional): Ver CONFIG_CODIFICADOR_POR_DEFECTO.
+
+    Retorna:
+        CodificadorTorch | CodificadorOnnx: Codificador listo para usar.
+    """
+    config = completar_config_codificador(config)
+    if config['backend'] == 'torch':
+        return CodificadorTorch(nombre_modelo, config['hilos'])
+
+    codificador = CodificadorOnnx(config['ruta_onnx'], config['cuantizado'], config['hilos'])
+    if codificador.nombre_modelo != nombre_modelo:
+        raise ValueError(f"El grafo de {config['ruta_onnx']} se exportó de {codificador.nombre_modelo}, "
+                         f"no de {nombre_modelo}")
+    return codificador
+
+# ---------------- Equivalencia con el backend de referencia ----------------
+
+def comparar_codificadores(referencia, candidato, textos, consultas=(), index=None, k=10):
+    """
+    Mide cuánto se aparta un codificador del de referencia: similitud coseno entre
+    los embeddings de los mismos textos, coincidencia del top-k al buscar con
+    ellos en el índice y latencia de una consulta.
+
+    Parámetros:
+        referencia: Codificador de referencia (normalmente CodificadorTorch).
+        candidato: Codificador a evaluar.
+        textos (list): Textos para comparar los embeddings (oraciones del corpus y consultas).
+        consultas (list): Consultas para medir el top-k y la latencia.
+        index (faiss.Index, opcional): Índice en que buscar; sin él no se mide el top-k.
+        k (int): Resultados comparados por consulta.
+
+    Retorna:
+        dict: Coseno mínimo, p1 y medio; solapamiento medio del top-k y fracción de
+        consultas con el mismo primer resultado; latencias p50 (ms) de cada codificador.
+    """
+    a = referencia.encode(textos)
+    b = candidato.encode(textos)
+    cosenos = (a * b).sum(axis=1) / np.clip(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12, None)
+    reporte = {
+        'textos': len(textos),
+        'coseno_min': float(cosenos.min()),
+        'coseno_p1': float(np.percentile(cosenos, 1)),
+        'coseno_medio': float(cosenos.mean()),
+    }
+
+    consultas = list(consultas)
+    if index is not None and consultas:
+        _, ia = index.search(referencia.encode(consultas), k)
+        _, ib = index.search(candidato.encode(consultas), k)
+        reporte.update({
+            'k': k,
+            'solapamiento_top_k': float(np.mean([len(set(x) & set(y)) / k for x, y in zip(ia.tolist(), ib.tolist())])),
+            'mismo_primero': float(np.mean(ia[:, 0] == ib[:, 0])),
+        })
+
+    for nombre, codificador in (('referencia', referencia), ('candidato', candidato)):
+        codificador.encode(consultas[:2] or textos[:2])  # Calentar
+        latencias = []
+        for query in consultas or textos[:50]:
+            inicio = time.perf_counter()
+            codificador.encode([query])
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        reporte[f'p50_ms_{nombre}'] = float(np.percentile(latencias, 50))
+    return reporte
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from motor_busqueda import NOMBRE_MODELO
+
+    parser = argparse.ArgumentParser(description="Exporta el codificador a ONNX y verifica su equivalencia con PyTorch")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    exportar = subparsers.add_parser('exportar', help="Exporta el modelo a ONNX")
+    exportar.add_argument('--destino', default=RUTA_ONNX)
+    exportar.add_argument('--int8', action='store_true', help="Genera también el grafo con pesos int8")
+    exportar.add_argument('--opset', type=int, default=14)
+
+    verificar = subparsers.add_parser('verificar', help="Compara el grafo ONNX con el modelo PyTorch")
+    verificar.add_argument('--onnx', default=RUTA_ONNX, help="Directorio del grafo exportado")
+    verificar.add_argument('--int8', action='store_true', help="Verifica el grafo cuantizado")
+    verificar.add_argument('--hilos', type=int)
+    verificar.add_argument('--sistema', default='indice_busqueda' if os.path.isdir('indice_busqueda')
+                           else 'sistema_busqueda.pkl', help="Índice para medir el top-k")
+    verificar.add_argument('--oraciones', type=int, default=500, help="Oraciones del corpus comparadas")
+    verificar.add_argument('--k', type=int, default=10)
+    verificar.add_argument('--coseno-minimo', type=float,
+                           help="Coseno mínimo aceptado entre los embeddings de ambos backends "
+                                "(por defecto 0.999, o 0.97 con --int8)")
+    args = parser.parse_args()
+
+    if args.comando == 'exportar':
+        exportar_onnx(NOMBRE_MODELO, args.destino, args.int8, args.opset)
+        sys.exit(0)
+
+    from benchmarks.consultas import CONSULTAS
+    from motor_busqueda import cargar_sistema
+
+    sistema = cargar_sistema(args.sistema)
+    consultas = [query for _, query in CONSULTAS]
+    textos = list(consultas)
+    index = None
+    if sistema is not None:
+        index = sistema['index']
+        corpus = list(sistema['textos_validos'])
+        filas = np.random.default_rng(0).choice(len(corpus), min(args.oraciones, len(corpus)), replace=False)
+        textos += [corpus[i] for i in filas]
+
+    referencia = crear_codificador(NOMBRE_MODELO, {'backend': 'torch', 'hilos': args.hilos})
+    candidato = crear_codificador(NOMBRE_MODELO, {'backend': 'onnx', 'ruta_onnx': args.onnx,
+                                                  'cuantizado': args.int8, 'hilos': args.hilos})
+    reporte = comparar_codificadores(referencia, candidato, textos, consultas, index, args.k)
+    print(json.dumps(reporte, ensure_ascii=False, indent=2))
+
+    # La exportación en float32 solo cambia el orden de las operaciones; int8 pierde precisión
+    coseno_minimo = args.coseno_minimo or (0.97 if args.int8 else 0.999)
+    if reporte['coseno_min'] < coseno_minimo:
+        print(f"❌ Coseno mínimo {reporte['coseno_min']:.4f} por debajo de {coseno_minimo}")
+        sys.exit(1)
+    print(f"✓ ONNX{' int8' if args.int8 else ''} equivalente a PyTorch: coseno medio {reporte['coseno_medio']:.4f}"
+          + (f", top-{args.k} compartido {reporte['solapamiento_top_k']:.1%}" if 'solapamiento_top_k' in reporte else '')
+          + f", p50 {reporte['p50_ms_referencia']:.1f} → {reporte['p50_ms_candidato']:.1f} ms")
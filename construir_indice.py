@@ -0,0 +1,252 @@
+import argparse
+import pickle
+import re
+import time
+
+import faiss
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from codificacion_masiva import TAM_FRAGMENTO, codificar_corpus
+from codificadores import BACKENDS, RUTA_ONNX
+from formato_indice import compactar_metadata, guardar_indice
+from indices_ann import CODIFICACIONES, TIPOS_INDICE, crear_indice_faiss
+from motor_busqueda import NOMBRE_MODELO
+
+# Campos de la metadata comunes a los tres corpus y su columna en los CSV
+CAMPOS_CANDIDATO = {'lista': 'Lista', 'partido': 'Partido', 'presidente': 'Presidente',
+                    'vicepresidente': 'Vicepresidente'}
+
+# ---------------- Carga y preparación del corpus ----------------
+
+def cargar_datos():
+    """Cargar y preparar los datos de los tres archivos CSV"""
+    print("Cargando datos...")
+    planes = pd.read_csv('planes_trabajo_procesados.csv')
+    biografias = pd.read_csv('biografias_procesadas.csv')
+    entrevistas = pd.read_csv('entrevistas_procesadas.csv')
+
+    return planes, biografias, entrevistas
+
+
+def es_texto_valido(texto):
+    """Verifica si el texto es válido para búsqueda"""
+    if not isinstance(texto, str):
+        return False
+
+    # Eliminar textos muy cortos
+    if len(texto.split()) < 5:
+        return False
+
+    # Eliminar textos que son solo códigos o referencias
+    if re.match(r'^[A-Z0-9\-\.]+$', texto.strip()):
+        return False
+
+    return True
+
+
+def rangos_contexto(num_oraciones, posiciones, window=2):
+    """
+    Rangos de oraciones de contexto alrededor de las oraciones de un corpus.
+
+    Parámetros:
+        num_oraciones (int): Oraciones del DataFrame.
+        posiciones (np.ndarray): Posiciones de las oraciones centrales.
+        window (int): Oraciones a cada lado.
+
+    Retorna:
+        tuple: Arreglos (inicio, fin) con fin exclusivo.
+    """
+    return np.maximum(posiciones - window, 0), np.minimum(posiciones + window + 1, num_oraciones)
+
+# ---------------- Creación del sistema de búsqueda ----------------
+
+def procesar_documentos(planes, biografias, entrevistas):
+    """
+    Filtra las oraciones válidas de los tres corpus y arma su metadata.
+
+    Parámetros:
+        planes (pd.DataFrame): Oraciones de los planes de trabajo.
+        biografias (pd.DataFrame): Oraciones de las biografías.
+        entrevistas (pd.DataFrame): Oraciones de las entrevistas.
+
+    Retorna:
+        tuple: (lista de oraciones limpias, MetadataColumnar), en el mismo orden. El
+        contexto de cada fila se guarda como rango sobre las oraciones originales.
+    """
+    textos_validos = []
+    metadata = []
+    # Oraciones originales de los tres corpus, en el orden en que se recorren
+    oraciones = []
+
+    # (corpus, tipo, peso, campos propios del corpus): planes con el peso más alto,
+    # luego entrevistas y biografías con el peso base
+    corpus = [
+        (planes, 'plan', 1.2, {}),
+        (entrevistas, 'entrevista', 1.1, {'numero_entrevista': 'numero_entrevista',
+                                          'descripcion': 'descripcion_original', 'tema': 'tema_original'}),
+        (biografias, 'biografia', 1.0, {}),
+    ]
+    for df, tipo, peso, campos_propios in corpus:
+        base = len(oraciones)
+        oraciones.extend(df['oracion_original'] if len(df) else [])
+        if not len(df):
+            continue
+
+        # Columnas completas en lugar de iterrows(): el filtro y los rangos de contexto
+        # se calculan para todo el corpus de una vez
+        validas = np.flatnonzero(df['oracion_limpia'].map(es_texto_valido).to_numpy(dtype=bool))
+        inicio, fin = rangos_contexto(len(df), validas)
+        campos = dict(CAMPOS_CANDIDATO, texto_original='oracion_original', **campos_propios, id_oracion='id_oracion')
+        columnas = {campo: df[columna].to_numpy(dtype=object)[validas] for campo, columna in campos.items()}
+        contextos = zip((base + inicio).tolist(), (base + fin).tolist(), (base + validas).tolist())
+
+        textos_validos.extend(df['oracion_limpia'].to_numpy(dtype=object)[validas].tolist())
+        metadata.extend(dict(zip(campos, valores), tipo=tipo, peso=peso, contexto=contexto)
+                        for valores, contexto in zip(zip(*columnas.values()), contextos))
+
+    return textos_validos, compactar_metadata(metadata, oraciones)
+
+
+def crear_sistema_busqueda(config_indice=None, config_codificador=None, procesos=1, hilos_por_proceso=None,
+                           directorio_checkpoint=None, tam_fragmento=TAM_FRAGMENTO, ruta_indice=None):
+    """
+    Crea el sistema de búsqueda a partir de los CSV procesados.
+
+    Parámetros:
+        config_indice (dict | str, opcional): Tipo de índice FAISS y sus parámetros
+            (ver indices_ann.CONFIG_POR_DEFECTO). Por defecto un IndexFlatL2.
+        config_codificador (dict | str, opcional): Backend con que se codifica el corpus
+            (ver codificadores.CONFIG_CODIFICADOR_POR_DEFECTO). Por defecto PyTorch.
+        procesos (int): Procesos que codifican el corpus en paralelo.
+        hilos_por_proceso (int, opcional): Hilos intra-op de cada proceso.
+        directorio_checkpoint (str, opcional): Carpeta donde se guardan los embeddings
+            a medida que se calculan, para reanudar una construcción interrumpida.
+        tam_fragmento (int): Oraciones por fragmento de codificación y de checkpoint.
+        ruta_indice (str, opcional): Directorio raíz del índice en disco. Los embeddings
+            del corpus se guardan en su almacén por contenido (ver actualizar_indice.py),
+            para que las actualizaciones no vuelvan a codificar el corpus.
+
+    Retorna:
+        dict: index, metadata, vectorizer, tfidf_matrix, textos_validos, config_indice
+        y segundos de cada etapa.
+    """
+    tiempos = {}
+    inicio = time.perf_counter()
+    planes, biografias, entrevistas = cargar_datos()
+    tiempos['cargar'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    textos_validos, metadata = procesar_documentos(planes, biografias, entrevistas)
+    tiempos['procesar'] = time.perf_counter() - inicio
+    print(f"Total de textos válidos procesados: {len(textos_validos)}")
+
+    # Crear vectorizador TF-IDF para pre-filtrado
+    print("Creando vectorizador TF-IDF...")
+    inicio = time.perf_counter()
+    vectorizer = TfidfVectorizer(min_df=2, ngram_range=(1, 2))
+    tfidf_matrix = vectorizer.fit_transform(textos_validos)
+    tiempos['tfidf'] = time.perf_counter() - inicio
+
+    # Embeddings por fragmentos de longitud parecida, en paralelo y con checkpoint
+    print("Generando embeddings...")
+    embeddings, estadisticas = codificar_corpus(textos_validos, NOMBRE_MODELO, config_codificador,
+                                                directorio_checkpoint, procesos, hilos_por_proceso, tam_fragmento)
+    tiempos['embeddings'] = estadisticas['segundos']
+    if ruta_indice is not None:
+        from actualizar_indice import AlmacenEmbeddings, hash_oracion
+        almacen = AlmacenEmbeddings(ruta_indice, NOMBRE_MODELO)
+        almacen.agregar([hash_oracion(texto) for texto in textos_validos], embeddings)
+        almacen.guardar()
+    print(f"Relleno estimado de los lotes: {estadisticas['relleno_orden_corpus']:.1%} en el orden del corpus, "
+          f"{estadisticas['relleno_por_longitud']:.1%} por longitud")
+
+    # Crear índice FAISS del tipo configurado
+    inicio = time.perf_counter()
+    index, config_indice = crear_indice_faiss(embeddings, config_indice)
+    tiempos['indice'] = time.perf_counter() - inicio
+    print(f"Índice FAISS creado: {config_indice['tipo']}")
+
+    return {
+        'index': index,
+        'metadata': metadata,
+        'vectorizer': vectorizer,
+        'tfidf_matrix': tfidf_matrix,
+        'textos_validos': textos_validos,
+        'config_indice': config_indice,
+        'segundos': tiempos
+    }
+
+
+def guardar_sistema(sistema, ruta='sistema_busqueda.pkl'):
+    """
+    Guarda el sistema de búsqueda como pickle o, si la ruta no termina en .pkl,
+    en el formato de directorio con mmap.
+
+    Parámetros:
+        sistema (dict): Sistema creado por crear_sistema_busqueda().
+        ruta (str): Archivo .pkl o directorio de destino.
+    """
+    if not ruta.endswith('.pkl'):
+        guardar_indice(sistema, ruta)
+        return
+
+    sistema_para_guardar = {
+        'index': faiss.serialize_index(sistema['index']),
+        'metadata': sistema['metadata'],
+        'vectorizer': sistema['vectorizer'],
+        'tfidf_matrix': sistema['tfidf_matrix'],
+        'textos_validos': sistema['textos_validos'],
+        'config_indice': sistema['config_indice']
+    }
+
+    with open(ruta, 'wb') as f:
+        pickle.dump(sistema_para_guardar, f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construye el sistema de búsqueda a partir de los CSV procesados")
+    parser.add_argument('--salida', default='sistema_busqueda.pkl', help="Archivo .pkl o directorio del índice")
+    parser.add_argument('--tipo-indice', choices=TIPOS_INDICE, default='flat')
+    parser.add_argument('--nlist', type=int)
+    parser.add_argument('--nprobe', type=int)
+    parser.add_argument('--M', type=int)
+    parser.add_argument('--ef-search', type=int)
+    parser.add_argument('--pq-m', type=int)
+    parser.add_argument('--codificacion', choices=CODIFICACIONES, default='float32',
+                        help="float16 o int8 guardan los vectores con cuantización escalar")
+    parser.add_argument('--pca', type=int, help="Reduce los embeddings a estas dimensiones con PCA")
+    parser.add_argument('--reordenar', type=int,
+                        help="Candidatos por resultado reordenados con la distancia exacta (0: sin reordenar)")
+    parser.add_argument('--codificador', choices=BACKENDS, default='torch',
+                        help="Backend de inferencia para codificar el corpus")
+    parser.add_argument('--onnx', default=RUTA_ONNX, help="Directorio del grafo exportado por codificadores.py")
+    parser.add_argument('--int8', action='store_true', help="Usa el grafo ONNX cuantizado")
+    parser.add_argument('--hilos', type=int, help="Hilos intra-op de la inferencia (por proceso)")
+    parser.add_argument('--procesos', type=int, default=1, help="Procesos que codifican el corpus en paralelo")
+    parser.add_argument('--checkpoint', help="Carpeta donde guardar los embeddings para reanudar la construcción")
+    parser.add_argument('--tam-fragmento', type=int, default=TAM_FRAGMENTO,
+                        help="Oraciones por fragmento de codificación y de checkpoint")
+    args = parser.parse_args()
+
+    config = {'tipo': args.tipo_indice, 'nlist': args.nlist, 'nprobe': args.nprobe,
+              'M': args.M, 'ef_search': args.ef_search, 'pq_m': args.pq_m,
+              'codificacion': args.codificacion, 'pca': args.pca, 'reordenar': args.reordenar}
+
+    print("Creando sistema de búsqueda...")
+    inicio = time.perf_counter()
+    sistema = crear_sistema_busqueda(config, {'backend': args.codificador, 'ruta_onnx': args.onnx,
+                                              'cuantizado': args.int8}, args.procesos, args.hilos,
+                                     args.checkpoint, args.tam_fragmento,
+                                     None if args.salida.endswith('.pkl') else args.salida)
+
+    print(f"Guardando sistema en {args.salida}...")
+    inicio_guardado = time.perf_counter()
+    guardar_sistema(sistema, args.salida)
+    sistema['segundos']['guardar'] = time.perf_counter() - inicio_guardado
+    print("Sistema guardado exitosamente!")
+
+    print(f"\nConstrucción completada en {time.perf_counter() - inicio:.1f} s")
+    for etapa, segundos in sistema['segundos'].items():
+        print(f"   {etapa}: {segundos:.1f} s")
@@ -0,0 +1,342 @@
+import math
+import re
+
+# Caracteres por token de los modelos tipo Mistral en texto en español. No se
+# carga el tokenizador del modelo: la estimación solo decide qué cabe en num_ctx,
+# y se redondea hacia arriba en cada fragmento para quedar del lado seguro.
+CARACTERES_POR_TOKEN = 3.5
+
+MARCA_RELEVANTE = "[RELEVANTE] "
+
+# Las oraciones del contexto se unieron con un espacio; se separan por la puntuación final
+_FIN_ORACION = re.compile(r'(?<=[.!?…])\s+')
+_ESPACIOS = re.compile(r'\s+')
+
+# ---------------- Estimación de tokens ----------------
+
+def estimar_tokens(texto):
+    """
+    Estima cuántos tokens ocupa un texto en el prompt.
+
+    Parámetros:
+        texto (str): Texto a estimar.
+
+    Retorna:
+        int: Tokens estimados.
+    """
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+# ---------------- Oraciones y fuentes ----------------
+
+def dividir_oraciones(contexto):
+    """
+    Separa un contexto armado por encontrar_contexto() en sus oraciones.
+
+    Parámetros:
+        contexto (str): Texto del contexto, con la oración central marcada como [RELEVANTE].
+
+    Retorna:
+        list: Pares (oración sin la marca, es la oración relevante).
+    """
+    oraciones = []
+    for oracion in _FIN_ORACION.split(contexto or ''):
+        relevante = oracion.startswith(MARCA_RELEVANTE)
+        if relevante:
+            oracion = oracion[len(MARCA_RELEVANTE):]
+        oracion = oracion.strip()
+        if oracion:
+            oraciones.append((oracion, relevante))
+    return oraciones
+
+
+def oraciones_documento(doc):
+    """
+    Oraciones del contexto de un documento con su posición en el corpus. Se toman de
+    'oraciones_contexto' (los rangos de oraciones guardados en el índice); si el
+    documento no los trae, se separan del texto por la puntuación final y quedan sin posición.
+
+    Parámetros:
+        doc (dict): Documento serializado.
+
+    Retorna:
+        list: Tuplas (oración, es la oración relevante, posición o None).
+    """
+    oraciones = doc.get('oraciones_contexto')
+    if oraciones is None:
+        return [(oracion, relevante, None) for oracion, relevante in dividir_oraciones(doc['texto_contexto'])]
+    return [(oracion.strip(), bool(relevante), int(posicion))
+            for posicion, oracion, relevante in oraciones if oracion.strip()]
+
+
+def clave_oracion(oracion):
+    """Clave para reconocer la misma oración en dos contextos distintos."""
+    return _ESPACIOS.sub(' ', oracion).strip().lower()
+
+
+def fuente_documento(doc):
+    """
+    Identifica de dónde proviene un documento: las ventanas de contexto de una misma
+    fuente salen de la misma secuencia de oraciones y pueden fusionarse.
+
+    Parámetros:
+        doc (dict): Documento serializado.
+
+    Retorna:
+        tuple: (lista, tipo, página del plan / número de entrevista / None).
+    """
+    tipo = doc['tipo'].lower()
+    if tipo == 'plan':
+        partes = str(doc.get('id_oracion', '')).split('_')
+        detalle = partes[1] if len(partes) > 1 else None
+    elif tipo == 'entrevista':
+        detalle = doc.get('numero_entrevista')
+    else:
+        detalle = None
+    return (doc.get('lista'), tipo, detalle)
+
+# ---------------- Bloques del contexto ----------------
+
+def encabezado_documento(numero, doc):
+    """Encabezado de un documento en el prompt, hasta la línea CONTENIDO."""
+    return f"""
+
+[Documento {numero}]
+TIPO: {doc['tipo'].upper()}
+CANDIDATO: {doc['presidente']}
+PARTIDO: {doc['partido']}
+
+CONTENIDO:
+"""
+
+
+class BloqueContexto:
+    """
+    Contenido de una fuente dentro del prompt: uno o varios tramos de oraciones
+    consecutivas. Las oraciones con posición se ordenan por ella, así que las
+    ventanas que se solapan o son contiguas quedan en un mismo tramo. Sin posición,
+    las ventanas que comparten oraciones con un tramo se fusionan con él y las
+    demás de la misma fuente se agregan como otro tramo.
+    """
+
+    __slots__ = ('doc', 'posiciones', 'tramos', 'temas')
+
+    def __init__(self, doc):
+        self.doc = doc
+        # Entradas [oración, relevante, clave, posición] por posición en el corpus
+        self.posiciones = {}
+        # Tramos de entradas sin posición, en orden de llegada
+        self.tramos = []
+        self.temas = []
+
+    def agregar(self, oraciones, vistas):
+        """
+        Fusiona una ventana de contexto con el bloque.
+
+        Parámetros:
+            oraciones (list): Entradas [oración, relevante, clave, posición] de la ventana, en orden.
+            vistas (set): Claves de las oraciones ya incluidas en el prompt; las que no
+                están en este bloque se descartan por repetidas.
+
+        Retorna:
+            bool: True si la ventana se solapó con algún tramo existente o es contigua a él.
+        """
+        if oraciones and all(entrada[3] is not None for entrada in oraciones):
+            contigua = any(entrada[3] + desplazamiento in self.posiciones
+                           for entrada in oraciones for desplazamiento in (-1, 0, 1))
+            for entrada in oraciones:
+                existente = self.posiciones.get(entrada[3])
+                if existente is not None:
+                    existente[1] = existente[1] or entrada[1]
+                elif entrada[2] not in vistas:
+                    self.posiciones[entrada[3]] = entrada
+            return contigua
+
+        claves_ventana = [entrada[2] for entrada in oraciones]
+        posicion = {clave: j for j, clave in enumerate(claves_ventana)}
+        # Tramos que comparten alguna oración con la ventana, con la posición de la primera
+        solapados = {}
+        for i, tramo in enumerate(self.tramos):
+            compartidas = [posicion[entrada[2]] for entrada in tramo if entrada[2] in posicion]
+            if compartidas:
+                solapados[i] = min(compartidas)
+        if not solapados:
+            nuevas = [entrada for entrada in oraciones if entrada[2] not in vistas]
+            if nuevas:
+                self.tramos.append(nuevas)
+            return False
+
+        # Las ventanas son secuencias consecutivas de la misma fuente: la ventana se
+        # ubica entre lo que los tramos tienen antes y después de ella, y si toca
+        # varios tramos los une en uno solo
+        orden = sorted(solapados, key=solapados.get)
+        existentes = {entrada[2]: entrada for i in orden for entrada in self.tramos[i]}
+        primero, ultimo = self.tramos[orden[0]], self.tramos[orden[-1]]
+        inicio = next(j for j, entrada in enumerate(primero) if entrada[2] in posicion)
+        fin = max(j for j, entrada in enumerate(ultimo) if entrada[2] in posicion)
+
+        fusionado = primero[:inicio]
+        for entrada in oraciones:
+            existente = existentes.get(entrada[2])
+            if existente is not None:
+                existente[1] = existente[1] or entrada[1]
+                fusionado.append(existente)
+            elif entrada[2] not in vistas:
+                fusionado.append(entrada)
+        fusionado.extend(ultimo[fin + 1:])
+        # Lo que los tramos tuvieran fuera de la ventana no se pierde
+        incluidas = {entrada[2] for entrada in fusionado}
+        fusionado.extend(entrada for i in orden for entrada in self.tramos[i] if entrada[2] not in incluidas)
+
+        indices = sorted(solapados)
+        self.tramos[indices[0]] = fusionado
+        for i in reversed(indices[1:]):
+            del self.tramos[i]
+        return True
+
+    def agregar_tema(self, doc):
+        tema = doc.get('tema')
+        if doc['tipo'] == 'entrevista' and tema and tema not in self.temas:
+            self.temas.append(tema)
+
+    def copia(self):
+        copia = BloqueContexto(self.doc)
+        copia.posiciones = {posicion: list(entrada) for posicion, entrada in self.posiciones.items()}
+        copia.tramos = [[list(entrada) for entrada in tramo] for tramo in self.tramos]
+        copia.temas = list(self.temas)
+        return copia
+
+    def tramos_por_posicion(self):
+        """Tramos de oraciones con posiciones consecutivas, en el orden del corpus."""
+        tramos, anterior = [], None
+        for posicion in sorted(self.posiciones):
+            if anterior is None or posicion != anterior + 1:
+                tramos.append([])
+            tramos[-1].append(self.posiciones[posicion])
+            anterior = posicion
+        return tramos
+
+    def texto(self, numero):
+        contenido = "\n".join(" ".join(MARCA_RELEVANTE + oracion if relevante else oracion
+                                       for oracion, relevante, _, _ in tramo)
+                              for tramo in self.tramos_por_posicion() + self.tramos)
+        texto = encabezado_documento(numero, self.doc) + contenido
+        if self.doc['tipo'] == 'entrevista':
+            texto += f"\nTEMA: {'; '.join(self.temas) or 'No especificado'}"
+        return texto
+
+# ---------------- Empaquetado ----------------
+
+def texto_documento(numero, doc):
+    """Texto de un documento en el prompt, con su contexto completo (sin empaquetar)."""
+    texto = encabezado_documento(numero, doc) + doc['texto_contexto']
+    if doc['tipo'] == 'entrevista':
+        texto += f"\nTEMA: {doc.get('tema', 'No especificado')}"
+    return texto
+
+
+def empaquetar_contexto(documentos, presupuesto_tokens=None, contar_tokens=estimar_tokens):
+    """
+    Arma la sección de documentos del prompt sin repetir oraciones y sin pasar del
+    presupuesto de tokens.
+
+    Los documentos se recorren en orden de relevancia. Las ventanas de una misma
+    fuente (lista, tipo y página del plan o número de entrevista) se agrupan en un
+    solo documento y, por la posición de sus oraciones en el corpus, las que se
+    solapan o son contiguas se fusionan en un tramo continuo; las
+    oraciones que ya aparecieron en otro documento se descartan. Si la ventana de
+    un documento no cabe en lo que queda del presupuesto, se intenta con solo su
+    oración relevante y, si tampoco cabe, el documento se omite.
+
+    Parámetros:
+        documentos (list): Documentos serializados, en orden de relevancia.
+        presupuesto_tokens (int, opcional): Tokens disponibles para los documentos.
+            None para no limitar.
+        contar_tokens (callable): Función que estima los tokens de un texto.
+
+    Retorna:
+        tuple: (texto de los documentos, estadísticas) con los tokens del contexto sin
+        empaquetar y empaquetado, los ahorrados, las oraciones repetidas descartadas y
+        los documentos fusionados y omitidos.
+    """
+    bloques, por_fuente, vistas = [], {}, set()
+    restante = presupuesto_tokens if presupuesto_tokens is not None else math.inf
+    repetidas = fusionados = omitidos = 0
+    tokens_originales = sum(contar_tokens(texto_documento(i, doc)) for i, doc in enumerate(documentos, 1))
+
+    for doc in documentos:
+        oraciones, claves = [], set()
+        for oracion, relevante, posicion in oraciones_documento(doc):
+            clave = clave_oracion(oracion)
+            if clave not in claves:
+                claves.add(clave)
+                oraciones.append([oracion, relevante, clave, posicion])
+        nuevas = [entrada for entrada in oraciones if entrada[2] not in vistas]
+        repetidas += len(oraciones) - len(nuevas)
+
+        fuente = fuente_documento(doc)
+        actual = por_fuente.get(fuente)
+        if actual is None and not nuevas:
+            # Todo su contexto ya está en el prompt como parte de otros documentos
+            fusionados += 1
+            continue
+
+        # Se prueba sobre una copia del bloque: el costo es lo que crece su texto
+        numero = bloques.index(actual) + 1 if actual is not None else len(bloques) + 1
+        tokens_antes = contar_tokens(actual.texto(numero)) if actual is not None else 0
+        for intento in (oraciones, [entrada for entrada in nuevas if entrada[1]]):
+            if not intento:
+                continue
+            bloque = actual.copia() if actual is not None else BloqueContexto(doc)
+            bloque.agregar(intento, vistas)
+            bloque.agregar_tema(doc)
+            costo = contar_tokens(bloque.texto(numero)) - tokens_antes
+            if costo <= restante:
+                break
+        else:
+            omitidos += 1
+            continue
+
+        if actual is None:
+            bloques.append(bloque)
+        else:
+            bloques[numero - 1] = bloque
+            fusionados += 1
+        por_fuente[fuente] = bloque
+        vistas.update(entrada[2] for entrada in intento)
+        restante -= costo
+
+    texto = "".join(bloque.texto(i) for i, bloque in enumerate(bloques, 1))
+    tokens = contar_tokens(texto)
+    return texto, {
+        'documentos': len(documentos),
+        'bloques': len(bloques),
+        'documentos_fusionados': fusionados,
+        'documentos_omitidos': omitidos,
+        'oraciones_repetidas': repetidas,
+        'tokens_originales': tokens_originales,
+        'tokens': tokens,
+        'tokens_ahorrados': max(tokens_originales - tokens, 0),
+        'presupuesto_tokens': presupuesto_tokens,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Muestra el contexto empaquetado del prompt de una consulta")
+    parser.add_argument('consulta')
+    parser.add_argument('--k', type=int, default=10, help="Documentos recuperados")
+    parser.add_argument('--presupuesto', type=int, help="Tokens disponibles para los documentos")
+    args = parser.parse_args()
+
+    import app
+    from plan_consulta import planificar_consulta
+
+    plan = planificar_consulta(args.consulta)
+    documentos = app.serializar_documentos(app.buscar(plan.busqueda, args.k))
+    contexto, estadisticas = empaquetar_contexto(documentos, args.presupuesto)
+    print(contexto.strip())
+    print(f"\n✓ {estadisticas['tokens_originales']} → {estadisticas['tokens']} tokens "
+          f"({estadisticas['tokens_ahorrados']} ahorrados)")
+    print(json.dumps(estadisticas, ensure_ascii=False, indent=2))
@@ -0,0 +1,290 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+import PyPDF2
+import pytesseract
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+DIRECTORIO_PDF = 'planes_trabajo'
+DIRECTORIO_TEXTO = 'planes_trabajo_texto'
+ARCHIVO_ESTADO = '.extraccion.json'
+
+# Por debajo de este número de caracteres se asume que el PDF es escaneado
+MIN_CARACTERES_TEXTO = 100
+CONFIG_TESSERACT = r'--oem 3 --psm 6 -l spa'
+
+# ---------------- Utilidades de texto ----------------
+
+def limpiar_texto(texto):
+    """Limpia y normaliza el texto."""
+    # Intentar diferentes codificaciones
+    codificaciones = ['utf-8', 'latin1', 'cp1252']
+    texto_limpio = texto
+
+    for codec in codificaciones:
+        #decodificar el texto que se encuentran en diferentes formatos
+        try:
+            if isinstance(texto, bytes):
+                texto_limpio = texto.decode(codec)
+            elif isinstance(texto, str):
+                texto_limpio = texto.encode(codec).decode(codec)
+            break
+        except Exception:
+            continue
+
+    # Eliminar caracteres no imprimibles y corruptos
+    # Permite saltos de línea y tabulaciones
+    return ''.join(char for char in texto_limpio if char.isprintable() or char in '\n\t')
+
+
+def formatear_paginas(paginas):
+    """
+    Une el texto de las páginas con los separadores 'PAGINA n' que espera procesar_plan_trabajo().
+
+    Parámetros:
+        paginas (list): Texto de cada página, en orden.
+
+    Retorna:
+        str: Texto completo del documento.
+    """
+    return "\n".join(f"PAGINA {numero}\n{texto.strip()}\n" for numero, texto in enumerate(paginas, 1))
+
+
+def extraer_numero_lista(archivo):
+    """Extrae el número de lista desde el nombre del archivo."""
+    match = re.search(r"plan_trabajo_lista_(\d+)", os.path.basename(archivo))
+    return int(match.group(1)) if match else None
+
+
+def hash_archivo(ruta, tamano_bloque=1 << 20):
+    """SHA-256 del contenido del archivo, leído por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+# ---------------- Tareas de los procesos de trabajo ----------------
+
+def _iniciar_proceso():
+    # Cada proceso ejecuta un OCR a la vez: Tesseract no debe abrir sus propios hilos
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def extraer_paginas_texto(ruta):
+    """
+    Extrae la capa de texto de cada página del PDF.
+
+    Parámetros:
+        ruta (str): Ruta del PDF.
+
+    Retorna:
+        list: Texto de cada página (cadena vacía si la página no tiene texto).
+    """
+    paginas = []
+    with open(ruta, 'rb') as f:
+        for pagina in PyPDF2.PdfReader(f).pages:
+            try:
+                paginas.append(pagina.extract_text() or "")
+            except Exception:
+                paginas.append("")
+    return paginas
+
+
+def contar_paginas(ruta):
+    """Número de páginas del PDF según poppler (sirve también para PDFs que PyPDF2 no abre)."""
+    return int(pdfinfo_from_path(ruta)['Pages'])
+
+
+def ocr_paginas(ruta, primera, ultima, dpi=300):
+    """
+    Renderiza y aplica OCR a un grupo pequeño de páginas consecutivas.
+
+    Las páginas se renderizan de a una, así que nunca hay más de una imagen en memoria.
+
+    Parámetros:
+        ruta (str): Ruta del PDF.
+        primera (int): Primera página del grupo (desde 1).
+        ultima (int): Última página del grupo (inclusive).
+        dpi (int): Resolución del renderizado.
+
+    Retorna:
+        list: Texto reconocido de cada página del grupo.
+    """
+    textos = []
+    for numero in range(primera, ultima + 1):
+        imagenes = convert_from_path(ruta, dpi, first_page=numero, last_page=numero)
+        try:
+            textos.append(pytesseract.image_to_string(imagenes[0], config=CONFIG_TESSERACT) if imagenes else "")
+        except Exception as e:
+            print(f"Error en OCR de {os.path.basename(ruta)}, página {numero}: {str(e)}")
+            textos.append("")
+        finally:
+            for imagen in imagenes:
+                imagen.close()
+    return textos
+
+# ---------------- Orquestación ----------------
+
+def _cargar_estado(destino):
+    ruta = os.path.join(destino, ARCHIVO_ESTADO)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _guardar_estado(destino, estado):
+    temporal = os.path.join(destino, ARCHIVO_ESTADO + '.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, os.path.join(destino, ARCHIVO_ESTADO))
+
+
+def ruta_salida(destino, lista):
+    """Archivo de texto de un plan, con el nombre que lee el armado de df_planes."""
+    return os.path.join(destino, f"plan_de_trabajo_lista_{lista}.txt")
+
+
+def procesar_planes_trabajo(directorio=DIRECTORIO_PDF, destino=DIRECTORIO_TEXTO, max_procesos=None,
+                            paginas_por_grupo=4, dpi=300, forzar=False):
+    """
+    Extrae el texto de todos los PDFs de planes de trabajo en paralelo.
+
+    Los archivos se reparten entre un pool de procesos; los PDFs escaneados se
+    dividen en grupos de páginas que también se reparten, y cada grupo se
+    renderiza página a página para acotar la memoria. Los PDFs cuyo hash no
+    cambió desde la última ejecución se omiten.
+
+    Parámetros:
+        directorio (str): Carpeta con los archivos plan_trabajo_lista_N.pdf.
+        destino (str): Carpeta donde se escriben los textos.
+        max_procesos (int, opcional): Procesos del pool (por defecto, uno por CPU).
+        paginas_por_grupo (int): Páginas por tarea de OCR.
+        dpi (int): Resolución del renderizado para OCR.
+        forzar (bool): Reprocesa aunque el PDF no haya cambiado.
+
+    Retorna:
+        pd.DataFrame: Resumen por archivo ordenado por lista.
+    """
+    os.makedirs(destino, exist_ok=True)
+    estado = _cargar_estado(destino)
+    archivos_pdf = sorted(glob.glob(os.path.join(directorio, "*.pdf")))
+    print(f"Encontrados {len(archivos_pdf)} archivos PDF")
+
+    pendientes, resumen = {}, []
+    for archivo in archivos_pdf:
+        nombre = os.path.basename(archivo)
+        lista = extraer_numero_lista(archivo)
+        if lista is None:
+            print(f"× No se pudo obtener la lista de {nombre}")
+            continue
+        hash_pdf = hash_archivo(archivo)
+        previo = estado.get(nombre)
+        if not forzar and previo and previo['hash'] == hash_pdf and os.path.exists(ruta_salida(destino, lista)):
+            resumen.append(dict(previo['resumen'], Omitido=True, Error=False))
+            continue
+        pendientes[archivo] = {'lista': lista, 'hash': hash_pdf}
+
+    print(f"{len(pendientes)} archivos nuevos o modificados, {len(resumen)} sin cambios")
+    inicio = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max_procesos, initializer=_iniciar_proceso) as pool:
+        # Primera fase: capa de texto, un archivo por tarea
+        tareas = {pool.submit(extraer_paginas_texto, archivo): ('texto', archivo, None) for archivo in pendientes}
+        while tareas:
+            terminadas, _ = wait(tareas, return_when=FIRST_COMPLETED)
+            for tarea in terminadas:
+                fase, archivo, grupo = tareas.pop(tarea)
+                info = pendientes[archivo]
+                try:
+                    resultado = tarea.result()
+                except Exception as e:
+                    print(f"× Error procesando {os.path.basename(archivo)} ({fase}): {str(e)}")
+                    info['error'] = True
+                    resultado = None
+
+                if fase == 'texto':
+                    paginas = resultado or []
+                    if len("".join(paginas).strip()) >= MIN_CARACTERES_TEXTO:
+                        info['paginas'], info['ocr'] = paginas, False
+                        continue
+                    # Segunda fase: PDF escaneado, OCR repartido por grupos de páginas
+                    print(f"Texto insuficiente en {os.path.basename(archivo)}, intentando OCR...")
+                    try:
+                        num_paginas = len(paginas) or contar_paginas(archivo)
+                    except Exception as e:
+                        print(f"× No se pudo leer {os.path.basename(archivo)}: {str(e)}")
+                        info['error'] = True
+                        num_paginas = 0
+                    info['paginas'], info['ocr'] = [""] * num_paginas, True
+                    for primera in range(1, num_paginas + 1, paginas_por_grupo):
+                        ultima = min(num_paginas, primera + paginas_por_grupo - 1)
+                        tareas[pool.submit(ocr_paginas, archivo, primera, ultima, dpi)] = ('ocr', archivo, primera)
+                else:
+                    textos = resultado or []
+                    info['paginas'][grupo - 1:grupo - 1 + len(textos)] = textos
+
+    for archivo, info in pendientes.items():
+        nombre = os.path.basename(archivo)
+        contenido = limpiar_texto(formatear_paginas(info.get('paginas', [])))
+        salida = ruta_salida(destino, info['lista'])
+        if not info.get('error'):
+            temporal = salida + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                f.write(contenido)
+            os.replace(temporal, salida)
+
+        fila = {
+            'Lista': info['lista'],
+            'Nombre_Archivo': nombre,
+            'Tamaño_Bytes': os.path.getsize(archivo),
+            'Num_Paginas': len(info.get('paginas', [])),
+            'Num_Caracteres': len(contenido),
+            'Contenido_Extraido': any(pagina.strip() for pagina in info.get('paginas', [])),
+            'OCR': info.get('ocr', False),
+        }
+        # Un archivo con errores no se escribe ni se registra: se conserva la salida anterior
+        # (si la hay) y se reintenta en la próxima ejecución
+        resumen.append(dict(fila, Omitido=False, Error=bool(info.get('error'))))
+        if info.get('error'):
+            print(f"× {nombre}: extracción incompleta, se conserva {os.path.basename(salida)}"
+                  f"{'' if os.path.exists(salida) else ' (no existe)'}")
+            continue
+        estado[nombre] = {'hash': info['hash'], 'resumen': fila}
+        print(f"✓ {nombre}: {fila['Num_Paginas']} páginas, {fila['Num_Caracteres']:,} caracteres"
+              f"{' (OCR)' if fila['OCR'] else ''}")
+
+    _guardar_estado(destino, estado)
+    print(f"\nExtracción completada en {time.perf_counter() - inicio:.1f} s")
+
+    df = pd.DataFrame(resumen)
+    if not df.empty:
+        df = df.sort_values('Lista').reset_index(drop=True)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extrae en paralelo el texto de los planes de trabajo en PDF")
+    parser.add_argument('--directorio', default=DIRECTORIO_PDF)
+    parser.add_argument('--destino', default=DIRECTORIO_TEXTO)
+    parser.add_argument('--procesos', type=int, help="Procesos del pool (por defecto, uno por CPU)")
+    parser.add_argument('--paginas-por-grupo', type=int, default=4, help="Páginas por tarea de OCR")
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--forzar', action='store_true', help="Reprocesa aunque el PDF no haya cambiado")
+    parser.add_argument('--resumen', default='planes_trabajo_resumen.xlsx', help="Archivo Excel con el resumen")
+    args = parser.parse_args()
+
+    df = procesar_planes_trabajo(args.directorio, args.destino, args.procesos,
+                                 args.paginas_por_grupo, args.dpi, args.forzar)
+    if args.resumen and not df.empty:
+        df.to_excel(args.resumen, index=False)
+        print(f"Resumen guardado en {args.resumen}")
+    print(df.to_string() if not df.empty else "No se procesaron archivos")
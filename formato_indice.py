@@ -0,0 +1,725 @@
+import argparse
+import copy
+import json
+import os
+import pickle
+import subprocess
+import sys
+import time
+from collections.abc import Mapping
+
+import faiss
+import numpy as np
+from scipy import sparse
+
+from prefiltro_tfidf import normas_documentos
+from relevancia import precalcular_textos
+
+# Versión 2: el contexto se guarda como rangos sobre un arreglo de oraciones
+VERSION_FORMATO = 2
+ARCHIVO_ACTUAL = 'ACTUAL'
+ARCHIVO_MANIFIESTO = 'manifest.json'
+
+# Columnas con pocos valores distintos: se guardan como códigos de diccionario
+COLUMNAS_CATEGORICAS = ['tipo', 'peso', 'lista', 'partido', 'presidente', 'vicepresidente',
+                        'numero_entrevista', 'descripcion', 'tema']
+# Columnas de texto libre: se guardan como un bloque UTF-8 con desplazamientos
+COLUMNAS_TEXTO = ['texto_original', 'id_oracion']
+# El contexto (unas cinco oraciones por fila) se guarda como rangos sobre un único arreglo de oraciones
+COLUMNA_CONTEXTO = 'texto_contexto'
+
+# Las lecturas con mmap comparten las páginas físicas entre procesos
+FLAG_MMAP_FAISS = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+# ---------------- Columnas respaldadas por arreglos ----------------
+
+def _valor_python(valor):
+    """Convierte escalares de numpy a tipos nativos para poder guardarlos en JSON."""
+    return valor.item() if isinstance(valor, np.generic) else valor
+
+
+class ColumnaTexto:
+    """
+    Secuencia de cadenas almacenada como un bloque de bytes UTF-8 y un arreglo
+    de desplazamientos, ya sea en memoria o abiertos con mmap.
+    """
+
+    __slots__ = ('_datos', '_desplazamientos')
+
+    def __init__(self, datos, desplazamientos):
+        self._datos = datos
+        self._desplazamientos = desplazamientos
+
+    @classmethod
+    def desde_textos(cls, textos):
+        """Empaqueta una secuencia de cadenas en un solo bloque de bytes."""
+        codificados = [str(t).encode('utf-8') for t in textos]
+        desplazamientos = np.zeros(len(codificados) + 1, dtype=np.int64)
+        desplazamientos[1:] = np.cumsum([len(c) for c in codificados])
+        return cls(np.frombuffer(b''.join(codificados), dtype=np.uint8), desplazamientos)
+
+    def __len__(self):
+        return len(self._desplazamientos) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        inicio, fin = self._desplazamientos[i], self._desplazamientos[i + 1]
+        return bytes(self._datos[inicio:fin]).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class ColumnaCategorica:
+    """
+    Secuencia de valores repetidos almacenada como códigos enteros y un
+    diccionario de valores. El código -1 indica que la fila no tiene el campo.
+    """
+
+    __slots__ = ('codigos', 'valores')
+
+    def __init__(self, codigos, valores):
+        self.codigos = codigos
+        self.valores = valores
+
+    @classmethod
+    def desde_filas(cls, filas, nombre):
+        """Codifica el campo `nombre` de cada fila; cada valor distinto se guarda una sola vez."""
+        valores, codigos_por_valor = [], {}
+        codigos = np.full(len(filas), -1, dtype=np.int32)
+        for i, fila in enumerate(filas):
+            if nombre not in fila:
+                continue
+            valor = _valor_python(fila[nombre])
+            # 1, 1.0 y True son iguales para un diccionario pero no deben compartir código
+            clave = (type(valor).__name__, valor)
+            if clave not in codigos_por_valor:
+                codigos_por_valor[clave] = len(valores)
+                valores.append(valor)
+            codigos[i] = codigos_por_valor[clave]
+        return cls(codigos, valores)
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def __getitem__(self, i):
+        codigo = self.codigos[i]
+        return None if codigo < 0 else self.valores[codigo]
+
+
+class ColumnaContexto:
+    """
+    Contexto de cada fila guardado como un rango (inicio, fin, relevante) sobre un
+    único arreglo de oraciones. El texto se arma solo cuando se pide, con el mismo
+    formato que encontrar_contexto(); relevante -1 indica que no se marca ninguna oración.
+    """
+
+    __slots__ = ('oraciones', 'rangos')
+
+    def __init__(self, oraciones, rangos):
+        self.oraciones = oraciones
+        self.rangos = rangos
+
+    def __len__(self):
+        return len(self.rangos)
+
+    def __getitem__(self, i):
+        inicio, fin, relevante = (int(v) for v in self.rangos[i])
+        contexto = []
+        for j in range(inicio, fin):
+            if j == relevante:
+                # Marca la oración como RELEVANTE
+                contexto.append(f"[RELEVANTE] {self.oraciones[j]}")
+            else:
+                contexto.append(self.oraciones[j])
+        return " ".join(contexto)
+
+    def oraciones_de(self, i):
+        """
+        Oraciones del contexto de la fila i como [posición, oración, relevante], con la
+        posición en el arreglo de oraciones. None si el contexto no está dividido en
+        oraciones (relevante -1, como los convertidos sin marca).
+        """
+        inicio, fin, relevante = (int(v) for v in self.rangos[i])
+        if relevante < 0:
+            return None
+        return [[j, self.oraciones[j], j == relevante] for j in range(inicio, fin)]
+
+
+def _contexto_como_rangos(columna):
+    """
+    Devuelve (oraciones, rangos) de una columna de contexto. Los contextos ya
+    armados (formato 1 o pickles anteriores) se toman como una sola oración sin marca.
+    """
+    if isinstance(columna, ColumnaContexto):
+        return columna.oraciones, np.asarray(columna.rangos)
+    rangos = np.column_stack([np.arange(len(columna)), np.arange(1, len(columna) + 1),
+                              np.full(len(columna), -1)])
+    return columna, rangos
+
+
+class FilaMetadata(Mapping):
+    """
+    Vista de solo lectura de una fila de MetadataColumnar. Se comporta como el
+    diccionario original, pero cada campo se lee de su columna al pedirlo.
+    """
+
+    __slots__ = ('_columnas', '_fila')
+
+    def __init__(self, columnas, fila):
+        self._columnas = columnas
+        self._fila = fila
+
+    def __getitem__(self, nombre):
+        columna = self._columnas[nombre]
+        if isinstance(columna, ColumnaCategorica) and columna.codigos[self._fila] < 0:
+            raise KeyError(nombre)
+        return columna[self._fila]
+
+    def __iter__(self):
+        for nombre, columna in self._columnas.items():
+            if not isinstance(columna, ColumnaCategorica) or columna.codigos[self._fila] >= 0:
+                yield nombre
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def oraciones_contexto(self):
+        """Oraciones del contexto con su posición (ver ColumnaContexto.oraciones_de())."""
+        columna = self._columnas.get(COLUMNA_CONTEXTO)
+        return columna.oraciones_de(self._fila) if isinstance(columna, ColumnaContexto) else None
+
+
+class MetadataColumnar:
+    """
+    Vista de la metadata por columnas que se comporta como la lista de
+    diccionarios original: admite len(), índices e iteración.
+    """
+
+    __slots__ = ('columnas', '_num_filas')
+
+    def __init__(self, columnas, num_filas):
+        self.columnas = columnas
+        self._num_filas = num_filas
+
+    def __len__(self):
+        return self._num_filas
+
+    def __getitem__(self, i):
+        if not -self._num_filas <= i < self._num_filas:
+            raise IndexError(i)
+        return FilaMetadata(self.columnas, int(i) % self._num_filas)
+
+    def __iter__(self):
+        for i in range(self._num_filas):
+            yield FilaMetadata(self.columnas, i)
+
+# ---------------- Compactación de la metadata ----------------
+
+MARCA_RELEVANTE = '[RELEVANTE] '
+
+
+def _separar_contexto(fila):
+    """
+    Quita la marca de un contexto armado. Retorna (texto, inicio, fin) con la
+    posición de la oración relevante (el texto_original de la fila), o None si
+    el contexto no tiene la forma que produce encontrar_contexto().
+    """
+    contexto, oracion = fila.get(COLUMNA_CONTEXTO, ''), fila.get('texto_original', '')
+    if not isinstance(contexto, str) or not isinstance(oracion, str) or not oracion:
+        return None
+    posicion = contexto.find(MARCA_RELEVANTE + oracion)
+    if posicion < 0:
+        return None
+    fin = posicion + len(MARCA_RELEVANTE) + len(oracion)
+    texto = contexto[:posicion] + contexto[posicion + len(MARCA_RELEVANTE):]
+    fin_oracion = fin - len(MARCA_RELEVANTE)
+    if (posicion and texto[posicion - 1] != ' ') or (fin_oracion < len(texto) and texto[fin_oracion] != ' '):
+        return None
+    return texto, posicion, fin_oracion
+
+
+def _oraciones_desde_contextos(filas):
+    """
+    Reconstruye oraciones compartidas a partir de contextos ya armados (pickles
+    anteriores al formato 2).
+
+    Las ventanas de filas vecinas se solapan: el final del contexto de una fila
+    coincide con el comienzo del de la siguiente. Los contextos se encadenan en
+    un único texto pegando cada uno sobre el mayor solape con el anterior, y ese
+    texto se corta en los bordes de cada ventana y de cada oración relevante.
+    Los tramos entre cortes (una oración o varias seguidas que ninguna ventana
+    separa) son las oraciones compartidas. Cada fila se verifica contra su
+    contexto original; las que no coinciden quedan como una sola oración sin marca.
+
+    Parámetros:
+        filas (list): Filas con 'texto_contexto' armado y 'texto_original'.
+
+    Retorna:
+        tuple: (oraciones, rangos n x 3 con (inicio, fin, relevante) por fila).
+    """
+    partes, largo, anterior = [], 0, ''
+    # Por fila: (inicio, fin, inicio de la relevante) en el texto encadenado
+    posiciones = []
+    separadores = set()
+    for fila in filas:
+        separado = _separar_contexto(fila)
+        if separado is None:
+            posiciones.append(None)
+            continue
+        texto, inicio_oracion, fin_oracion = separado
+        # Mayor solape: primera aparición de la primera palabra del texto en el
+        # contexto anterior desde la que el resto del contexto anterior es prefijo del texto
+        primera_palabra = texto.split(' ', 1)[0]
+        solape, busqueda = 0, anterior.find(primera_palabra)
+        while busqueda >= 0:
+            tramo = len(anterior) - busqueda
+            if (busqueda == 0 or anterior[busqueda - 1] == ' ') and texto.startswith(anterior[busqueda:]) \
+                    and (tramo == len(texto) or texto[tramo] == ' '):
+                solape = tramo
+                break
+            busqueda = anterior.find(primera_palabra, busqueda + 1)
+        if solape:
+            inicio = largo - solape
+            partes.append(texto[solape:])
+        else:
+            if largo:
+                partes.append(' ')
+                largo += 1
+            inicio = largo
+            partes.append(texto)
+        largo = inicio + len(texto)
+        anterior = texto
+        posiciones.append((inicio, largo, inicio + inicio_oracion))
+        for corte in (inicio - 1, inicio + inicio_oracion - 1, inicio + fin_oracion, largo):
+            separadores.add(corte)
+
+    # Tramos entre separadores: cada separador es el espacio que une dos oraciones
+    texto_completo = ''.join(partes)
+    cortes = sorted(c for c in separadores if 0 <= c < len(texto_completo))
+    limites = [0] + [c + 1 for c in cortes]
+    oraciones = [texto_completo[a:c] for a, c in zip(limites, cortes)] + [texto_completo[limites[-1]:]]
+    limites = np.asarray(limites)
+
+    rangos = np.empty((len(filas), 3), dtype=np.int64)
+    for i, (fila, posicion) in enumerate(zip(filas, posiciones)):
+        if posicion is not None:
+            inicio, fin, inicio_oracion = posicion
+            rango = (np.searchsorted(limites, inicio, side='right') - 1,
+                     np.searchsorted(limites, fin - 1, side='right') if fin > inicio else 0,
+                     np.searchsorted(limites, inicio_oracion, side='right') - 1)
+            contexto = ColumnaContexto(oraciones, [rango])[0]
+            if contexto == fila.get(COLUMNA_CONTEXTO):
+                rangos[i] = rango
+                continue
+        # Sin forma reconocible o sin coincidencia exacta: el contexto completo como una oración
+        rangos[i] = (len(oraciones), len(oraciones) + 1, -1)
+        oraciones.append(fila.get(COLUMNA_CONTEXTO, ''))
+    return oraciones, rangos
+
+
+def compactar_metadata(filas, oraciones=None):
+    """
+    Convierte la metadata en columnas: los campos repetidos como códigos de
+    diccionario, los textos en bloques UTF-8 y el contexto como rangos.
+
+    Parámetros:
+        filas (list): Metadata por fila. El contexto puede venir armado en
+            'texto_contexto' (se vuelve a dividir en las oraciones que comparte con
+            las filas vecinas) o como 'contexto' = (inicio, fin, relevante) sobre `oraciones`.
+        oraciones (list, opcional): Oraciones a las que apuntan los rangos de 'contexto'.
+
+    Retorna:
+        MetadataColumnar: Metadata compacta. Solo se conservan las oraciones
+        que aparecen en algún contexto.
+    """
+    if isinstance(filas, MetadataColumnar):
+        return filas
+    filas = list(filas)
+    oraciones = list(oraciones or [])
+
+    rangos = np.empty((len(filas), 3), dtype=np.int64)
+    armadas = []
+    for i, fila in enumerate(filas):
+        if 'contexto' in fila:
+            rangos[i] = fila['contexto']
+        else:
+            armadas.append(i)
+    if armadas:
+        # Contextos ya armados: se vuelven a dividir en las oraciones que comparten las filas vecinas
+        oraciones_armadas, rangos_armados = _oraciones_desde_contextos([filas[i] for i in armadas])
+        rangos_armados[:, :2] += len(oraciones)
+        rangos_armados[rangos_armados[:, 2] >= 0, 2] += len(oraciones)
+        rangos[armadas] = rangos_armados
+        oraciones.extend(oraciones_armadas)
+
+    # Solo las oraciones cubiertas por algún rango y su nueva posición
+    cobertura = np.zeros(len(oraciones) + 1, dtype=np.int64)
+    np.add.at(cobertura, rangos[:, 0], 1)
+    np.add.at(cobertura, rangos[:, 1], -1)
+    usadas = np.cumsum(cobertura[:-1]) > 0
+    nueva_posicion = np.cumsum(usadas) - 1
+    rangos_compactos = rangos.copy()
+    con_oraciones = rangos[:, 1] > rangos[:, 0]
+    rangos_compactos[con_oraciones, 0] = nueva_posicion[rangos[con_oraciones, 0]]
+    rangos_compactos[con_oraciones, 1] = nueva_posicion[rangos[con_oraciones, 1] - 1] + 1
+    rangos_compactos[~con_oraciones, :2] = 0
+    marcadas = rangos[:, 2] >= 0
+    rangos_compactos[marcadas, 2] = nueva_posicion[rangos[marcadas, 2]]
+
+    columnas = {nombre: ColumnaCategorica.desde_filas(filas, nombre) for nombre in COLUMNAS_CATEGORICAS}
+    for nombre in COLUMNAS_TEXTO:
+        columnas[nombre] = ColumnaTexto.desde_textos(fila.get(nombre, '') for fila in filas)
+    columnas[COLUMNA_CONTEXTO] = ColumnaContexto(
+        ColumnaTexto.desde_textos(o for o, usada in zip(oraciones, usadas) if usada),
+        rangos_compactos.astype(np.int32))
+    return MetadataColumnar(columnas, len(filas))
+
+
+def concatenar_metadata(partes):
+    """
+    Une filas de varias metadatas en una sola metadata compacta.
+
+    Parámetros:
+        partes (list): Pares (metadata, filas); filas None toma todas las filas.
+
+    Retorna:
+        MetadataColumnar: Metadata con las filas en el orden dado.
+    """
+    filas, oraciones = [], []
+    for metadata, seleccion in partes:
+        metadata = compactar_metadata(metadata)
+        columnas = metadata.columnas
+        oraciones_parte, rangos = _contexto_como_rangos(columnas[COLUMNA_CONTEXTO])
+        desplazamiento = len(oraciones)
+        oraciones.extend(oraciones_parte)
+        for i in (range(len(metadata)) if seleccion is None else seleccion):
+            fila = {}
+            for nombre, columna in columnas.items():
+                if nombre == COLUMNA_CONTEXTO:
+                    continue
+                if isinstance(columna, ColumnaCategorica) and columna.codigos[i] < 0:
+                    continue
+                fila[nombre] = columna[i]
+            inicio, fin, relevante = (int(v) for v in rangos[i])
+            fila['contexto'] = (inicio + desplazamiento, fin + desplazamiento,
+                                relevante + desplazamiento if relevante >= 0 else -1)
+            filas.append(fila)
+    return compactar_metadata(filas, oraciones)
+
+# ---------------- Escritura del formato ----------------
+
+def _guardar_texto(directorio, nombre, textos):
+    columna = textos if isinstance(textos, ColumnaTexto) else ColumnaTexto.desde_textos(textos)
+    np.save(os.path.join(directorio, f'{nombre}.datos.npy'), columna._datos)
+    np.save(os.path.join(directorio, f'{nombre}.desplazamientos.npy'), columna._desplazamientos)
+
+
+def guardar_indice(sistema, ruta_destino):
+    """
+    Escribe el sistema de búsqueda como una nueva generación del formato en disco
+    y la marca como actual de forma atómica.
+
+    Parámetros:
+        sistema (dict): Sistema con index, metadata, vectorizer, tfidf_matrix y textos_validos.
+        ruta_destino (str): Directorio raíz del índice.
+
+    Retorna:
+        str: Ruta de la generación escrita.
+    """
+    os.makedirs(ruta_destino, exist_ok=True)
+    base = time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+    nombre_generacion, sufijo = base, 1
+    while os.path.exists(os.path.join(ruta_destino, nombre_generacion)):
+        nombre_generacion = f'{base}-{sufijo}'
+        sufijo += 1
+    directorio = os.path.join(ruta_destino, nombre_generacion)
+    os.makedirs(os.path.join(directorio, 'metadata'))
+
+    index = sistema['index']
+    if isinstance(index, (bytes, np.ndarray)):
+        index = faiss.deserialize_index(index)
+    faiss.write_index(index, os.path.join(directorio, 'faiss.index'))
+
+    tfidf = sparse.csr_matrix(sistema['tfidf_matrix'])
+    np.save(os.path.join(directorio, 'tfidf_data.npy'), tfidf.data)
+    np.save(os.path.join(directorio, 'tfidf_indices.npy'), tfidf.indices)
+    np.save(os.path.join(directorio, 'tfidf_indptr.npy'), tfidf.indptr)
+    # Índice invertido (término -> documentos) y normas para el prefiltro
+    postings = tfidf.tocsc()
+    np.save(os.path.join(directorio, 'postings_data.npy'), postings.data)
+    np.save(os.path.join(directorio, 'postings_indices.npy'), postings.indices)
+    np.save(os.path.join(directorio, 'postings_indptr.npy'), postings.indptr)
+    np.save(os.path.join(directorio, 'tfidf_normas.npy'), normas_documentos(tfidf))
+
+    # stop_words_ solo sirve para introspección y puede ocupar más que el vocabulario
+    vectorizer = copy.copy(sistema['vectorizer'])
+    if hasattr(vectorizer, 'stop_words_'):
+        del vectorizer.stop_words_
+    with open(os.path.join(directorio, 'vectorizer.pkl'), 'wb') as f:
+        pickle.dump(vectorizer, f)
+
+    metadata = compactar_metadata(sistema['metadata'])
+    directorio_meta = os.path.join(directorio, 'metadata')
+    categorias = {}
+    for nombre in COLUMNAS_CATEGORICAS:
+        columna = metadata.columnas[nombre]
+        np.save(os.path.join(directorio_meta, f'{nombre}.codigos.npy'), columna.codigos)
+        categorias[nombre] = [_valor_python(valor) for valor in columna.valores]
+    for nombre in COLUMNAS_TEXTO:
+        _guardar_texto(directorio_meta, nombre, metadata.columnas[nombre])
+    oraciones, rangos = _contexto_como_rangos(metadata.columnas[COLUMNA_CONTEXTO])
+    _guardar_texto(directorio_meta, 'oraciones', oraciones)
+    np.save(os.path.join(directorio_meta, f'{COLUMNA_CONTEXTO}.rangos.npy'), rangos.astype(np.int32))
+    _guardar_texto(directorio, 'textos_validos', sistema['textos_validos'])
+
+    # Datos por documento para la relevancia vectorizada (se reutilizan si ya vienen calculados)
+    textos_normalizados, num_palabras = sistema.get('textos_normalizados'), sistema.get('num_palabras')
+    if textos_normalizados is None or num_palabras is None or len(num_palabras) != len(metadata):
+        textos_normalizados, num_palabras = precalcular_textos(metadata)
+    _guardar_texto(directorio, 'textos_normalizados', textos_normalizados)
+    np.save(os.path.join(directorio, 'num_palabras.npy'), num_palabras)
+
+    manifiesto = {
+        'formato': VERSION_FORMATO,
+        'num_documentos': len(metadata),
+        'dimension': index.d,
+        'tfidf_shape': list(tfidf.shape),
+        'columnas_categoricas': categorias,
+        'columnas_texto': COLUMNAS_TEXTO,
+        'columna_contexto': COLUMNA_CONTEXTO,
+        'config_indice': sistema.get('config_indice') or {'tipo': 'flat'},
+        'creado_en': time.time(),
+    }
+    with open(os.path.join(directorio, ARCHIVO_MANIFIESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False)
+
+    # El puntero se reemplaza al final para que los lectores nunca vean una generación incompleta
+    temporal = os.path.join(ruta_destino, ARCHIVO_ACTUAL + '.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(nombre_generacion)
+    os.replace(temporal, os.path.join(ruta_destino, ARCHIVO_ACTUAL))
+    return directorio
+
+# ---------------- Lectura del formato ----------------
+
+def directorio_actual(ruta):
+    """
+    Resuelve el directorio de la generación vigente de un índice.
+
+    Parámetros:
+        ruta (str): Directorio raíz del índice.
+
+    Retorna:
+        str: Ruta de la generación apuntada por el archivo ACTUAL.
+    """
+    with open(os.path.join(ruta, ARCHIVO_ACTUAL), encoding='utf-8') as f:
+        return os.path.join(ruta, f.read().strip())
+
+
+def _abrir_texto(directorio, nombre):
+    datos = np.load(os.path.join(directorio, f'{nombre}.datos.npy'), mmap_mode='r')
+    desplazamientos = np.load(os.path.join(directorio, f'{nombre}.desplazamientos.npy'), mmap_mode='r')
+    return ColumnaTexto(datos, desplazamientos)
+
+
+def abrir_indice(ruta):
+    """
+    Abre la generación vigente de un índice en disco usando mmap, sin copiar
+    los arreglos a memoria privada del proceso.
+
+    Parámetros:
+        ruta (str): Directorio raíz del índice.
+
+    Retorna:
+        dict: Sistema de búsqueda con las mismas claves que el pickle original.
+    """
+    directorio = directorio_actual(ruta)
+    with open(os.path.join(directorio, ARCHIVO_MANIFIESTO), encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    if manifiesto['formato'] > VERSION_FORMATO:
+        raise ValueError(f"Formato de índice {manifiesto['formato']} no soportado")
+
+    index = faiss.read_index(os.path.join(directorio, 'faiss.index'), FLAG_MMAP_FAISS)
+
+    tfidf = sparse.csr_matrix(
+        (np.load(os.path.join(directorio, 'tfidf_data.npy'), mmap_mode='r'),
+         np.load(os.path.join(directorio, 'tfidf_indices.npy'), mmap_mode='r'),
+         np.load(os.path.join(directorio, 'tfidf_indptr.npy'), mmap_mode='r')),
+        shape=tuple(manifiesto['tfidf_shape']), copy=False)
+
+    postings = sparse.csc_matrix(
+        (np.load(os.path.join(directorio, 'postings_data.npy'), mmap_mode='r'),
+         np.load(os.path.join(directorio, 'postings_indices.npy'), mmap_mode='r'),
+         np.load(os.path.join(directorio, 'postings_indptr.npy'), mmap_mode='r')),
+        shape=tuple(manifiesto['tfidf_shape']), copy=False)
+
+    with open(os.path.join(directorio, 'vectorizer.pkl'), 'rb') as f:
+        vectorizer = pickle.load(f)
+
+    directorio_meta = os.path.join(directorio, 'metadata')
+    columnas = {}
+    for nombre, valores in manifiesto['columnas_categoricas'].items():
+        codigos = np.load(os.path.join(directorio_meta, f'{nombre}.codigos.npy'), mmap_mode='r')
+        columnas[nombre] = ColumnaCategorica(codigos, valores)
+    for nombre in manifiesto['columnas_texto']:
+        columnas[nombre] = _abrir_texto(directorio_meta, nombre)
+    # En el formato 1 el contexto es una columna de texto más
+    if 'columna_contexto' in manifiesto:
+        nombre = manifiesto['columna_contexto']
+        columnas[nombre] = ColumnaContexto(
+            _abrir_texto(directorio_meta, 'oraciones'),
+            np.load(os.path.join(directorio_meta, f'{nombre}.rangos.npy'), mmap_mode='r'))
+
+    return {
+        'index': index,
+        'metadata': MetadataColumnar(columnas, manifiesto['num_documentos']),
+        'vectorizer': vectorizer,
+        'tfidf_matrix': tfidf,
+        'tfidf_postings': postings,
+        'tfidf_normas': np.load(os.path.join(directorio, 'tfidf_normas.npy'), mmap_mode='r'),
+        'textos_validos': _abrir_texto(directorio, 'textos_validos'),
+        'textos_normalizados': _abrir_texto(directorio, 'textos_normalizados'),
+        'num_palabras': np.load(os.path.join(directorio, 'num_palabras.npy'), mmap_mode='r'),
+        'config_indice': manifiesto.get('config_indice'),
+        'directorio': directorio,
+    }
+
+# ---------------- Conversión y comparación ----------------
+
+def convertir_pickle(ruta_pickle, ruta_destino):
+    """
+    Convierte un sistema_busqueda.pkl existente al formato en disco.
+
+    Parámetros:
+        ruta_pickle (str): Ruta del pickle original.
+        ruta_destino (str): Directorio raíz del índice a crear o actualizar.
+
+    Retorna:
+        str: Ruta de la generación escrita.
+    """
+    with open(ruta_pickle, 'rb') as f:
+        sistema = pickle.load(f)
+    return guardar_indice(sistema, ruta_destino)
+
+
+def _medir_carga(ruta):
+    from motor_busqueda import cargar_sistema
+    import resource
+    # Importar sklearn antes de medir para no contar su tiempo de importación
+    import sklearn.feature_extraction.text  # noqa: F401
+
+    inicio = time.perf_counter()
+    sistema = cargar_sistema(ruta)
+    segundos = time.perf_counter() - inicio
+    return {
+        'ruta': ruta,
+        'segundos': segundos,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'documentos': len(sistema['metadata']) if sistema else 0,
+    }
+
+
+def comparar_carga(ruta_pickle, ruta_indice, repeticiones=3):
+    """
+    Compara el tiempo de carga y la memoria residente del pickle frente al
+    formato en disco. Cada medición se hace en un proceso nuevo.
+
+    Parámetros:
+        ruta_pickle (str): Ruta del pickle original.
+        ruta_indice (str): Directorio raíz del índice en disco.
+        repeticiones (int): Número de cargas por formato.
+
+    Retorna:
+        dict: Mediciones por formato.
+    """
+    resultados = {}
+    for nombre, ruta in (('pickle', ruta_pickle), ('directorio', ruta_indice)):
+        mediciones = []
+        for _ in range(repeticiones):
+            salida = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '_medir', ruta],
+                capture_output=True, text=True, check=True)
+            mediciones.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+        resultados[nombre] = {
+            'segundos_min': min(m['segundos'] for m in mediciones),
+            'max_rss_mb': max(m['max_rss_mb'] for m in mediciones),
+            'documentos': mediciones[0]['documentos'],
+        }
+    return resultados
+
+
+def comparar_memoria_metadata(ruta_pickle):
+    """
+    Mide la memoria que ocupa la metadata de un pickle como lista de diccionarios
+    y como MetadataColumnar.
+
+    Parámetros:
+        ruta_pickle (str): Ruta del pickle original.
+
+    Retorna:
+        dict: MB asignados por cada representación, número de documentos y
+        contextos que se guardan completos por no poder dividirse en oraciones.
+    """
+    import gc
+    import tracemalloc
+
+    with open(ruta_pickle, 'rb') as f:
+        datos = pickle.dumps(pickle.load(f)['metadata'])
+    gc.collect()
+
+    tracemalloc.start()
+    lista = pickle.loads(datos)
+    mb_lista = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    compacta = compactar_metadata(lista)
+    gc.collect()
+    mb_compacta = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    # Filas cuyo contexto no se pudo dividir en oraciones: se guardan completas
+    sin_dividir = int((np.asarray(compacta.columnas[COLUMNA_CONTEXTO].rangos)[:, 2] < 0).sum())
+    return {'documentos': len(compacta), 'mb_lista': mb_lista, 'mb_compacta': mb_compacta,
+            'contextos_sin_dividir': sin_dividir}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Formato en disco del sistema de búsqueda")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    p_convertir = subparsers.add_parser('convertir', help="Convierte un pickle al formato en disco")
+    p_convertir.add_argument('pickle', nargs='?', default='sistema_busqueda.pkl')
+    p_convertir.add_argument('destino', nargs='?', default='indice_busqueda')
+
+    p_comparar = subparsers.add_parser('comparar', help="Compara tiempos de carga de ambos formatos")
+    p_comparar.add_argument('pickle', nargs='?', default='sistema_busqueda.pkl')
+    p_comparar.add_argument('indice', nargs='?', default='indice_busqueda')
+    p_comparar.add_argument('--repeticiones', type=int, default=3)
+
+    p_memoria = subparsers.add_parser('memoria', help="Compara la memoria de la metadata en lista y en columnas")
+    p_memoria.add_argument('pickle', nargs='?', default='sistema_busqueda.pkl')
+
+    p_medir = subparsers.add_parser('_medir')
+    p_medir.add_argument('ruta')
+
+    args = parser.parse_args()
+    if args.comando == 'convertir':
+        print(f"Generación escrita en {convertir_pickle(args.pickle, args.destino)}")
+    elif args.comando == 'comparar':
+        for nombre, datos in comparar_carga(args.pickle, args.indice, args.repeticiones).items():
+            print(f"{nombre:>10}: {datos['segundos_min'] * 1000:8.1f} ms, "
+                  f"RSS máx {datos['max_rss_mb']:8.1f} MB, {datos['documentos']} documentos")
+    elif args.comando == 'memoria':
+        r = comparar_memoria_metadata(args.pickle)
+        print(f"{r['documentos']} documentos: lista {r['mb_lista']:.1f} MB -> columnas {r['mb_compacta']:.1f} MB")
+        if r['contextos_sin_dividir']:
+            print(f"⚠️ {r['contextos_sin_dividir']} contextos no se pudieron dividir en oraciones "
+                  f"y se guardan completos, sin compartir texto con sus vecinos")
+    else:
+        print(json.dumps(_medir_carga(args.ruta)))
@@ -0,0 +1,407 @@
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+TIPOS_INDICE = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq')
+# Cómo se guardan los vectores en que se busca: float32 sin pérdida o cuantización escalar
+CODIFICACIONES = ('float32', 'float16', 'int8')
+
+CONFIG_POR_DEFECTO = {
+    'tipo': 'flat',
+    'nlist': None,          # Listas invertidas de IVF (None: 4 * sqrt(n))
+    'nprobe': 16,           # Listas visitadas por consulta en IVF
+    'M': 32,                # Vecinos por nodo en HNSW
+    'ef_construction': 200,
+    'ef_search': 64,        # Tamaño de la lista de candidatos de HNSW al consultar
+    'pq_m': 64,             # Subcuantizadores de IVF-PQ (debe dividir a la dimensión)
+    'pq_bits': 8,
+    'codificacion': 'float32',
+    'pca': None,            # Dimensiones tras reducir con PCA al construir (None: sin reducción)
+    'reordenar': 4,         # Con vectores compactos, candidatos por resultado que se reordenan
+                            # con la distancia exacta (0: sin reordenar)
+}
+
+# ---------------- Construcción de índices aproximados ----------------
+
+def completar_config(config=None):
+    """
+    Completa una configuración de índice con los valores por defecto.
+
+    Parámetros:
+        config (dict | str, opcional): Configuración parcial o solo el tipo de índice.
+
+    Retorna:
+        dict: Configuración completa.
+    """
+    if isinstance(config, str):
+        config = {'tipo': config}
+    completa = dict(CONFIG_POR_DEFECTO)
+    completa.update({clave: valor for clave, valor in (config or {}).items() if valor is not None})
+    if completa['tipo'] not in TIPOS_INDICE:
+        raise ValueError(f"Tipo de índice desconocido: {completa['tipo']}. Opciones: {', '.join(TIPOS_INDICE)}")
+    if completa['codificacion'] not in CODIFICACIONES:
+        raise ValueError(f"Codificación desconocida: {completa['codificacion']}. "
+                         f"Opciones: {', '.join(CODIFICACIONES)}")
+    if completa['tipo'] == 'ivf_pq' and completa['codificacion'] != 'float32':
+        raise ValueError("IVF-PQ ya comprime los vectores; la cuantización escalar no se combina con él")
+    return completa
+
+
+def es_compacto(config):
+    """True si la configuración guarda los vectores cuantizados o reducidos con PCA."""
+    return config.get('codificacion', 'float32') != 'float32' or bool(config.get('pca'))
+
+
+def crear_indice_faiss(embeddings, config=None):
+    """
+    Crea, entrena y llena un índice FAISS del tipo indicado en la configuración.
+
+    Con codificación float16 o int8 los vectores se guardan con cuantización escalar
+    (2 o 1 byte por valor) y con `pca` se proyectan antes a menos dimensiones. En esos
+    casos la búsqueda recorre los vectores compactos y, si `reordenar` > 0, el índice
+    conserva también los vectores float32 para reordenar la preselección con la
+    distancia exacta (IndexRefineFlat). En el formato en disco esos vectores se abren
+    con mmap y solo se leen las páginas de la preselección.
+
+    Parámetros:
+        embeddings (np.ndarray): Embeddings del corpus (n x d).
+        config (dict | str, opcional): Configuración del índice (ver CONFIG_POR_DEFECTO).
+
+    Retorna:
+        tuple: (índice FAISS, configuración completa usada).
+    """
+    config = completar_config(config)
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    n, dimension_original = embeddings.shape
+
+    dimension = dimension_original
+    if config['pca']:
+        if not 0 < config['pca'] < dimension_original:
+            raise ValueError(f"pca={config['pca']} debe ser menor que la dimensión {dimension_original}")
+        dimension = config['pca']
+    tipo_sq = {'float16': faiss.ScalarQuantizer.QT_fp16,
+               'int8': faiss.ScalarQuantizer.QT_8bit}.get(config['codificacion'])
+
+    if config['tipo'] == 'flat':
+        if tipo_sq is None:
+            index = faiss.IndexFlatL2(dimension)
+        else:
+            index = faiss.IndexScalarQuantizer(dimension, tipo_sq, faiss.METRIC_L2)
+    elif config['tipo'] == 'hnsw':
+        if tipo_sq is None:
+            index = faiss.IndexHNSWFlat(dimension, config['M'])
+        else:
+            index = faiss.IndexHNSWSQ(dimension, tipo_sq, config['M'])
+        index.hnsw.efConstruction = config['ef_construction']
+    else:
+        # Con pocos vectores por lista el entrenamiento de k-means no converge bien
+        nlist = config['nlist'] or int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n // 39))
+        config['nlist'] = nlist
+        cuantizador = faiss.IndexFlatL2(dimension)
+        if config['tipo'] == 'ivf_flat' and tipo_sq is None:
+            index = faiss.IndexIVFFlat(cuantizador, dimension, nlist)
+        elif config['tipo'] == 'ivf_flat':
+            index = faiss.IndexIVFScalarQuantizer(cuantizador, dimension, nlist, tipo_sq)
+        else:
+            if dimension % config['pq_m'] != 0:
+                raise ValueError(f"pq_m={config['pq_m']} debe dividir a la dimensión {dimension}")
+            index = faiss.IndexIVFPQ(cuantizador, dimension, nlist, config['pq_m'], config['pq_bits'])
+
+    if config['pca']:
+        index = faiss.IndexPreTransform(faiss.PCAMatrix(dimension_original, dimension), index)
+    if es_compacto(config) and config['reordenar']:
+        index = faiss.IndexRefineFlat(index)
+    # Entrena PCA, la cuantización escalar y las listas de IVF, en ese orden
+    if not index.is_trained:
+        index.train(embeddings)
+
+    index.add(embeddings)
+    aplicar_config_busqueda(index, config)
+    return index, config
+
+
+def componentes_indice(index):
+    """
+    Separa un índice compuesto por crear_indice_faiss() en sus partes.
+
+    Parámetros:
+        index (faiss.Index): Índice FAISS.
+
+    Retorna:
+        tuple: (índice con los vectores float32 para reordenar o None,
+        transformación previa (PCA) o None, índice en que se busca).
+    """
+    exacto = transformacion = None
+    if isinstance(index, faiss.IndexRefine):
+        exacto = faiss.downcast_index(index.refine_index)
+        index = faiss.downcast_index(index.base_index)
+    if isinstance(index, faiss.IndexPreTransform):
+        transformacion = index
+        index = faiss.downcast_index(index.index)
+    return exacto, transformacion, index
+
+
+def aplicar_config_busqueda(index, config=None):
+    """
+    Ajusta los parámetros de consulta (nprobe, efSearch) de un índice cargado y lo
+    prepara para reconstruir filas (ver habilitar_reconstruccion()).
+
+    Parámetros:
+        index (faiss.Index): Índice FAISS.
+        config (dict, opcional): Configuración guardada con el índice.
+    """
+    habilitar_reconstruccion(index)
+    if not config:
+        return
+    if isinstance(index, faiss.IndexRefine) and config.get('reordenar'):
+        index.k_factor = float(config['reordenar'])
+    _, _, index = componentes_indice(index)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = config.get('nprobe', ivf.nprobe)
+    if hasattr(index, 'hnsw'):
+        index.hnsw.efSearch = config.get('ef_search', index.hnsw.efSearch)
+
+
+def habilitar_reconstruccion(index):
+    """
+    Crea el mapa directo fila -> lista de un índice IVF, que necesita para reconstruir
+    los vectores de filas sueltas (la búsqueda restringida a candidatos los usa).
+
+    Parámetros:
+        index (faiss.Index): Índice FAISS.
+    """
+    _, _, base = componentes_indice(index)
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+
+
+def puede_reconstruir(index):
+    """True si el índice puede reconstruir (o decodificar) los vectores de filas sueltas."""
+    if isinstance(index, (faiss.IndexFlat, faiss.IndexScalarQuantizer, faiss.IndexHNSW)):
+        return True
+    ivf = faiss.try_extract_index_ivf(index)
+    return ivf is not None and ivf.direct_map.type != faiss.DirectMap.NoMap
+
+
+def parametros_busqueda(index, config=None, selector=None):
+    """
+    Crea los parámetros de búsqueda del tipo que espera cada índice.
+
+    Parámetros:
+        index (faiss.Index): Índice FAISS.
+        config (dict, opcional): Configuración guardada con el índice.
+        selector (faiss.IDSelector, opcional): Restringe la búsqueda a ciertos ids.
+
+    Retorna:
+        faiss.SearchParameters: Parámetros para index.search().
+    """
+    config = config or {}
+    if faiss.try_extract_index_ivf(index) is not None:
+        ivf = faiss.extract_index_ivf(index)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=config.get('nprobe', ivf.nprobe))
+    if hasattr(index, 'hnsw'):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=config.get('ef_search', index.hnsw.efSearch))
+    return faiss.SearchParameters(sel=selector)
+
+# ---------------- Reporte de recall y latencia ----------------
+
+def reporte_recall_latencia(embeddings, configs, k=10, num_consultas=200, semilla=0, num_candidatos=None):
+    """
+    Compara distintas configuraciones de índice contra la búsqueda exacta (Flat).
+
+    Además del recall se informa la memoria: mb_busqueda es lo que se recorre al
+    buscar (los vectores compactos en las configuraciones cuantizadas o con PCA) y
+    mb_total incluye los vectores float32 que se guardan para reordenar.
+
+    Las consultas son oraciones del propio corpus con un pequeño ruido, de modo que
+    la distribución de las consultas se parezca a la del corpus.
+
+    Se mide también el camino que usa buscar() en la aplicación: la búsqueda
+    restringida a las filas que entrega el prefiltro (buscar_en_candidatos()). Cada
+    consulta recibe num_candidatos filas al azar y su referencia son los k vecinos
+    exactos entre ellas.
+
+    Parámetros:
+        embeddings (np.ndarray): Embeddings del corpus (n x d).
+        configs (list): Configuraciones de índice a evaluar.
+        k (int): Número de vecinos para recall@k.
+        num_consultas (int): Número de consultas de prueba.
+        semilla (int): Semilla aleatoria.
+        num_candidatos (int, opcional): Filas candidatas por consulta en la búsqueda
+            restringida (por defecto prefiltro_tfidf.MAX_CANDIDATOS).
+
+    Retorna:
+        list: Por configuración, recall@k y latencias p50/p99 (ms) de la búsqueda completa
+        y de la restringida a candidatos, tiempo de construcción y memoria en MB (también
+        relativa al IndexFlatL2 float32).
+    """
+    from prefiltro_tfidf import MAX_CANDIDATOS, buscar_en_candidatos
+
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    rng = np.random.default_rng(semilla)
+    filas = rng.choice(len(embeddings), size=min(num_consultas, len(embeddings)), replace=False)
+    ruido = rng.normal(scale=embeddings.std() * 0.1, size=(len(filas), embeddings.shape[1]))
+    consultas = (embeddings[filas] + ruido).astype('float32')
+
+    exacto = faiss.IndexFlatL2(embeddings.shape[1])
+    exacto.add(embeddings)
+    _, referencia = exacto.search(consultas, k)
+    mb_flat = embeddings.nbytes / 1e6
+
+    num_candidatos = min(num_candidatos or MAX_CANDIDATOS, len(embeddings))
+    candidatos = [np.sort(rng.choice(len(embeddings), size=num_candidatos, replace=False)) for _ in consultas]
+    referencia_candidatos = []
+    for consulta, filas_candidatas in zip(consultas, candidatos):
+        _, I = faiss.knn(consulta[None, :], embeddings[filas_candidatas], min(k, num_candidatos))
+        referencia_candidatos.append(filas_candidatas[I[0]])
+
+    reporte = []
+    for config in configs:
+        inicio = time.perf_counter()
+        index, config = crear_indice_faiss(embeddings, config)
+        construccion = time.perf_counter() - inicio
+
+        latencias, aciertos = [], 0
+        for i, consulta in enumerate(consultas):
+            inicio = time.perf_counter()
+            _, I = index.search(consulta[None, :], k)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            aciertos += len(set(I[0].tolist()) & set(referencia[i].tolist()))
+
+        latencias_candidatos, aciertos_candidatos = [], 0
+        for i, consulta in enumerate(consultas):
+            inicio = time.perf_counter()
+            _, I = buscar_en_candidatos(index, consulta[None, :], candidatos[i], k, config)
+            latencias_candidatos.append((time.perf_counter() - inicio) * 1000)
+            aciertos_candidatos += len(set(I[0].tolist()) & set(referencia_candidatos[i].tolist()))
+
+        mb_total = len(faiss.serialize_index(index)) / 1e6
+        _, transformacion, base = componentes_indice(index)
+        mb_busqueda = len(faiss.serialize_index(base if transformacion is None else transformacion)) / 1e6
+        reporte.append({
+            'config': config,
+            'recall_at_k': aciertos / (len(consultas) * k),
+            'p50_ms': float(np.percentile(latencias, 50)),
+            'p99_ms': float(np.percentile(latencias, 99)),
+            'recall_candidatos_at_k': aciertos_candidatos / sum(len(r) for r in referencia_candidatos),
+            'p50_ms_candidatos': float(np.percentile(latencias_candidatos, 50)),
+            'p99_ms_candidatos': float(np.percentile(latencias_candidatos, 99)),
+            'construccion_s': construccion,
+            'mb_busqueda': mb_busqueda,
+            'mb_total': mb_total,
+            'fraccion_memoria_busqueda': mb_busqueda / mb_flat,
+        })
+    return reporte
+
+
+def describir_config(config):
+    """Descripción corta de una configuración para los reportes."""
+    descripcion = config['tipo'] + {'flat': '',
+                                    'ivf_flat': f" nlist={config['nlist']} nprobe={config['nprobe']}",
+                                    'hnsw': f" M={config['M']} efSearch={config['ef_search']}",
+                                    'ivf_pq': f" nlist={config['nlist']} nprobe={config['nprobe']} m={config['pq_m']}"
+                                    }[config['tipo']]
+    if es_compacto(config):
+        descripcion += f" {config['codificacion']}"
+        if config['pca']:
+            descripcion += f" pca={config['pca']}"
+        descripcion += f" reordenar={config['reordenar']}" if config['reordenar'] else " sin reordenar"
+    return descripcion
+
+
+def embeddings_del_indice(index):
+    """
+    Recupera los vectores almacenados en un índice plano.
+
+    Parámetros:
+        index (faiss.Index): Índice FAISS que permite reconstruir vectores.
+
+    Retorna:
+        np.ndarray: Embeddings del corpus (n x d).
+    """
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def vectores_exactos(index):
+    """
+    Índice del que se reconstruyen los vectores float32 sin pérdida: el propio índice
+    si es plano, el plano que guarda un índice compacto para reordenar, el
+    almacenamiento plano de HNSW o un IVF-Flat (con su mapa directo).
+
+    Parámetros:
+        index (faiss.Index): Índice FAISS.
+
+    Retorna:
+        faiss.Index | None: None si el índice no conserva los vectores exactos.
+    """
+    if isinstance(index, faiss.IndexFlat):
+        return index
+    exacto, transformacion, base = componentes_indice(index)
+    if exacto is not None or transformacion is not None:
+        return exacto
+    if isinstance(base, faiss.IndexHNSW):
+        almacenamiento = faiss.downcast_index(base.storage)
+        return almacenamiento if isinstance(almacenamiento, faiss.IndexFlat) else None
+    if isinstance(base, faiss.IndexIVFFlat):
+        habilitar_reconstruccion(base)
+        return base
+    return None
+
+
+if __name__ == "__main__":
+    from motor_busqueda import cargar_sistema
+
+    parser = argparse.ArgumentParser(description="Reporte de recall@k y latencia de índices aproximados")
+    parser.add_argument('--sistema', default='sistema_busqueda.pkl', help="Pickle o directorio con un índice Flat")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--candidatos', type=int, help="Filas candidatas por consulta en la búsqueda restringida")
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el reporte")
+    parser.add_argument('--compactos', action='store_true',
+                        help="Compara vectores float16, int8 y con PCA en lugar de los índices aproximados")
+    args = parser.parse_args()
+
+    sistema = cargar_sistema(args.sistema)
+    embeddings = embeddings_del_indice(sistema['index'])
+    dimension = embeddings.shape[1]
+    if args.compactos:
+        # Vectores cuantizados y reducidos con PCA frente al IndexFlatL2 actual
+        configs = [{'tipo': 'flat'}]
+        for codificacion in ('float16', 'int8'):
+            configs += [{'tipo': 'flat', 'codificacion': codificacion, 'reordenar': 0},
+                        {'tipo': 'flat', 'codificacion': codificacion}]
+        for pca in (dimension // 2, dimension // 4):
+            configs += [{'tipo': 'flat', 'pca': pca, 'reordenar': 0},
+                        {'tipo': 'flat', 'pca': pca, 'codificacion': 'int8'},
+                        {'tipo': 'flat', 'pca': pca, 'codificacion': 'int8', 'reordenar': 10}]
+    else:
+        # 64 subcuantizadores para los 768 valores de mpnet; en otras dimensiones, un divisor
+        pq_m = int(np.gcd(64, dimension))
+        configs = [
+            {'tipo': 'flat'},
+            {'tipo': 'ivf_flat', 'nprobe': 8},
+            {'tipo': 'ivf_flat', 'nprobe': 32},
+            {'tipo': 'hnsw', 'M': 32, 'ef_search': 32},
+            {'tipo': 'hnsw', 'M': 32, 'ef_search': 128},
+            {'tipo': 'ivf_pq', 'nprobe': 32, 'pq_m': pq_m},
+        ]
+    reporte = reporte_recall_latencia(embeddings, configs, args.k, args.consultas, num_candidatos=args.candidatos)
+
+    # "cand." es la búsqueda restringida a las filas del prefiltro, la que usa buscar()
+    print(f"{'configuración':<50} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'recall cand.':>12} {'p50 cand.':>10} {'build s':>8} {'MB busq.':>9} {'MB total':>9} {'memoria':>8}")
+    for r in reporte:
+        print(f"{describir_config(r['config']):<50} {r['recall_at_k']:>10.3f} {r['p50_ms']:>8.3f} "
+              f"{r['p99_ms']:>8.3f} {r['recall_candidatos_at_k']:>12.3f} {r['p50_ms_candidatos']:>10.3f} "
+              f"{r['construccion_s']:>8.2f} {r['mb_busqueda']:>9.1f} {r['mb_total']:>9.1f} "
+              f"{r['fraccion_memoria_busqueda']:>8.1%}")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(reporte, f, indent=2)
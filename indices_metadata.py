@@ -0,0 +1,198 @@
+import time
+
+import numpy as np
+
+from procesamiento_texto import normalizar_texto
+
+# Palabras de los nombres que no identifican a un candidato por sí solas
+PARTICULAS_NOMBRE = {'del', 'las', 'los'}
+
+# ---------------- Índices de búsqueda sobre la metadata ----------------
+
+def _codificar_columna(metadata, nombre):
+    """
+    Obtiene los códigos por fila y los valores distintos de una columna de la metadata.
+
+    Parámetros:
+        metadata (list | MetadataColumnar): Metadata del sistema de búsqueda.
+        nombre (str): Nombre de la columna.
+
+    Retorna:
+        tuple: (arreglo de códigos por fila, lista de valores distintos). El código -1
+        indica que la fila no tiene el campo.
+    """
+    columnas = getattr(metadata, 'columnas', None)
+    if columnas is not None and hasattr(columnas.get(nombre), 'codigos'):
+        columna = columnas[nombre]
+        return np.asarray(columna.codigos), list(columna.valores)
+
+    valores, codigos_por_valor = [], {}
+    codigos = np.full(len(metadata), -1, dtype=np.int32)
+    for fila, meta in enumerate(metadata):
+        if nombre not in meta:
+            continue
+        valor = meta[nombre]
+        if valor not in codigos_por_valor:
+            codigos_por_valor[valor] = len(valores)
+            valores.append(valor)
+        codigos[fila] = codigos_por_valor[valor]
+    return codigos, valores
+
+
+def _agrupar_filas(codigos, claves):
+    """
+    Agrupa los números de fila por clave a partir de los códigos de una columna.
+
+    Parámetros:
+        codigos (np.ndarray): Código del valor de cada fila.
+        claves (list): Clave de índice para cada código (varios códigos pueden compartir clave).
+
+    Retorna:
+        dict: Clave -> arreglo ordenado de números de fila.
+    """
+    orden = np.argsort(codigos, kind='stable')
+    codigos_ordenados = codigos[orden]
+    grupos = {}
+    for codigo, clave in enumerate(claves):
+        inicio, fin = np.searchsorted(codigos_ordenados, [codigo, codigo + 1])
+        if fin > inicio:
+            grupos.setdefault(clave, []).append(orden[inicio:fin])
+    return {clave: np.sort(np.concatenate(partes)).astype(np.int64) for clave, partes in grupos.items()}
+
+
+class IndicesMetadata:
+    """
+    Índices precalculados de la metadata para resolver por búsqueda en diccionario
+    las consultas por nombre de candidato, lista, partido y tipo de documento.
+    """
+
+    VACIO = np.empty(0, dtype=np.int64)
+
+    def __init__(self, metadata):
+        """
+        Parámetros:
+            metadata (list | MetadataColumnar): Metadata del sistema de búsqueda.
+        """
+        codigos, valores = _codificar_columna(metadata, 'presidente')
+        # Cada valor distinto se normaliza una sola vez
+        normalizados = [normalizar_texto(v) for v in valores]
+        self.nombres = sorted(set(normalizados))
+        codigo_por_nombre = {nombre: i for i, nombre in enumerate(self.nombres)}
+        traduccion = np.array([codigo_por_nombre[n] for n in normalizados] + [-1], dtype=np.int32)
+        # Código del nombre normalizado del candidato en cada fila (-1 si no tiene)
+        self.codigo_nombre = traduccion[codigos]
+        self._por_nombre = _agrupar_filas(codigos, normalizados)
+
+        codigos, valores = _codificar_columna(metadata, 'lista')
+        self._por_lista = _agrupar_filas(codigos, [str(v) for v in valores])
+
+        codigos, valores = _codificar_columna(metadata, 'partido')
+        self._por_partido = _agrupar_filas(codigos, [normalizar_texto(v) for v in valores])
+
+        codigos, valores = _codificar_columna(metadata, 'tipo')
+        self._por_tipo = _agrupar_filas(codigos, [str(v).lower() for v in valores])
+        # Filas de cada candidato por código de nombre normalizado, para armar particiones
+        self._por_codigo = [self._por_nombre[nombre] for nombre in self.nombres]
+
+    def filas_presidente(self, nombre_norm):
+        """Filas cuyo candidato normalizado es exactamente nombre_norm."""
+        return self._por_nombre.get(nombre_norm, self.VACIO)
+
+    def filas_lista(self, lista):
+        """Filas de la lista electoral indicada."""
+        return self._por_lista.get(str(lista), self.VACIO)
+
+    def filas_partido(self, partido):
+        """Filas del partido indicado (se compara normalizado)."""
+        return self._por_partido.get(normalizar_texto(partido), self.VACIO)
+
+    def filas_tipo(self, tipo):
+        """Filas del tipo de documento indicado (plan, entrevista o biografia)."""
+        return self._por_tipo.get(str(tipo).lower(), self.VACIO)
+
+    def codigos_candidato(self, nombre_buscado):
+        """
+        Códigos de los candidatos a los que se refiere un nombre extraído de la consulta:
+        aquellos cuyo nombre contiene al buscado o está contenido en él (el criterio con
+        que se filtraban las consultas de partido) o contiene todas las palabras del
+        nombre buscado aunque no estén seguidas, como "daniel azin" en "daniel noboa azin".
+
+        Parámetros:
+            nombre_buscado (str): Nombre normalizado extraído de la consulta.
+
+        Retorna:
+            set: Códigos de nombre del candidato o candidatos.
+        """
+        palabras = {p for p in nombre_buscado.split() if len(p) > 2 and p not in PARTICULAS_NOMBRE}
+        return {i for i, nombre in enumerate(self.nombres)
+                if nombre and (nombre_buscado in nombre or nombre in nombre_buscado
+                               or (palabras and palabras.issubset(nombre.split())))}
+
+    def filas_particion(self, codigos=None, tipo=None):
+        """
+        Filas de una partición del índice: las de los candidatos indicados, las de un
+        tipo de documento o las que cumplen ambas condiciones.
+
+        Parámetros:
+            codigos (set, opcional): Códigos de nombre de los candidatos. None para no filtrar por candidato.
+            tipo (str, opcional): Tipo de documento (plan, entrevista o biografia). None para no filtrar por tipo.
+
+        Retorna:
+            np.ndarray: Filas ordenadas de la partición.
+        """
+        if codigos is None:
+            return self.filas_tipo(tipo) if tipo is not None else None
+        filas = (np.sort(np.concatenate([self._por_codigo[codigo] for codigo in codigos]))
+                 if codigos else self.VACIO)
+        if tipo is not None:
+            filas = np.intersect1d(filas, self.filas_tipo(tipo), assume_unique=True)
+        return filas
+
+    @staticmethod
+    def mascara_filas(filas, particion):
+        """Máscara booleana de las filas que pertenecen a la partición (ordenada)."""
+        posiciones = np.searchsorted(particion, filas)
+        dentro = posiciones < len(particion)
+        dentro[dentro] = particion[posiciones[dentro]] == filas[dentro]
+        return dentro
+
+# ---------------- Benchmark de coincidencias exactas ----------------
+
+def benchmark_coincidencias_exactas(tamanos=(10_000, 100_000, 1_000_000), repeticiones=20):
+    """
+    Compara el recorrido completo de la metadata con la búsqueda en los índices
+    para distintos tamaños de corpus.
+
+    Parámetros:
+        tamanos (tuple): Número de oraciones de cada corpus sintético.
+        repeticiones (int): Consultas por medición.
+
+    Retorna:
+        list: Tiempos medios por consulta (en ms) de cada método y tamaño.
+    """
+    candidatos = ["Luisa González", "Daniel Noboa Azín", "Leonidas Iza", "Jimmy Jairala"]
+    tipos = ['plan', 'entrevista', 'biografia']
+    resultados = []
+    for n in tamanos:
+        metadata = [{'presidente': candidatos[i % len(candidatos)], 'lista': i % 16,
+                     'partido': f"Partido {i % 16}", 'tipo': tipos[i % 3]} for i in range(n)]
+        nombre = normalizar_texto("Leonidas Iza")
+
+        inicio = time.perf_counter()
+        for _ in range(max(1, repeticiones // 10)):
+            [i for i, meta in enumerate(metadata) if normalizar_texto(meta['presidente']) == nombre]
+        recorrido = (time.perf_counter() - inicio) / max(1, repeticiones // 10)
+
+        indices = IndicesMetadata(metadata)
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            indices.filas_presidente(nombre)
+        busqueda = (time.perf_counter() - inicio) / repeticiones
+
+        resultados.append({'tamano': n, 'recorrido_ms': recorrido * 1000, 'indice_ms': busqueda * 1000})
+    return resultados
+
+
+if __name__ == "__main__":
+    for r in benchmark_coincidencias_exactas():
+        print(f"{r['tamano']:>9} oraciones: recorrido {r['recorrido_ms']:10.3f} ms | índice {r['indice_ms']:.4f} ms")
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+
+import noisereduce as nr
+import numpy as np
+import soundfile as sf
+from scipy.io import wavfile
+
+# Mismos valores que usa nr.reduce_noise por defecto: así los bloques coinciden
+# con los trozos en que noisereduce ya dividía el audio completo
+TAMANO_BLOQUE = 600000
+RELLENO = 30000
+CRUCE = RELLENO // 2
+
+# ---------------- Lectura por bloques ----------------
+
+class LectorMono:
+    """
+    Lee un audio de forma secuencial como muestras mono float32.
+
+    Los formatos que entiende libsndfile (WAV, FLAC, OGG...) se leen con
+    soundfile; el resto (por ejemplo el MP4 que descarga yt-dlp) se decodifica
+    con ffmpeg a través de una tubería, sin escribir una copia WAV temporal.
+    """
+
+    def __init__(self, ruta):
+        """
+        Parámetros:
+            ruta (str): Ruta del archivo de audio.
+        """
+        self._proceso = None
+        try:
+            self._archivo = sf.SoundFile(ruta)
+            self.frecuencia = self._archivo.samplerate
+        except (sf.LibsndfileError, RuntimeError):
+            self._archivo = None
+            self.frecuencia = self._frecuencia_ffprobe(ruta)
+            self._proceso = subprocess.Popen(
+                ['ffmpeg', '-v', 'error', '-i', ruta, '-f', 'f32le', '-ac', '1', '-'],
+                stdout=subprocess.PIPE
+            )
+
+    @staticmethod
+    def _frecuencia_ffprobe(ruta):
+        salida = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'a:0', '-show_entries', 'stream=sample_rate',
+             '-of', 'csv=p=0', ruta],
+            capture_output=True, text=True, check=True
+        )
+        return int(salida.stdout.strip())
+
+    def leer(self, n):
+        """
+        Lee hasta n muestras; devuelve menos solo al llegar al final del audio.
+
+        Parámetros:
+            n (int): Número de muestras a leer.
+
+        Retorna:
+            np.ndarray: Muestras mono float32.
+        """
+        if self._archivo is not None:
+            data = self._archivo.read(n, dtype='float32', always_2d=True)
+            # Si el audio es estéreo, convertirlo a mono
+            return data.mean(axis=1, dtype=np.float32)
+
+        datos = bytearray()
+        while len(datos) < 4 * n:
+            trozo = self._proceso.stdout.read(4 * n - len(datos))
+            if not trozo:
+                break
+            datos.extend(trozo)
+        return np.frombuffer(bytes(datos), dtype=np.float32)
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+        if self._proceso is not None:
+            self._proceso.stdout.close()
+            if self._proceso.wait() != 0:
+                raise RuntimeError("ffmpeg no pudo decodificar el audio")
+
+# ---------------- Reducción de ruido por bloques ----------------
+
+def _reducir_bloque(bloque, rate, ruido, reduccion_ruido):
+    # Un solo trozo por llamada: el relleno con contexto real ya viene incluido en el bloque
+    return nr.reduce_noise(
+        y=bloque,
+        sr=rate,
+        y_noise=ruido,
+        prop_decrease=reduccion_ruido,
+        stationary=True,
+        chunk_size=len(bloque),
+        padding=0
+    ).astype(np.float32)
+
+
+def _completar(bloque, n):
+    if len(bloque) >= n:
+        return bloque[:n]
+    return np.concatenate([bloque, np.zeros(n - len(bloque), dtype=np.float32)])
+
+
+def limpiar_ruido_por_bloques(archivo_entrada, archivo_salida="audio_limpio.wav", reduccion_ruido=0.5,
+                              tamano_bloque=TAMANO_BLOQUE, relleno=RELLENO, cruce=CRUCE):
+    """
+    Limpia el ruido del archivo de audio con memoria acotada.
+
+    El audio se lee en bloques de tamano_bloque muestras, cada uno con `relleno`
+    muestras de contexto real a cada lado, se convierte a float32 mono y se filtra
+    bloque a bloque. Las uniones se suavizan con un fundido cruzado de `cruce`
+    muestras y el resultado se escribe a medida que se produce. El perfil de ruido
+    se toma de las primeras tamano_bloque muestras, igual que noisereduce con el
+    audio completo, y al final se normaliza el archivo en una segunda pasada.
+    La memoria usada depende del tamaño de bloque, no de la duración del audio.
+
+    Parámetros:
+        archivo_entrada (str): Ruta del archivo de audio de entrada (cualquier formato que lea soundfile o ffmpeg).
+        archivo_salida (str, opcional): Archivo WAV de salida (float32).
+        reduccion_ruido (float, opcional): Nivel de reducción de ruido (valor entre 0 y 1, por defecto 0.5).
+        tamano_bloque (int): Muestras por bloque.
+        relleno (int): Muestras de contexto a cada lado de un bloque.
+        cruce (int): Muestras del fundido cruzado entre bloques (como máximo relleno).
+
+    Retorna:
+        str: Ruta del archivo de audio limpio si el proceso es exitoso.
+        None: En caso de error, devuelve None e imprime el mensaje de error.
+    """
+    try:
+        if not os.path.exists(archivo_entrada):
+            raise FileNotFoundError(f"No se encuentra el archivo: {archivo_entrada}")
+        if not 0 < relleno < tamano_bloque or not 0 <= cruce <= relleno:
+            raise ValueError("Se requiere 0 < relleno < tamano_bloque y 0 <= cruce <= relleno")
+
+        lector = LectorMono(archivo_entrada)
+        rate = lector.frecuencia
+        try:
+            actual = lector.leer(tamano_bloque)
+            if len(actual) == 0:
+                raise ValueError("El audio está vacío")
+            ruido = actual.copy()
+            anterior = np.zeros(relleno, dtype=np.float32)
+            siguiente = lector.leer(tamano_bloque)
+            cola = None
+            maximo = 0.0
+            rampa = np.linspace(0, 1, cruce, endpoint=False, dtype=np.float32)
+
+            with sf.SoundFile(archivo_salida, 'w', samplerate=rate, channels=1, subtype='FLOAT') as salida:
+                while len(actual):
+                    bloque = np.concatenate([anterior[-relleno:], actual, _completar(siguiente, relleno)])
+                    filtrado = _reducir_bloque(bloque, rate, ruido, reduccion_ruido)
+                    limpio = filtrado[relleno:relleno + len(actual)]
+
+                    # Fundido cruzado con la cola que el bloque anterior calculó para estas muestras
+                    if cola is not None:
+                        n = min(len(cola), len(limpio))
+                        limpio[:n] = cola[:n] * (1 - rampa[:n]) + limpio[:n] * rampa[:n]
+                    cola = filtrado[relleno + len(actual):relleno + len(actual) + cruce] if cruce else None
+
+                    salida.write(limpio)
+                    maximo = max(maximo, float(np.max(np.abs(limpio))))
+                    anterior, actual, siguiente = actual, siguiente, lector.leer(tamano_bloque)
+        finally:
+            lector.cerrar()
+
+        # Normalizar el audio en el mismo archivo, bloque a bloque
+        if maximo > 0:
+            with sf.SoundFile(archivo_salida, 'r+') as salida:
+                posicion = 0
+                while posicion < salida.frames:
+                    salida.seek(posicion)
+                    bloque = salida.read(tamano_bloque, dtype='float32')
+                    salida.seek(posicion)
+                    salida.write(bloque / maximo)
+                    posicion += len(bloque)
+
+        return archivo_salida
+
+    except Exception as e:
+        print(f"Error al procesar el audio: {str(e)}")
+        return None
+
+# ---------------- Comparación con la versión en memoria ----------------
+
+def limpiar_ruido_en_memoria(archivo_entrada, reduccion_ruido=0.5):
+    """
+    Versión del notebook (solo WAV): carga el audio completo en float64 y lo filtra de una vez.
+
+    Parámetros:
+        archivo_entrada (str): Ruta del archivo WAV.
+        reduccion_ruido (float, opcional): Nivel de reducción de ruido.
+
+    Retorna:
+        tuple: (rate, audio limpio normalizado)
+    """
+    rate, data = wavfile.read(archivo_entrada)
+    data = data.astype(float)
+    if len(data.shape) > 1:
+        data = np.mean(data, axis=1)
+    audio_limpio = nr.reduce_noise(y=data, sr=rate, prop_decrease=reduccion_ruido, stationary=True)
+    return rate, audio_limpio / np.max(np.abs(audio_limpio))
+
+
+def comparar_limpieza(archivo_entrada, archivo_salida="audio_limpio_bloques.wav", reduccion_ruido=0.5):
+    """
+    Compara tiempo, memoria máxima y resultado de la versión por bloques con la versión en memoria.
+
+    Parámetros:
+        archivo_entrada (str): Ruta del archivo WAV.
+        archivo_salida (str): Archivo donde se escribe el resultado por bloques.
+        reduccion_ruido (float): Nivel de reducción de ruido.
+
+    Retorna:
+        dict: Segundos y MB máximos de cada versión, diferencia máxima y correlación de las señales.
+    """
+    resultados = {}
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    _, referencia = limpiar_ruido_en_memoria(archivo_entrada, reduccion_ruido)
+    resultados['memoria'] = {'segundos': time.perf_counter() - inicio,
+                             'mb_maximos': tracemalloc.get_traced_memory()[1] / 1e6}
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    limpiar_ruido_por_bloques(archivo_entrada, archivo_salida, reduccion_ruido)
+    resultados['bloques'] = {'segundos': time.perf_counter() - inicio,
+                             'mb_maximos': tracemalloc.get_traced_memory()[1] / 1e6}
+    tracemalloc.stop()
+
+    por_bloques, _ = sf.read(archivo_salida, dtype='float32')
+    resultados['diferencia_maxima'] = float(np.max(np.abs(por_bloques - referencia)))
+    resultados['correlacion'] = float(np.corrcoef(por_bloques, referencia)[0, 1])
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reducción de ruido por bloques para audios largos")
+    parser.add_argument('entrada')
+    parser.add_argument('salida', nargs='?', default='audio_limpio.wav')
+    parser.add_argument('--reduccion', type=float, default=0.5, help="Nivel de reducción de ruido (0 a 1)")
+    parser.add_argument('--tamano-bloque', type=int, default=TAMANO_BLOQUE)
+    parser.add_argument('--comparar', action='store_true', help="Compara con la versión en memoria (solo WAV)")
+    args = parser.parse_args()
+
+    if args.comparar:
+        print(json.dumps(comparar_limpieza(args.entrada, args.salida, args.reduccion), indent=2))
+    else:
+        inicio = time.perf_counter()
+        if limpiar_ruido_por_bloques(args.entrada, args.salida, args.reduccion, args.tamano_bloque):
+            print(f"✓ Audio procesado guardado en: {args.salida} ({time.perf_counter() - inicio:.1f} s)")
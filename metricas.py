@@ -0,0 +1,227 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites (segundos) de las cubetas: desde medio milisegundo para las etapas
+# rápidas hasta 30 s para la generación completa del modelo
+LIMITES_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ---------------- Métricas en formato de texto de Prometheus ----------------
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, extra=''):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+class Histograma:
+    """
+    Histograma acumulativo con etiquetas, seguro para varios hilos.
+
+    Cada combinación de valores de las etiquetas tiene sus propias cubetas, suma
+    y conteo, que se exponen con el formato de texto de Prometheus.
+    """
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        """
+        Parámetros:
+            nombre (str): Nombre de la métrica.
+            ayuda (str): Descripción para la línea # HELP.
+            etiquetas (tuple): Nombres de las etiquetas.
+            limites (tuple): Límites superiores de las cubetas, en orden creciente.
+        """
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores_etiquetas):
+        """
+        Registra una observación.
+
+        Parámetros:
+            valor (float): Valor observado (segundos para las latencias).
+            valores_etiquetas: Un valor por cada etiqueta, en el mismo orden.
+        """
+        # La cubeta "le" incluye los valores iguales a su límite
+        cubeta = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(valores_etiquetas)
+            if serie is None:
+                serie = self._series[valores_etiquetas] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][cubeta] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self):
+        """
+        Retorna:
+            list: Líneas de texto de la métrica.
+        """
+        with self._lock:
+            series = [(clave, list(conteos), suma, n) for clave, (conteos, suma, n) in self._series.items()]
+
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for clave, conteos, suma, n in sorted(series):
+            acumulado = 0
+            for limite, conteo in zip(self.limites + (float('inf'),), conteos):
+                acumulado += conteo
+                le = '+Inf' if limite == float('inf') else repr(limite)
+                etiquetas = _etiquetas(self.etiquetas, clave, f'le="{le}"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {suma}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {n}")
+        return lineas
+
+
+class Contador:
+    """Contador monótono con etiquetas, seguro para varios hilos."""
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores_etiquetas, cantidad=1):
+        with self._lock:
+            self._valores[valores_etiquetas] = self._valores.get(valores_etiquetas, 0) + cantidad
+
+    def exponer(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        lineas.extend(f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {valor}" for clave, valor in valores)
+        return lineas
+
+
+def exponer_valores(nombre, ayuda, tipo, etiqueta, valores):
+    """
+    Expone valores leídos en el momento (por ejemplo, los contadores de las caches).
+
+    Parámetros:
+        nombre (str): Nombre de la métrica.
+        ayuda (str): Descripción para la línea # HELP.
+        tipo (str): 'counter' o 'gauge'.
+        etiqueta (str): Nombre de la etiqueta que distingue los valores.
+        valores (dict): {valor de la etiqueta: número}.
+
+    Retorna:
+        list: Líneas de texto de la métrica.
+    """
+    lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+    lineas.extend(f"{nombre}{_etiquetas((etiqueta,), (clave,))} {valor}" for clave, valor in valores.items())
+    return lineas
+
+
+DURACION_ETAPAS = Histograma('rag_etapa_duracion_segundos',
+                             'Duración de cada etapa de la búsqueda y la generación.', ('etapa',))
+DURACION_PETICIONES = Histograma('rag_peticion_duracion_segundos',
+                                 'Duración total de cada petición HTTP.', ('endpoint',))
+PETICIONES = Contador('rag_peticiones_total', 'Peticiones HTTP atendidas.', ('endpoint', 'estado'))
+TOKENS_CONTEXTO = Contador('rag_contexto_tokens_total',
+                           'Tokens estimados del contexto de los prompts: enviados y ahorrados por el empaquetado.',
+                           ('tipo',))
+
+
+def exponer_metricas(*lineas_extra):
+    """
+    Texto completo del endpoint /metrics.
+
+    Parámetros:
+        lineas_extra: Listas de líneas adicionales (ver exponer_valores()).
+
+    Retorna:
+        str: Métricas en formato de texto de Prometheus (versión 0.0.4).
+    """
+    lineas = (DURACION_ETAPAS.exponer() + DURACION_PETICIONES.exponer() + PETICIONES.exponer()
+              + TOKENS_CONTEXTO.exponer())
+    for extra in lineas_extra:
+        lineas.extend(extra)
+    return '\n'.join(lineas) + '\n'
+
+# ---------------- Tramos y trazas por petición ----------------
+
+class Traza:
+    """Tramos medidos durante una petición, en el orden en que terminaron."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.tramos = []
+
+    def agregar(self, etapa, inicio, duracion):
+        self.tramos.append((etapa, inicio - self.inicio, duracion))
+
+    def como_lista(self):
+        """
+        Retorna:
+            list: Diccionarios con etapa, inicio_ms (desde el comienzo de la petición) y duracion_ms.
+        """
+        return [{'etapa': etapa, 'inicio_ms': round(inicio * 1000, 3), 'duracion_ms': round(duracion * 1000, 3)}
+                for etapa, inicio, duracion in self.tramos]
+
+    def server_timing(self):
+        """Valor de la cabecera Server-Timing, que muestran las herramientas de desarrollo del navegador."""
+        return ', '.join(f"{etapa};dur={duracion * 1000:.3f}" for etapa, _, duracion in self.tramos)
+
+
+# Cada hilo (y cada petición) tiene su propia traza; None si no se pidió
+_traza_actual = contextvars.ContextVar('traza_actual', default=None)
+
+
+def iniciar_traza():
+    """Comienza a registrar los tramos de la petición en curso."""
+    traza = Traza()
+    _traza_actual.set(traza)
+    return traza
+
+
+def traza_actual():
+    return _traza_actual.get()
+
+
+def terminar_traza():
+    """Deja de registrar tramos y devuelve la traza de la petición (o None)."""
+    traza = _traza_actual.get()
+    _traza_actual.set(None)
+    return traza
+
+
+def registrar(etapa, inicio, duracion):
+    """
+    Registra una etapa ya medida en el histograma y en la traza de la petición.
+
+    Parámetros:
+        etapa (str): Nombre de la etapa.
+        inicio (float): time.perf_counter() al comenzar la etapa.
+        duracion (float): Segundos que duró.
+    """
+    DURACION_ETAPAS.observar(duracion, etapa)
+    traza = _traza_actual.get()
+    if traza is not None:
+        traza.agregar(etapa, inicio, duracion)
+
+
+@contextmanager
+def tramo(etapa):
+    """
+    Mide el bloque como una etapa:
+
+        with tramo('faiss'):
+            D, I = index.search(...)
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(etapa, inicio, time.perf_counter() - inicio)
@@ -0,0 +1,303 @@
+import logging
+import os
+import pickle
+import threading
+import time
+
+import faiss
+import numpy as np
+from cache_consultas import CacheLRU
+from codificador_lotes import CodificadorPorLotes
+from codificadores import completar_config_codificador, crear_codificador
+from formato_indice import ARCHIVO_ACTUAL, abrir_indice, compactar_metadata
+from indices_ann import aplicar_config_busqueda
+from indices_metadata import IndicesMetadata
+from prefiltro_tfidf import IndiceInvertido
+from procesamiento_texto import normalizar_texto
+from relevancia import RelevanciaPrecalculada
+
+log = logging.getLogger(__name__)
+
+NOMBRE_MODELO = 'paraphrase-multilingual-mpnet-base-v2'
+RUTA_SISTEMA = 'sistema_busqueda.pkl'
+
+# ---------------- Carga del sistema de búsqueda ----------------
+
+def cargar_sistema(ruta=RUTA_SISTEMA):
+    """
+    Carga el sistema de búsqueda deserializando el índice FAISS y la metadata almacenada.
+    Si la ruta es un directorio se abre el formato en disco con mmap.
+
+    Parámetros:
+        ruta (str): Ruta del pickle o del directorio con el sistema.
+
+    Retorna:
+        dict: Diccionario con los datos del sistema de búsqueda.
+    """
+    try:
+        if os.path.isdir(ruta):
+            data = abrir_indice(ruta)
+        else:
+            with open(ruta, 'rb') as f:
+                data = pickle.load(f)
+            data['index'] = faiss.deserialize_index(data['index'])
+            # Los pickles guardan la metadata como lista de diccionarios: se pasa a columnas
+            data['metadata'] = compactar_metadata(data['metadata'])
+        # Los sistemas anteriores a la configuración de índices usan IndexFlatL2
+        data['config_indice'] = data.get('config_indice') or {'tipo': 'flat'}
+        aplicar_config_busqueda(data['index'], data['config_indice'])
+        # Los índices de la metadata se construyen una sola vez por generación
+        data['indices'] = IndicesMetadata(data['metadata'])
+        data['prefiltro'] = IndiceInvertido(data['vectorizer'], data['tfidf_matrix'],
+                                            data.get('tfidf_postings'), data.get('tfidf_normas'))
+        data['relevancia'] = RelevanciaPrecalculada(data['metadata'], data['indices'],
+                                                    data.get('textos_normalizados'), data.get('num_palabras'))
+        return data
+    except Exception as e:
+        log.error("❌ Error al cargar el sistema: %s", e)
+        return None
+
+
+def firma_archivo(ruta):
+    """
+    Obtiene una firma del archivo (fecha de modificación y tamaño) para detectar cambios.
+    En el formato de directorio se vigila el puntero a la generación actual.
+
+    Parámetros:
+        ruta (str): Ruta del archivo o directorio a vigilar.
+
+    Retorna:
+        tuple: (mtime_ns, tamaño) o None si el archivo no existe.
+    """
+    if os.path.isdir(ruta):
+        ruta = os.path.join(ruta, ARCHIVO_ACTUAL)
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    return (estado.st_mtime_ns, estado.st_size)
+
+# ---------------- Generaciones del sistema ----------------
+
+class Generacion:
+    """
+    Versión inmutable del sistema de búsqueda cargada en memoria.
+
+    Una petición obtiene la generación vigente una sola vez y trabaja con ella
+    hasta terminar, de modo que nunca mezcla datos de dos versiones del índice.
+    """
+
+    def __init__(self, version, sistema, firma):
+        self.version = version
+        self.sistema = sistema
+        self.firma = firma
+        self.cargada_en = time.time()
+        # La versión es un contador de este proceso; el identificador es el mismo en todos
+        # los procesos que cargaron los mismos datos (directorio de la generación en disco
+        # o firma del pickle) y sirve para compartir caches entre ellos
+        directorio = sistema.get('directorio')
+        self.identificador = os.path.basename(directorio) if directorio else '{}-{}'.format(*(firma or (0, 0)))
+
+# ---------------- Motor de búsqueda de larga duración ----------------
+
+class MotorBusqueda:
+    """
+    Mantiene el sistema de búsqueda y el modelo de embeddings en memoria durante
+    toda la vida del proceso y recarga el índice en segundo plano cuando cambia
+    el archivo en disco.
+    """
+
+    def __init__(self, ruta=RUTA_SISTEMA, nombre_modelo=NOMBRE_MODELO, intervalo_revision=5.0,
+                 max_embeddings=2048, ttl_embeddings=3600, max_resultados=1024, ttl_resultados=600,
+                 max_lote_codificacion=16, espera_lote_codificacion=0.005, config_codificador=None):
+        """
+        Parámetros:
+            ruta (str): Ruta del sistema serializado a cargar y vigilar.
+            nombre_modelo (str): Modelo SentenceTransformer para codificar consultas.
+            intervalo_revision (float): Segundos entre revisiones del archivo.
+            max_embeddings (int): Capacidad de la cache de embeddings de consultas.
+            ttl_embeddings (float): Segundos de vida de cada embedding en cache.
+            max_resultados (int): Capacidad de la cache de resultados de búsqueda.
+            ttl_resultados (float): Segundos de vida de cada resultado en cache.
+            max_lote_codificacion (int): Consultas concurrentes codificadas en una sola pasada
+                del modelo (1 para codificar cada consulta por separado).
+            espera_lote_codificacion (float): Segundos máximos que se retiene una consulta
+                esperando a completar el lote.
+            config_codificador (dict | str, opcional): Backend de inferencia del modelo
+                (ver codificadores.CONFIG_CODIFICADOR_POR_DEFECTO). Por defecto PyTorch.
+        """
+        self.ruta = ruta
+        self.nombre_modelo = nombre_modelo
+        self.config_codificador = completar_config_codificador(config_codificador)
+        self.intervalo_revision = intervalo_revision
+        self.cache_embeddings = CacheLRU(max_embeddings, ttl_embeddings)
+        self.cache_resultados = CacheLRU(max_resultados, ttl_resultados)
+        self.codificador = CodificadorPorLotes(self.modelo, max_lote_codificacion, espera_lote_codificacion)
+        self._generacion = None
+        self._modelo = None
+        self._lock_carga = threading.Lock()
+        self._lock_modelo = threading.Lock()
+        self._detener = threading.Event()
+        self._vigilante = None
+
+    def generacion(self):
+        """
+        Devuelve la generación vigente, cargándola la primera vez que se solicita.
+
+        Retorna:
+            Generacion: Generación actual o None si el sistema no pudo cargarse.
+        """
+        generacion = self._generacion
+        if generacion is not None:
+            return generacion
+
+        with self._lock_carga:
+            if self._generacion is None:
+                self._cargar_generacion(firma_archivo(self.ruta))
+            self._iniciar_vigilante()
+        return self._generacion
+
+    def sistema(self):
+        """
+        Atajo para obtener el diccionario del sistema de la generación vigente.
+
+        Retorna:
+            dict: Sistema de búsqueda o None si no está disponible.
+        """
+        generacion = self.generacion()
+        return generacion.sistema if generacion else None
+
+    def modelo(self):
+        """
+        Devuelve el modelo de embeddings, instanciándolo una sola vez por proceso.
+
+        Retorna:
+            CodificadorTorch | CodificadorOnnx: Codificador del backend configurado.
+        """
+        if self._modelo is None:
+            with self._lock_modelo:
+                if self._modelo is None:
+                    self._modelo = crear_codificador(self.nombre_modelo, self.config_codificador)
+        return self._modelo
+
+    def codificar(self, query, clave=None):
+        """
+        Obtiene el embedding de una consulta, reutilizándolo si ya se calculó para
+        la misma consulta normalizada. Las consultas nuevas de peticiones concurrentes
+        se codifican juntas en micro-lotes.
+
+        Parámetros:
+            query (str): Consulta del usuario.
+            clave (str, opcional): Consulta ya normalizada, si el llamador la tiene.
+
+        Retorna:
+            np.ndarray: Embedding de la consulta (1 x d, float32).
+        """
+        if clave is None:
+            clave = normalizar_texto(query)
+        embedding = self.cache_embeddings.obtener(clave)
+        if embedding is None:
+            embedding = self.codificador.codificar(query)
+            self.cache_embeddings.guardar(clave, embedding)
+        return embedding
+
+    def codificar_lote(self, queries, claves=None):
+        """
+        Obtiene los embeddings de varias consultas con una sola llamada al modelo
+        para todas las que no están en la cache.
+
+        Parámetros:
+            queries (list): Consultas del usuario.
+            claves (list, opcional): Consultas ya normalizadas, en el mismo orden.
+
+        Retorna:
+            np.ndarray: Embeddings de las consultas (n x d, float32), en el mismo orden.
+        """
+        if claves is None:
+            claves = [normalizar_texto(query) for query in queries]
+        embeddings = {}
+        pendientes = {}
+        for clave, query in zip(claves, queries):
+            if clave in embeddings or clave in pendientes:
+                continue
+            embedding = self.cache_embeddings.obtener(clave)
+            if embedding is None:
+                pendientes[clave] = query
+            else:
+                embeddings[clave] = embedding
+
+        if pendientes:
+            nuevos = self.modelo().encode(list(pendientes.values())).astype('float32')
+            for i, clave in enumerate(pendientes):
+                embeddings[clave] = nuevos[i:i + 1]
+                self.cache_embeddings.guardar(clave, embeddings[clave])
+
+        return np.vstack([embeddings[clave] for clave in claves])
+
+    def estadisticas_cache(self):
+        """
+        Devuelve los contadores de las caches de consultas.
+
+        Retorna:
+            dict: Estadísticas de la cache de embeddings, de la de resultados y del codificador.
+        """
+        generacion = self._generacion
+        return {
+            'generacion': generacion.version if generacion else None,
+            'embeddings': self.cache_embeddings.estadisticas(),
+            'resultados': self.cache_resultados.estadisticas(),
+            'codificador': self.codificador.estadisticas(),
+        }
+
+    def recargar(self):
+        """
+        Fuerza la carga de una nueva generación desde disco.
+
+        Retorna:
+            bool: True si la nueva generación quedó activa.
+        """
+        with self._lock_carga:
+            return self._cargar_generacion(firma_archivo(self.ruta))
+
+    def detener(self):
+        """Detiene el hilo que vigila los cambios del archivo."""
+        self._detener.set()
+
+    def _cargar_generacion(self, firma):
+        sistema = cargar_sistema(self.ruta)
+        if sistema is None:
+            return False
+
+        version = self._generacion.version + 1 if self._generacion else 1
+        # La asignación de un atributo es atómica: las peticiones en curso
+        # conservan su referencia a la generación anterior.
+        self._generacion = Generacion(version, sistema, firma)
+        # Los resultados de la cache pertenecen a la generación anterior
+        self.cache_embeddings.limpiar()
+        self.cache_resultados.limpiar()
+        log.info("🔄 Sistema de búsqueda cargado (generación %d)", version)
+        return True
+
+    def _iniciar_vigilante(self):
+        if self._vigilante is not None or self.intervalo_revision <= 0:
+            return
+        self._vigilante = threading.Thread(target=self._vigilar, name="vigilante-indice", daemon=True)
+        self._vigilante.start()
+
+    def _vigilar(self):
+        firma_pendiente = None
+        while not self._detener.wait(self.intervalo_revision):
+            firma = firma_archivo(self.ruta)
+            actual = self._generacion.firma if self._generacion else None
+            if firma is None or firma == actual:
+                firma_pendiente = None
+                continue
+
+            # Esperar a que la firma se estabilice para no leer un archivo a medio escribir
+            if firma != firma_pendiente:
+                firma_pendiente = firma
+                continue
+
+            with self._lock_carga:
+                if self._cargar_generacion(firma):
+                    firma_pendiente = None
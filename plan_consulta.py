@@ -0,0 +1,325 @@
+import random
+import re
+
+from metricas import tramo
+from procesamiento_texto import normalizar_texto
+
+# ---------------- Patrones de consulta ----------------
+
+QUERY_PATTERNS = {
+    'biografia': [
+        r'^quien es (.+)',
+        r'^quién es (.+)',
+        r'^biografia de (.+)',
+    ],
+    'propuestas_verbo': [
+        r'(?:que|qué) candidatos? proponen? (.+)',
+        r'quienes? proponen? (.+)',
+    ],
+    'entrevista': [
+        r'(?:que|qué) temas se tratan en (?:la )?entrevista de (.+)',
+        r'(?:temas|tema) de (?:la )?entrevista de (.+)',
+    ],
+    'partido_candidato': [
+        r'(?:el )?candidato (.+?) (?:a )?(?:que|qué|cual|cuál) partido pertenece',
+        r'(.+?) (?:a )?(?:que|qué|cual|cuál) partido pertenece',
+        r'(?:de )?(?:que|qué|cual|cuál) partido es (.+)',
+        r'(.+?) partido'
+    ],
+    'partido_nombre': [
+        r'(?:que|qué|cual|cuál) candidatos? pertenecen? (?:a)?(?:l)? partido (.+)',
+    ],
+    'propuestas_candidato': [
+        r'propuestas (?:del candidato )?(.+)',
+        r'(?:que|qué) propone (.+)',
+    ]
+}
+
+
+def combinar_patrones(query_patterns):
+    """
+    Une todos los patrones en una sola expresión precompilada que respeta el orden
+    de QUERY_PATTERNS: gana el primer patrón que coincide en cualquier parte de la
+    consulta, igual que si se probaran uno por uno con re.search().
+
+    Cada patrón se antepone con un prefijo perezoso y la expresión se aplica con
+    match() desde el inicio; así una alternativa posterior no puede ganar solo por
+    coincidir más a la izquierda. Como cada patrón tiene un único grupo, el número
+    del grupo que coincidió identifica al patrón.
+
+    Los patrones que empiezan con (.+?) solo pueden empezar a coincidir al inicio
+    de una línea (si coinciden más adelante, también coinciden desde el inicio de
+    esa línea), así que su prefijo salta líneas completas. Probarlos en cada
+    posición, como hace re.search(), es lo que más tarda en las consultas generales.
+
+    Parámetros:
+        query_patterns (dict): {tipo de consulta: lista de patrones}.
+
+    Retorna:
+        tuple: (expresión compilada, tipo de consulta de cada grupo; el índice 0 no se usa).
+    """
+    alternativas, tipos = [], [None]
+    for tipo, patrones in query_patterns.items():
+        for patron in patrones:
+            if re.compile(patron).groups != 1:
+                raise ValueError(f"El patrón {patron!r} de '{tipo}' debe tener exactamente un grupo")
+            prefijo = r"(?:(?s:.*?)\n)??" if patron.startswith('(.+?)') else "(?s:.*?)"
+            alternativas.append(f"{prefijo}(?:{patron})")
+            tipos.append(tipo)
+    return re.compile('|'.join(alternativas), re.IGNORECASE), tipos
+
+
+PATRON_COMBINADO, TIPOS_POR_GRUPO = combinar_patrones(QUERY_PATTERNS)
+
+# Consultas cuyo parámetro nombra a un candidato y tipo de documento al que se
+# refieren: su búsqueda semántica se restringe a esa partición del índice
+CONSULTAS_POR_CANDIDATO = ('biografia', 'entrevista', 'partido_candidato', 'propuestas_candidato')
+TIPO_DOCUMENTO_POR_CONSULTA = {'biografia': 'biografia', 'entrevista': 'entrevista'}
+
+# ---------------- Clasificación de la consulta ----------------
+
+def clasificar_consulta(query):
+    """
+    Identifica el tipo de consulta con el patrón combinado.
+
+    Parámetros:
+        query (str): Consulta del usuario.
+
+    Retorna:
+        tuple: (tipo de consulta, parámetro identificado)
+    """
+    query = query.lower().strip()
+    match = PATRON_COMBINADO.match(query)
+    if match:
+        return TIPOS_POR_GRUPO[match.lastindex], match.group(match.lastindex).strip()
+    return "general", query
+
+
+def clasificar_consulta_secuencial(query, query_patterns=QUERY_PATTERNS):
+    """
+    Clasificación de referencia: prueba cada patrón en orden con re.search().
+    Se conserva para verificar que el patrón combinado da los mismos resultados.
+    """
+    query = query.lower().strip()
+
+    for tipo, patrones in query_patterns.items():
+        for patron in patrones:
+            match = re.search(patron, query, re.IGNORECASE)
+            if match:
+                return tipo, match.group(1).strip()
+
+    return "general", query
+
+
+def limpiar_query(query, tipo, param):
+    """
+    Limpia y ajusta la consulta según el tipo identificado.
+
+    Parámetros:
+    query (str): Consulta de búsqueda original.
+    tipo (str): Tipo de consulta identificado.
+    param (str): Parámetro extraído de la consulta.
+
+    Retorna:
+    str: Consulta ajustada.
+    """
+    if tipo == "biografia":
+        return param
+    elif tipo == "propuestas_verbo":
+        return f"propuestas {param}"
+    elif tipo == "entrevista":
+        return f"entrevista {param}"
+    elif tipo == "partido_candidato":
+        return f"{param} partido"
+    elif tipo == "partido_nombre":
+        return f"partido {param}"
+    elif tipo == "propuestas_candidato":
+        return f"propuestas {param}"
+
+    return query.lower().strip()
+
+# ---------------- Plan de la consulta ----------------
+
+class PlanConsulta:
+    """
+    Todo lo que las etapas de una petición necesitan saber de la consulta, calculado
+    una sola vez: texto normalizado y sus palabras, tipo y parámetro, nombre del
+    candidato buscado, la partición del índice a la que se refiere (candidato y tipo
+    de documento) y, cuando la búsqueda semántica lo pide, el embedding.
+
+    La búsqueda de /generar_respuesta usa la consulta ajustada, que se clasifica
+    por su cuenta; su plan se obtiene con la propiedad `busqueda` y también se
+    calcula una sola vez.
+    """
+
+    __slots__ = ('texto', 'normalizada', 'palabras', 'tipo', 'param', 'nombre_buscado',
+                 'es_consulta_biografia', 'candidato', 'tipo_documento', 'query_ajustada', 'embedding',
+                 '_busqueda')
+
+    def __init__(self, query):
+        """
+        Parámetros:
+            query (str): Consulta del usuario.
+        """
+        self.texto = query
+        with tramo('clasificacion'):
+            self.tipo, self.param = clasificar_consulta(query)
+        self.normalizada = normalizar_texto(query)
+        self.palabras = frozenset(self.normalizada.split())
+        self.query_ajustada = limpiar_query(query, self.tipo, self.param)
+        self.nombre_buscado, self.es_consulta_biografia = self._nombre_buscado()
+        # Nombre normalizado del candidato al que se refiere la consulta (None si no nombra a uno)
+        self.candidato = normalizar_texto(self.param) if self.tipo in CONSULTAS_POR_CANDIDATO else None
+        self.tipo_documento = TIPO_DOCUMENTO_POR_CONSULTA.get(self.tipo)
+        # Lo completa la búsqueda semántica la primera vez que lo necesita
+        self.embedding = None
+        self._busqueda = None
+
+    def _nombre_buscado(self):
+        # Extraer nombre de la consulta y determinar si es biografía
+        query_norm = self.normalizada
+        if self.tipo == 'biografia' or "biografia de" in query_norm or "quien es" in query_norm:
+            if "biografia de" in query_norm:
+                return query_norm.replace("biografia de", "").strip(), True
+            if "quien es" in query_norm:
+                return query_norm.replace("quien es", "").strip(), True
+            return self.param, True
+        if self.tipo == 'partido_candidato':
+            return self.param, False
+        return query_norm, False
+
+    @property
+    def busqueda(self):
+        """
+        Plan de la consulta ajustada, que es la que se busca en el índice. Si la consulta
+        ajustada ya no nombra al candidato ni al tipo de documento (por ejemplo, "noboa"
+        de "quien es noboa"), conserva la partición de la consulta original.
+        """
+        if self._busqueda is None:
+            if self.query_ajustada == self.texto:
+                self._busqueda = self
+            else:
+                busqueda = PlanConsulta(self.query_ajustada)
+                if busqueda.candidato is None and busqueda.tipo_documento is None:
+                    busqueda.candidato, busqueda.tipo_documento = self.candidato, self.tipo_documento
+                self._busqueda = busqueda
+        return self._busqueda
+
+    def __repr__(self):
+        return f"PlanConsulta({self.texto!r}, tipo={self.tipo!r}, param={self.param!r})"
+
+
+def planificar_consulta(query):
+    """
+    Calcula el plan de una consulta. Recibe también un plan ya calculado y lo devuelve tal cual,
+    para que las funciones que aceptan texto o plan no repitan el trabajo.
+
+    Parámetros:
+        query (str | PlanConsulta): Consulta del usuario.
+
+    Retorna:
+        PlanConsulta: Plan de la consulta.
+    """
+    if isinstance(query, PlanConsulta):
+        return query
+    return PlanConsulta(query)
+
+# ---------------- Verificación del patrón combinado ----------------
+
+def verificar_clasificacion(consultas):
+    """
+    Compara la clasificación con el patrón combinado con la de referencia.
+
+    Parámetros:
+        consultas (list): Consultas a clasificar.
+
+    Retorna:
+        list: Diferencias encontradas (consulta, combinado, secuencial); vacía si coinciden todas.
+    """
+    diferencias = []
+    for query in consultas:
+        combinado, secuencial = clasificar_consulta(query), clasificar_consulta_secuencial(query)
+        if combinado != secuencial:
+            diferencias.append({'consulta': query, 'combinado': combinado, 'secuencial': secuencial})
+    return diferencias
+
+
+# Consultas que prueban el orden de los patrones: varias coinciden con más de un
+# patrón y en una posición distinta de la consulta
+CONSULTAS_VERIFICACION = [
+    "quien es luisa gonzalez",
+    "Quién es Daniel Noboa Azín",
+    "biografia de leonidas iza",
+    "  QUIEN ES   jimmy jairala  ",
+    "dime quien es andrea gonzalez",
+    "que candidatos proponen reducir la inseguridad",
+    "qué candidato propone crear empleo",
+    "quienes proponen medicinas gratuitas",
+    "el partido de quienes proponen bajar el iva",
+    "mi partido: que candidatos proponen empleo",
+    "quien propone cambiar el partido",
+    "que temas se tratan en la entrevista de luisa gonzalez",
+    "temas de la entrevista de henry kronfle",
+    "tema de entrevista de carlos rabascall",
+    "el candidato pedro granja a que partido pertenece",
+    "daniel noboa a qué partido pertenece",
+    "jairala cual partido pertenece",
+    "de que partido es leonidas iza",
+    "cuál partido es el de luisa",
+    "que candidatos pertenecen al partido social cristiano",
+    "cuáles candidatos pertenecen al partido avanza",
+    "cual candidato pertenece a partido sociedad patriotica",
+    "propuestas del candidato luisa gonzalez",
+    "propuestas de seguridad del partido revolucion ciudadana",
+    "que propone henry cucalon",
+    "qué propone el partido construye",
+    "entrevista de noboa sobre el partido",
+    "propuestas de quien es el candidato",
+    "seguridad en las cárceles de guayas",
+    "partido",
+    " partido",
+    "un partido nuevo",
+    "reducir los impuestos\ny la deuda del partido",
+    "primera linea\n\notra a que partido pertenece\nel partido",
+    "partido partido del candidato\n proponen partido",
+    "",
+]
+
+# Fragmentos de los patrones que se combinan al azar para buscar consultas ambiguas
+FRAGMENTOS = ["quien es", "quién es", "biografia de", "que", "qué", "cual", "cuál", "candidato", "candidatos",
+              "propone", "proponen", "quienes", "quien", "temas", "tema", "se tratan en", "la", "entrevista de",
+              "el", "a", "de", "al", "es", "partido", "pertenece", "pertenecen", "propuestas", "del candidato",
+              "luisa gonzalez", "noboa", "QUÉ", "Partido", "\n", " "]
+
+
+def consultas_aleatorias(num_consultas=100_000, semilla=0):
+    """
+    Genera consultas combinando al azar fragmentos de los patrones.
+
+    Parámetros:
+        num_consultas (int): Número de consultas.
+        semilla (int): Semilla del generador, para repetir la verificación.
+
+    Retorna:
+        list: Consultas generadas.
+    """
+    generador = random.Random(semilla)
+    return [" ".join(generador.choice(FRAGMENTOS) for _ in range(generador.randint(1, 10)))
+            for _ in range(num_consultas)]
+
+
+if __name__ == "__main__":
+    import sys
+
+    consultas = sys.argv[1:] or CONSULTAS_VERIFICACION
+    for query in consultas:
+        tipo, param = clasificar_consulta(query)
+        print(f"{tipo:<22} {param!r:<40} ← {query!r}")
+    if not sys.argv[1:]:
+        consultas = consultas + consultas_aleatorias()
+    diferencias = verificar_clasificacion(consultas)
+    for diferencia in diferencias[:20]:
+        print(f"❌ {diferencia['consulta']!r}: combinado {diferencia['combinado']} ≠ secuencial {diferencia['secuencial']}")
+    print(f"\n{'✓' if not diferencias else '❌'} {len(consultas) - len(diferencias)} de {len(consultas)} consultas "
+          f"clasificadas igual que con los patrones uno por uno")
+    sys.exit(1 if diferencias else 0)
@@ -0,0 +1,234 @@
+import faiss
+import numpy as np
+from scipy import sparse
+
+from indices_ann import componentes_indice, parametros_busqueda, puede_reconstruir
+
+# Número máximo de documentos que el prefiltro entrega a la búsqueda semántica
+MAX_CANDIDATOS = 1000
+# Vectores que se reconstruyen a la vez al buscar en muchas filas (por ejemplo, en
+# una partición completa del índice), para acotar la memoria de cada búsqueda
+MAX_FILAS_BLOQUE = 65536
+# Hasta este número de candidatos, en HNSW e IVF se decodifican sus vectores y se buscan
+# los vecinos exactos; con más (una partición completa) se usa el propio índice ANN
+MAX_FILAS_EXACTAS = 4 * MAX_CANDIDATOS
+
+# ---------------- Índice invertido TF-IDF ----------------
+
+def normas_documentos(postings):
+    """
+    Calcula la norma L2 de cada documento de la matriz TF-IDF.
+
+    Parámetros:
+        postings (sparse matrix): Matriz documentos x términos.
+
+    Retorna:
+        np.ndarray: Norma de cada documento (1.0 para documentos vacíos).
+    """
+    normas = np.sqrt(np.asarray(postings.multiply(postings).sum(axis=1)).ravel())
+    normas[normas == 0] = 1.0
+    return normas
+
+
+class IndiceInvertido:
+    """
+    Índice invertido término -> documentos construido a partir de la matriz TF-IDF.
+
+    Para una consulta solo se recorren las listas de los términos que contiene,
+    en lugar de calcular la similitud coseno contra todo el corpus.
+    """
+
+    def __init__(self, vectorizer, tfidf_matrix=None, postings=None, normas=None):
+        """
+        Parámetros:
+            vectorizer (TfidfVectorizer): Vectorizador ajustado del sistema.
+            tfidf_matrix (sparse matrix, opcional): Matriz documentos x términos.
+            postings (scipy.sparse.csc_matrix, opcional): Matriz ya convertida a CSC
+                (por ejemplo, abierta con mmap desde el formato en disco).
+            normas (np.ndarray, opcional): Norma L2 precalculada de cada documento.
+        """
+        self.vectorizer = vectorizer
+        self.postings = postings if postings is not None else sparse.csc_matrix(tfidf_matrix)
+        # Normas de las filas para obtener la misma similitud que cosine_similarity()
+        self.normas = normas if normas is not None else normas_documentos(self.postings)
+
+    def candidatos(self, query, umbral_similitud, max_candidatos=MAX_CANDIDATOS, filtro=None):
+        """
+        Obtiene los documentos con similitud TF-IDF mayor al umbral, ordenados de mayor a menor.
+
+        Parámetros:
+            query (str): Consulta del usuario.
+            umbral_similitud (float): Similitud coseno mínima.
+            max_candidatos (int): Número máximo de documentos a devolver.
+            filtro (callable, opcional): Recibe un arreglo de filas y devuelve una máscara
+                booleana con las filas que pueden ser candidatas.
+
+        Retorna:
+            tuple: (arreglo de filas, arreglo de similitudes).
+        """
+        query_vec = sparse.csr_matrix(self.vectorizer.transform([query]))
+        norma_query = np.sqrt(np.sum(query_vec.data ** 2))
+        if query_vec.nnz == 0 or norma_query == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        # Solo se recorren las listas de documentos de los términos de la consulta
+        indptr, indices, datos = self.postings.indptr, self.postings.indices, self.postings.data
+        partes_filas, partes_pesos = [], []
+        for termino, peso in zip(query_vec.indices, query_vec.data / norma_query):
+            inicio, fin = indptr[termino], indptr[termino + 1]
+            partes_filas.append(indices[inicio:fin])
+            partes_pesos.append(datos[inicio:fin] * peso)
+        filas, inversa = np.unique(np.concatenate(partes_filas), return_inverse=True)
+        similitudes = np.bincount(inversa, weights=np.concatenate(partes_pesos)) / self.normas[filas]
+
+        seleccion = similitudes > umbral_similitud
+        if filtro is not None:
+            seleccion &= filtro(filas)
+        filas, similitudes = filas[seleccion], similitudes[seleccion]
+
+        if len(filas) > max_candidatos:
+            mejores = np.argpartition(-similitudes, max_candidatos - 1)[:max_candidatos]
+            filas, similitudes = filas[mejores], similitudes[mejores]
+        orden = np.argsort(-similitudes, kind='stable')
+        return filas[orden].astype(np.int64), similitudes[orden]
+
+# ---------------- Búsqueda semántica restringida ----------------
+
+def _knn_en_filas(index, query_embedding, filas, k):
+    # Vecinos exactos entre los vectores reconstruidos de las filas, por bloques de
+    # MAX_FILAS_BLOQUE; los mejores de cada bloque se combinan al final
+    partes_D, partes_I = [], []
+    for inicio in range(0, len(filas), MAX_FILAS_BLOQUE):
+        bloque = filas[inicio:inicio + MAX_FILAS_BLOQUE]
+        D, I = faiss.knn(query_embedding, index.reconstruct_batch(bloque), min(k, len(bloque)),
+                         metric=index.metric_type)
+        partes_D.append(D)
+        partes_I.append(np.where(I >= 0, bloque[np.maximum(I, 0)], -1))
+    if len(partes_D) == 1:
+        return partes_D[0], partes_I[0]
+
+    D, I = np.hstack(partes_D), np.hstack(partes_I)
+    orden = np.argsort(D[0] if index.metric_type == faiss.METRIC_L2 else -D[0], kind='stable')[:k]
+    return D[:, orden], I[:, orden]
+
+
+def buscar_en_candidatos(index, query_embedding, filas, k, config_indice=None):
+    """
+    Busca los vecinos más cercanos considerando únicamente las filas candidatas.
+
+    En un índice plano se reúnen los vectores candidatos y se calculan los vecinos
+    exactos entre ellos. En HNSW e IVF se hace lo mismo con los vectores decodificados
+    solo si los candidatos son pocos (hasta MAX_FILAS_EXACTAS, como los del prefiltro);
+    con más filas, como una partición completa, se busca en el índice ANN con la
+    configuración guardada (nprobe, ef_search) y un selector de las filas permitidas,
+    ampliando la exploración en proporción a la fracción del índice que queda fuera.
+    En un índice con vectores compactos (cuantizados o reducidos con PCA) se busca
+    sobre ellos una preselección de k * reordenar filas y se reordena con la distancia
+    exacta a los vectores float32.
+
+    Parámetros:
+        index (faiss.Index): Índice FAISS del sistema.
+        query_embedding (np.ndarray): Embedding de la consulta (1 x d, float32).
+        filas (np.ndarray): Filas candidatas entregadas por el prefiltro.
+        k (int): Número de vecinos a devolver.
+        config_indice (dict, opcional): Configuración del índice (nprobe, ef_search).
+
+    Retorna:
+        tuple: (distancias, filas) como en index.search(), con -1 donde no hay resultado.
+    """
+    filas = np.asarray(filas, dtype=np.int64)
+    k = min(k, len(filas))
+    if k == 0:
+        return np.empty((1, 0), dtype=np.float32), np.empty((1, 0), dtype=np.int64)
+
+    if isinstance(index, faiss.IndexFlat):
+        # En un índice plano es más barato reunir solo los vectores candidatos
+        return _knn_en_filas(index, query_embedding, filas, k)
+
+    exacto, transformacion, base = componentes_indice(index)
+    if exacto is not None:
+        compacto = base if transformacion is None else transformacion
+        D, I = buscar_en_candidatos(compacto, query_embedding, filas, int(k * index.k_factor), config_indice)
+        preseleccion = I[0][I[0] >= 0]
+        if len(preseleccion) == 0:
+            return D[:, :0], I[:, :0]
+        D, I = faiss.knn(query_embedding, exacto.reconstruct_batch(preseleccion), min(k, len(preseleccion)),
+                         metric=exacto.metric_type)
+        return D, np.where(I >= 0, preseleccion[np.maximum(I, 0)], -1)
+    if transformacion is not None:
+        for i in range(transformacion.chain.size()):
+            query_embedding = transformacion.chain.at(i).apply(query_embedding)
+        return buscar_en_candidatos(base, query_embedding, filas, k, config_indice)
+    if puede_reconstruir(index) and len(filas) <= MAX_FILAS_EXACTAS:
+        # Pocas filas: igual que en el índice plano, con los vectores candidatos decodificados
+        return _knn_en_filas(index, query_embedding, filas, k)
+
+    # Muchas filas (una partición completa) o sin acceso a los vectores: búsqueda ANN con la
+    # configuración guardada y un selector. Como solo una fracción de lo que recorre el índice
+    # está permitido, la exploración (nprobe, efSearch) se amplía en la misma proporción
+    config_ampliada = dict(config_indice or {})
+    factor = index.ntotal / len(filas)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        nprobe = config_ampliada.get('nprobe') or ivf.nprobe
+        config_ampliada['nprobe'] = min(ivf.nlist, int(np.ceil(nprobe * factor)))
+    if hasattr(index, 'hnsw'):
+        ef_search = max(config_ampliada.get('ef_search') or index.hnsw.efSearch, k)
+        config_ampliada['ef_search'] = min(index.ntotal, int(np.ceil(ef_search * factor)))
+    parametros = parametros_busqueda(index, config_ampliada, faiss.IDSelectorBatch(filas))
+    return index.search(query_embedding, k, params=parametros)
+
+
+def buscar_lote_en_candidatos(index, query_embeddings, filas_por_consulta, k, config_indice=None):
+    """
+    Busca los vecinos más cercanos de varias consultas, cada una restringida a sus filas candidatas.
+
+    En un índice plano se reúnen una sola vez los vectores de la unión de candidatos
+    y se calculan todas las distancias en una única operación matricial. Los demás
+    índices no admiten un selector distinto por fila de consulta, así que se busca
+    consulta por consulta.
+
+    Parámetros:
+        index (faiss.Index): Índice FAISS del sistema.
+        query_embeddings (np.ndarray): Embeddings de las consultas (n x d, float32).
+        filas_por_consulta (list): Filas candidatas de cada consulta.
+        k (int): Número de vecinos a devolver por consulta.
+        config_indice (dict, opcional): Configuración del índice (nprobe, ef_search).
+
+    Retorna:
+        list: Por consulta, una tupla (distancias, filas) como la de buscar_en_candidatos().
+    """
+    if not isinstance(index, faiss.IndexFlat):
+        return [buscar_en_candidatos(index, query_embeddings[i:i + 1], filas, k, config_indice)
+                for i, filas in enumerate(filas_por_consulta)]
+
+    filas_por_consulta = [np.asarray(filas, dtype=np.int64) for filas in filas_por_consulta]
+    if not filas_por_consulta:
+        return []
+    union = np.unique(np.concatenate(filas_por_consulta))
+    if len(union) > MAX_FILAS_BLOQUE:
+        # Con particiones grandes la matriz de distancias no cabe de una vez
+        return [buscar_en_candidatos(index, query_embeddings[i:i + 1], filas, k, config_indice)
+                for i, filas in enumerate(filas_por_consulta)]
+    vectores = index.reconstruct_batch(union)
+    distancias = faiss.pairwise_distances(np.ascontiguousarray(query_embeddings, dtype='float32'),
+                                          vectores, metric=index.metric_type)
+    if index.metric_type == faiss.METRIC_L2:
+        # La expansión |x|² + |y|² - 2xy puede dar valores negativos muy pequeños
+        np.maximum(distancias, 0, out=distancias)
+
+    resultados = []
+    for i, filas in enumerate(filas_por_consulta):
+        k_consulta = min(k, len(filas))
+        if k_consulta == 0:
+            resultados.append((np.empty((1, 0), dtype=np.float32), np.empty((1, 0), dtype=np.int64)))
+            continue
+        columnas = np.searchsorted(union, filas)
+        fila_distancias = distancias[i, columnas]
+        # Orden estable: ante empates gana la fila que el prefiltro entregó primero, como en faiss.knn
+        if index.metric_type == faiss.METRIC_L2:
+            orden = np.argsort(fila_distancias, kind='stable')[:k_consulta]
+        else:
+            orden = np.argsort(-fila_distancias, kind='stable')[:k_consulta]
+        resultados.append((fila_distancias[orden][None, :], filas[orden][None, :]))
+    return resultados
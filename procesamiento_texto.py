@@ -0,0 +1,55 @@
+import re
+import unicodedata
+
+# ---------------- Funciones de procesamiento de texto ----------------
+
+def normalizar_texto(texto):
+    """
+    Normaliza el texto eliminando tildes, caracteres especiales y convirtiéndolo a minúsculas.
+    
+    Parámetros:
+        texto (str): Texto a normalizar.
+    
+    Retorna:
+        str: Texto normalizado.
+    """
+    if not isinstance(texto, str):
+        return ""
+    texto = texto.lower()
+    texto = ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+    texto = re.sub(r'[^\w\s]', ' ', texto)
+    texto = re.sub(r'\s+', ' ', texto)
+    return texto.strip()
+
+# ---------------- Función para verificar nombres de candidatos ----------------
+
+def es_nombre_presidente(query, presidente):
+    """
+    Verifica si el nombre en la consulta coincide con el nombre de un candidato.
+    
+    Parámetros:
+        query (str): Consulta del usuario.
+        presidente (str): Nombre del candidato.
+    
+    Retorna:
+        bool: True si el nombre coincide, False en caso contrario.
+    """
+    return coincide_nombre_normalizado(normalizar_texto(query), normalizar_texto(presidente))
+
+
+def coincide_nombre_normalizado(query_norm, presidente_norm, query_words=None):
+    """
+    Igual que es_nombre_presidente() para textos ya normalizados, sin volver a normalizarlos.
+
+    Parámetros:
+        query_norm (str): Consulta normalizada.
+        presidente_norm (str): Nombre del candidato normalizado.
+        query_words (set, opcional): Palabras de la consulta, si ya se calcularon.
+
+    Retorna:
+        bool: True si el nombre coincide, False en caso contrario.
+    """
+    if query_words is None:
+        query_words = set(query_norm.split())
+    palabras_coincidentes = query_words.intersection(presidente_norm.split())
+    return query_norm in presidente_norm or presidente_norm in query_norm or len(palabras_coincidentes) >= 2
@@ -0,0 +1,208 @@
+import time
+
+import numpy as np
+
+from indices_metadata import _codificar_columna
+from procesamiento_texto import coincide_nombre_normalizado, normalizar_texto, es_nombre_presidente
+
+PESOS_TIPO = {'plan': 1.3, 'entrevista': 1.2, 'biografia': 1.0}
+PESOS_FACTORES = {'palabras_clave': 0.35, 'exactitud': 0.25, 'tipo_doc': 0.20, 'posicion': 0.15, 'longitud': 0.05}
+
+# ---------------- Cálculo de relevancia de documentos ----------------
+
+def calcular_relevancia(query, texto, meta):
+    """
+    Calcula un puntaje de relevancia basado en la coincidencia de palabras clave,
+    el tipo de documento, la exactitud y la posición de las palabras clave.
+    
+    Parámetros:
+        query (str): Consulta del usuario.
+        texto (str): Texto del documento.
+        meta (dict): Metadata del documento.
+    
+    Retorna:
+        float: Puntaje de relevancia del documento.
+    """
+    factores = {'palabras_clave': 0, 'exactitud': 0, 'tipo_doc': 0, 'posicion': 0, 'longitud': 0}
+    texto_norm = normalizar_texto(texto)
+    query_norm = normalizar_texto(query)
+    query_words = set(query_norm.split())
+    palabras_encontradas = sum(1 for word in query_words if word in texto_norm)
+    factores['palabras_clave'] = palabras_encontradas / len(query_words) if query_words else 0
+
+    # Verificar coincidencia exacta
+    if query_norm in texto_norm:
+        factores['exactitud'] = 1.0
+
+    # Pesos por tipo de documento
+    peso_base = PESOS_TIPO.get(meta.get('tipo', ''), 1.0)
+
+    # Ajuste para biografías con coincidencia de nombre
+    if meta.get('tipo') == 'biografia' and es_nombre_presidente(query, meta.get('presidente', '')):
+        peso_base *= 2.5
+        factores['exactitud'] = 1.0
+
+    factores['tipo_doc'] = peso_base
+
+    # Posición de las palabras clave
+    primera_aparicion = min((texto_norm.find(word) for word in query_words if word in texto_norm), default=len(texto_norm))
+    factores['posicion'] = 1.0 - (primera_aparicion / len(texto_norm))
+
+    # Factor de longitud
+    palabras_texto = len(texto.split())
+    factores['longitud'] = 1.0 if 10 <= palabras_texto <= 50 else 0.8
+
+    # Pesos finales
+    puntaje = sum(factor * PESOS_FACTORES[nombre] for nombre, factor in factores.items())
+    return puntaje
+
+# ---------------- Relevancia vectorizada con datos precalculados ----------------
+
+def precalcular_textos(metadata):
+    """
+    Calcula los datos por documento que usa la relevancia vectorizada.
+
+    Parámetros:
+        metadata (list | MetadataColumnar): Metadata del sistema de búsqueda.
+
+    Retorna:
+        tuple: (lista de textos normalizados, arreglo con el número de palabras de cada texto).
+    """
+    textos_normalizados = []
+    num_palabras = np.zeros(len(metadata), dtype=np.int32)
+    for fila, meta in enumerate(metadata):
+        texto = meta['texto_original']
+        textos_normalizados.append(normalizar_texto(texto))
+        num_palabras[fila] = len(texto.split())
+    return textos_normalizados, num_palabras
+
+
+class RelevanciaPrecalculada:
+    """
+    Calcula el mismo puntaje que calcular_relevancia() para muchos documentos a la vez,
+    usando el texto normalizado, el número de palabras y el tipo de cada documento
+    guardados al construir o cargar el índice.
+    """
+
+    def __init__(self, metadata, indices, textos_normalizados=None, num_palabras=None):
+        """
+        Parámetros:
+            metadata (list | MetadataColumnar): Metadata del sistema de búsqueda.
+            indices (IndicesMetadata): Índices con el código de candidato de cada fila.
+            textos_normalizados (Sequence, opcional): Textos normalizados guardados en el índice.
+            num_palabras (np.ndarray, opcional): Número de palabras guardado en el índice.
+        """
+        if textos_normalizados is None or num_palabras is None:
+            textos_normalizados, num_palabras = precalcular_textos(metadata)
+        self.textos_normalizados = textos_normalizados
+        self.num_palabras = np.asarray(num_palabras)
+        self.indices = indices
+
+        codigos, tipos = _codificar_columna(metadata, 'tipo')
+        pesos = np.array([PESOS_TIPO.get(tipo, 1.0) for tipo in tipos] + [1.0], dtype=np.float64)
+        self.peso_tipo = pesos[codigos]
+        self.es_biografia = np.array([tipo == 'biografia' for tipo in tipos] + [False], dtype=bool)[codigos]
+
+    def puntuar(self, query, filas, query_norm=None, query_words=None):
+        """
+        Calcula la relevancia de la consulta para varias filas en una sola pasada.
+
+        Parámetros:
+            query (str): Consulta del usuario.
+            filas (array-like): Números de fila de los documentos candidatos.
+            query_norm (str, opcional): Consulta ya normalizada (la del plan de la consulta).
+            query_words (set, opcional): Palabras de la consulta normalizada.
+
+        Retorna:
+            np.ndarray: Puntaje de relevancia de cada fila, en el mismo orden.
+        """
+        filas = np.asarray(filas, dtype=np.int64)
+        if len(filas) == 0:
+            return np.zeros(0, dtype=np.float64)
+
+        if query_norm is None:
+            query_norm = normalizar_texto(query)
+        if query_words is None:
+            query_words = set(query_norm.split())
+        textos = np.array([self.textos_normalizados[i] for i in filas], dtype=str)
+        longitudes = np.char.str_len(textos)
+
+        # Palabras clave y primera aparición: búsqueda de subcadenas sobre todos los candidatos
+        encontradas = np.zeros(len(filas), dtype=np.int64)
+        primera_aparicion = longitudes.copy()
+        for word in query_words:
+            posiciones = np.char.find(textos, word)
+            presentes = posiciones >= 0
+            encontradas += presentes
+            primera_aparicion = np.where(presentes, np.minimum(primera_aparicion, posiciones), primera_aparicion)
+        palabras_clave = encontradas / len(query_words) if query_words else np.zeros(len(filas))
+
+        exactitud = (np.char.find(textos, query_norm) >= 0).astype(np.float64)
+
+        # El ajuste por nombre se evalúa una vez por candidato distinto, no por documento;
+        # los nombres de los índices ya están normalizados
+        coincide_nombre = np.array([coincide_nombre_normalizado(query_norm, nombre, query_words)
+                                    for nombre in self.indices.nombres + ['']], dtype=bool)
+        biografia_del_nombre = self.es_biografia[filas] & coincide_nombre[self.indices.codigo_nombre[filas]]
+        tipo_doc = np.where(biografia_del_nombre, self.peso_tipo[filas] * 2.5, self.peso_tipo[filas])
+        exactitud[biografia_del_nombre] = 1.0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            posicion = np.where(longitudes > 0, 1.0 - (primera_aparicion / longitudes), 0.0)
+
+        palabras_texto = self.num_palabras[filas]
+        longitud = np.where((palabras_texto >= 10) & (palabras_texto <= 50), 1.0, 0.8)
+
+        return (palabras_clave * PESOS_FACTORES['palabras_clave']
+                + exactitud * PESOS_FACTORES['exactitud']
+                + tipo_doc * PESOS_FACTORES['tipo_doc']
+                + posicion * PESOS_FACTORES['posicion']
+                + longitud * PESOS_FACTORES['longitud'])
+
+# ---------------- Benchmark de la relevancia ----------------
+
+def benchmark_relevancia(metadata, indices, query, num_candidatos=1000, repeticiones=5):
+    """
+    Compara calcular_relevancia() documento a documento con la versión vectorizada
+    y verifica que ambos puntajes coincidan.
+
+    Parámetros:
+        metadata (list | MetadataColumnar): Metadata del sistema de búsqueda.
+        indices (IndicesMetadata): Índices de la metadata.
+        query (str): Consulta de prueba.
+        num_candidatos (int): Número de documentos a puntuar.
+        repeticiones (int): Repeticiones de cada medición.
+
+    Retorna:
+        dict: Tiempos medios en ms y diferencia máxima entre ambos puntajes.
+    """
+    relevancia = RelevanciaPrecalculada(metadata, indices)
+    filas = np.arange(min(num_candidatos, len(metadata)))
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        referencia = np.array([calcular_relevancia(query, metadata[i]['texto_original'], metadata[i]) for i in filas])
+    por_documento = (time.perf_counter() - inicio) / repeticiones
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        vectorizada = relevancia.puntuar(query, filas)
+    por_lote = (time.perf_counter() - inicio) / repeticiones
+
+    return {
+        'candidatos': len(filas),
+        'por_documento_ms': por_documento * 1000,
+        'vectorizada_ms': por_lote * 1000,
+        'diferencia_maxima': float(np.max(np.abs(referencia - vectorizada))) if len(filas) else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    from motor_busqueda import cargar_sistema
+
+    sistema = cargar_sistema(sys.argv[1] if len(sys.argv) > 1 else 'sistema_busqueda.pkl')
+    for consulta in ["quien es luisa gonzalez", "propuestas de seguridad", "reducción de impuestos"]:
+        r = benchmark_relevancia(sistema['metadata'], sistema['indices'], consulta)
+        print(f"{consulta!r}: {r['candidatos']} candidatos | por documento {r['por_documento_ms']:.2f} ms | "
+              f"vectorizada {r['vectorizada_ms']:.2f} ms | diferencia máxima {r['diferencia_maxima']:.2e}")
@@ -0,0 +1,475 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+
+DIRECTORIO_CACHE = 'transcripciones_cache'
+ARCHIVO_INFO = 'info.json'
+
+# Whisper trabaja con audio mono a 16 kHz
+FRECUENCIA_WHISPER = 16000
+DURACION_SEGMENTO = 300.0
+MARGEN_CORTE = 10.0
+
+# ---------------- Manifiesto de audios ----------------
+
+def manifiesto_desde_directorio(directorio='.', patron='entrevista_limpia_*.wav'):
+    """
+    Arma el manifiesto a partir de los audios limpios de las entrevistas,
+    con los mismos nombres de salida que usaba el notebook.
+
+    Parámetros:
+        directorio (str): Carpeta con los audios.
+        patron (str): Patrón de los archivos de audio.
+
+    Retorna:
+        pd.DataFrame: Columnas archivo_audio y archivo_transcripcion.
+    """
+    filas = []
+    for archivo in sorted(glob.glob(os.path.join(directorio, patron))):
+        base = os.path.splitext(os.path.basename(archivo))[0]
+        # entrevista_limpia_X.wav -> transcripcion_entrevista_X.txt
+        salida = "transcripcion_" + re.sub(r'^entrevista_limpia_', 'entrevista_', base) + ".txt"
+        filas.append({'archivo_audio': archivo, 'archivo_transcripcion': os.path.join(directorio, salida)})
+    return pd.DataFrame(filas, columns=['archivo_audio', 'archivo_transcripcion'])
+
+
+def cargar_manifiesto(ruta):
+    """Lee un manifiesto CSV con las columnas archivo_audio y archivo_transcripcion."""
+    manifiesto = pd.read_csv(ruta)
+    faltantes = {'archivo_audio', 'archivo_transcripcion'} - set(manifiesto.columns)
+    if faltantes:
+        raise ValueError(f"Al manifiesto le faltan las columnas: {', '.join(sorted(faltantes))}")
+    return manifiesto
+
+# ---------------- Audio y segmentación ----------------
+
+def hash_archivo(ruta, tamano_bloque=1 << 20):
+    """SHA-256 del contenido del archivo, leído por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def cargar_audio(ruta):
+    """
+    Carga un audio como señal mono float32 a 16 kHz, el formato que espera Whisper.
+
+    Los WAV se leen directamente; el resto de formatos se decodifica con ffmpeg
+    a través de whisper.load_audio.
+
+    Parámetros:
+        ruta (str): Ruta del archivo de audio.
+
+    Retorna:
+        np.ndarray: Señal en el rango [-1, 1].
+    """
+    if not ruta.lower().endswith('.wav'):
+        import whisper
+        return whisper.load_audio(ruta)
+
+    rate, data = wavfile.read(ruta)
+    if np.issubdtype(data.dtype, np.integer):
+        data = data.astype(np.float32) / np.iinfo(data.dtype).max
+    else:
+        data = data.astype(np.float32)
+
+    # Si el audio es estéreo, convertirlo a mono
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+
+    if rate != FRECUENCIA_WHISPER:
+        divisor = np.gcd(rate, FRECUENCIA_WHISPER)
+        data = resample_poly(data, FRECUENCIA_WHISPER // divisor, rate // divisor).astype(np.float32)
+    return data
+
+
+def puntos_de_corte(audio, duracion_segmento=DURACION_SEGMENTO, margen=MARGEN_CORTE, ventana=0.1):
+    """
+    Calcula dónde cortar el audio en segmentos de duración aproximada.
+
+    Cada corte se mueve al tramo de menor energía dentro de los últimos `margen`
+    segundos del segmento, para no partir palabras a la mitad.
+
+    Parámetros:
+        audio (np.ndarray): Señal mono a 16 kHz.
+        duracion_segmento (float): Duración máxima de cada segmento en segundos.
+        margen (float): Segundos antes del corte nominal donde se busca un silencio.
+        ventana (float): Duración de las ventanas de energía en segundos.
+
+    Retorna:
+        list: Muestras de inicio de cada segmento más el final del audio.
+    """
+    largo_segmento = int(duracion_segmento * FRECUENCIA_WHISPER)
+    largo_margen = min(int(margen * FRECUENCIA_WHISPER), largo_segmento // 2)
+    largo_ventana = max(1, int(ventana * FRECUENCIA_WHISPER))
+
+    cortes = [0]
+    while len(audio) - cortes[-1] > largo_segmento:
+        fin = cortes[-1] + largo_segmento
+        tramo = audio[fin - largo_margen:fin]
+        num_ventanas = len(tramo) // largo_ventana
+        if num_ventanas == 0:
+            cortes.append(fin)
+            continue
+        energia = np.square(tramo[:num_ventanas * largo_ventana].reshape(num_ventanas, largo_ventana)).mean(axis=1)
+        cortes.append(fin - largo_margen + int(np.argmin(energia)) * largo_ventana + largo_ventana // 2)
+    cortes.append(len(audio))
+    return cortes
+
+# ---------------- Tareas de los procesos de trabajo ----------------
+
+# Nombre de modelo de la verificación: los procesos usan TranscriptorPrueba en lugar de Whisper
+MODELO_PRUEBA = 'prueba'
+
+_modelo = None
+_idioma = None
+
+
+class TranscriptorPrueba:
+    """
+    Sustituto de Whisper para verificar la orquestación sin cargar un modelo:
+    en lugar del texto describe el segmento que recibe (duración y energía).
+    """
+
+    def transcribe(self, audio, language=None, fp16=False):
+        segundos = len(audio) / FRECUENCIA_WHISPER
+        texto = f"[{segundos:.2f} s, energía {float(np.square(audio).mean()):.5f}]"
+        return {'text': texto, 'segments': [{'start': 0.0, 'end': segundos, 'text': texto}]}
+
+
+def _iniciar_proceso(nombre_modelo, hilos_por_proceso, idioma):
+    global _modelo, _idioma
+    _idioma = idioma
+    if nombre_modelo == MODELO_PRUEBA:
+        _modelo = TranscriptorPrueba()
+        return
+    # Fijar los hilos antes de importar torch para que cada proceso use solo los suyos
+    for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[variable] = str(hilos_por_proceso)
+    import torch
+    import whisper
+
+    torch.set_num_threads(hilos_por_proceso)
+    _modelo = whisper.load_model(nombre_modelo)
+
+
+def transcribir_segmento(audio, inicio):
+    """
+    Transcribe un segmento con el modelo cargado en el proceso.
+
+    Parámetros:
+        audio (np.ndarray): Muestras del segmento.
+        inicio (float): Segundo del audio original donde empieza el segmento.
+
+    Retorna:
+        dict: Texto del segmento y sus frases con tiempos absolutos.
+    """
+    resultado = _modelo.transcribe(audio, language=_idioma, fp16=False)
+    return {
+        'texto': resultado["text"].strip(),
+        'frases': [
+            {'inicio': round(inicio + s['start'], 2), 'fin': round(inicio + s['end'], 2), 'texto': s['text'].strip()}
+            for s in resultado.get("segments", [])
+        ],
+    }
+
+# ---------------- Caché por segmento ----------------
+
+def _escribir_json(ruta, datos):
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def _ruta_segmento(directorio, indice):
+    return os.path.join(directorio, f"segmento_{indice:05d}.json")
+
+
+def _preparar_cache(directorio, config):
+    """
+    Devuelve la información guardada del audio si se generó con la misma
+    configuración; si no, descarta los segmentos anteriores.
+    """
+    ruta_info = os.path.join(directorio, ARCHIVO_INFO)
+    if os.path.exists(ruta_info):
+        with open(ruta_info, encoding='utf-8') as f:
+            info = json.load(f)
+        if info['config'] == config:
+            return info
+        shutil.rmtree(directorio)
+    os.makedirs(directorio, exist_ok=True)
+    return None
+
+
+def _unir_segmentos(directorio, num_segmentos):
+    textos = []
+    for i in range(num_segmentos):
+        with open(_ruta_segmento(directorio, i), encoding='utf-8') as f:
+            textos.append(json.load(f)['texto'])
+    return " ".join(texto for texto in textos if texto)
+
+# ---------------- Orquestación ----------------
+
+def transcribir_manifiesto(manifiesto, directorio_cache=DIRECTORIO_CACHE, nombre_modelo="small",
+                           max_procesos=2, hilos_por_proceso=2, duracion_segmento=DURACION_SEGMENTO,
+                           idioma='es'):
+    """
+    Transcribe todos los audios del manifiesto con un pool de procesos Whisper.
+
+    Cada audio se divide en segmentos que se reparten entre los procesos; cada
+    segmento transcrito se guarda en la caché apenas termina, así una ejecución
+    interrumpida continúa desde el último segmento completado. La caché se
+    indexa por el hash del audio, de modo que los audios ya transcritos con la
+    misma configuración no se vuelven a procesar.
+
+    Parámetros:
+        manifiesto (pd.DataFrame): Columnas archivo_audio y archivo_transcripcion.
+        directorio_cache (str): Carpeta de la caché de segmentos.
+        nombre_modelo (str): Modelo de Whisper ('tiny', 'base', 'small', 'medium' o 'large'),
+            o MODELO_PRUEBA para la verificación sin Whisper.
+        max_procesos (int): Procesos de transcripción, cada uno con su copia del modelo.
+        hilos_por_proceso (int): Hilos de torch por proceso.
+        duracion_segmento (float): Duración máxima de cada segmento en segundos.
+        idioma (str, opcional): Idioma del audio; None para que Whisper lo detecte.
+
+    Retorna:
+        pd.DataFrame: Resumen por archivo.
+    """
+    config = {'modelo': nombre_modelo, 'idioma': idioma, 'duracion_segmento': duracion_segmento}
+    os.makedirs(directorio_cache, exist_ok=True)
+    inicio = time.perf_counter()
+
+    # Un audio por hash: las filas del manifiesto con el mismo contenido comparten
+    # la caché y sus segmentos se transcriben una sola vez
+    audios, salidas, resumen = {}, [], []
+    for fila in manifiesto.itertuples(index=False):
+        if not os.path.exists(fila.archivo_audio):
+            print(f"× No se encuentra el archivo: {fila.archivo_audio}")
+            continue
+        hash_audio = hash_archivo(fila.archivo_audio)
+        salidas.append((fila.archivo_audio, fila.archivo_transcripcion, hash_audio))
+        if hash_audio in audios:
+            continue
+        directorio = os.path.join(directorio_cache, hash_audio)
+        info = _preparar_cache(directorio, config)
+        pendientes = None
+        if info is not None:
+            pendientes = [i for i in range(len(info['cortes']) - 1)
+                          if not os.path.exists(_ruta_segmento(directorio, i))]
+        audios[hash_audio] = {
+            'archivo': fila.archivo_audio,
+            'directorio': directorio,
+            'info': info,
+            # None: falta calcular los cortes, lo que requiere decodificar el audio
+            'pendientes': pendientes,
+        }
+
+    def tareas_pendientes():
+        # El audio se decodifica recién cuando se envía su primer segmento y se libera
+        # al pasar al siguiente: en memoria hay un solo audio más los segmentos en vuelo
+        for hash_audio, datos in audios.items():
+            if datos['pendientes'] == []:
+                continue
+            audio = cargar_audio(datos['archivo'])
+            if datos['info'] is None:
+                datos['info'] = {'config': config, 'audio': os.path.basename(datos['archivo']),
+                                 'cortes': puntos_de_corte(audio, duracion_segmento)}
+                _escribir_json(os.path.join(datos['directorio'], ARCHIVO_INFO), datos['info'])
+                datos['pendientes'] = list(range(len(datos['info']['cortes']) - 1))
+            cortes = datos['info']['cortes']
+            for i in datos['pendientes']:
+                # Copia del tramo para no enviar el audio completo a cada proceso
+                yield hash_audio, i, audio[cortes[i]:cortes[i + 1]].copy(), cortes[i] / FRECUENCIA_WHISPER
+            del audio
+
+    por_procesar = sum(1 for datos in audios.values() if datos['pendientes'] != [])
+    print(f"{len(salidas)} archivos, {len(audios)} audios distintos, {por_procesar} con segmentos por transcribir")
+
+    errores = set()
+    if por_procesar:
+        por_enviar = tareas_pendientes()
+        with ProcessPoolExecutor(max_workers=max_procesos, initializer=_iniciar_proceso,
+                                 initargs=(nombre_modelo, hilos_por_proceso, idioma)) as pool:
+            tareas, agotadas = {}, False
+            while not agotadas or tareas:
+                # Pocas tareas en vuelo para no acumular segmentos en memoria
+                while not agotadas and len(tareas) < 2 * max_procesos:
+                    siguiente = next(por_enviar, None)
+                    if siguiente is None:
+                        agotadas = True
+                        break
+                    hash_audio, i, segmento, segundo = siguiente
+                    tareas[pool.submit(transcribir_segmento, segmento, segundo)] = (hash_audio, i)
+                if not tareas:
+                    break
+                terminadas, _ = wait(tareas, return_when=FIRST_COMPLETED)
+                for tarea in terminadas:
+                    hash_audio, i = tareas.pop(tarea)
+                    datos = audios[hash_audio]
+                    nombre = os.path.basename(datos['archivo'])
+                    try:
+                        resultado = tarea.result()
+                    except Exception as e:
+                        print(f"× Error en {nombre}, segmento {i}: {str(e)}")
+                        errores.add(hash_audio)
+                        continue
+                    _escribir_json(_ruta_segmento(datos['directorio'], i), dict(resultado, indice=i))
+                    print(f"  ✓ {nombre}: segmento {i + 1}/{len(datos['info']['cortes']) - 1}")
+
+    for archivo, salida, hash_audio in salidas:
+        datos = audios[hash_audio]
+        num_segmentos = len(datos['info']['cortes']) - 1
+        fila = {
+            'Archivo_Audio': archivo,
+            'Archivo_Transcripcion': salida,
+            'Duracion_Segundos': datos['info']['cortes'][-1] / FRECUENCIA_WHISPER,
+            'Segmentos': num_segmentos,
+            'Transcritos': sum(os.path.exists(_ruta_segmento(datos['directorio'], i)) for i in datos['pendientes']),
+            'Omitido': not datos['pendientes'],
+            'Error': hash_audio in errores,
+        }
+        if hash_audio in errores:
+            # Los segmentos completados quedan en caché para la próxima ejecución
+            resumen.append(dict(fila, Num_Caracteres=0))
+            continue
+
+        texto_transcrito = _unir_segmentos(datos['directorio'], num_segmentos)
+        temporal = salida + '.tmp'
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(texto_transcrito)
+        os.replace(temporal, salida)
+        resumen.append(dict(fila, Num_Caracteres=len(texto_transcrito)))
+        print(f"✓ {salida}: {len(texto_transcrito):,} caracteres"
+              f"{' (desde caché)' if fila['Omitido'] else ''}")
+
+    print(f"\nTranscripción completada en {time.perf_counter() - inicio:.1f} s")
+    return pd.DataFrame(resumen)
+
+
+# ---------------- Verificación con audios generados ----------------
+
+# Silencios de los clips de prueba (segundos): los cortes deben caer dentro de ellos
+SILENCIOS_PRUEBA = [(7.2, 7.8), (15.7, 16.3)]
+
+
+def _clip_prueba(segundos, semilla, silencios=()):
+    # Ruido modulado como "voz" con tramos de silencio absoluto
+    generador = np.random.default_rng(semilla)
+    tiempo = np.arange(int(segundos * FRECUENCIA_WHISPER)) / FRECUENCIA_WHISPER
+    senal = 0.3 * generador.standard_normal(len(tiempo)) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * tiempo))
+    for inicio, fin in silencios:
+        senal[(tiempo >= inicio) & (tiempo < fin)] = 0
+    return (np.clip(senal, -1, 1) * 32767).astype(np.int16)
+
+
+def verificar_transcripcion(directorio, procesos=2):
+    """
+    Verifica la orquestación con clips WAV generados y TranscriptorPrueba en lugar
+    de Whisper: los cortes en silencios, la deduplicación por hash, la reanudación
+    desde la caché de segmentos y la omisión de audios ya transcritos.
+
+    Parámetros:
+        directorio (str): Carpeta vacía donde se escriben los clips, la caché y las salidas.
+        procesos (int): Procesos del pool.
+
+    Retorna:
+        list: Descripción de cada comprobación fallida; vacía si todo coincide.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    clips = {'a': _clip_prueba(25, 0, SILENCIOS_PRUEBA), 'c': _clip_prueba(12, 1)}
+    for nombre, datos in clips.items():
+        wavfile.write(os.path.join(directorio, f'{nombre}.wav'), FRECUENCIA_WHISPER, datos)
+    # Mismo contenido con otro nombre y la misma ruta dos veces: una sola transcripción
+    shutil.copy(os.path.join(directorio, 'a.wav'), os.path.join(directorio, 'b.wav'))
+    audios = ['a.wav', 'b.wav', 'c.wav', 'a.wav']
+    manifiesto = pd.DataFrame({
+        'archivo_audio': [os.path.join(directorio, audio) for audio in audios],
+        'archivo_transcripcion': [os.path.join(directorio, f'salida_{i}.txt') for i in range(len(audios))],
+    })
+    cache = os.path.join(directorio, 'cache')
+
+    def transcribir():
+        return transcribir_manifiesto(manifiesto, cache, MODELO_PRUEBA, procesos, 1, duracion_segmento=10)
+
+    def salidas():
+        textos = []
+        for ruta in manifiesto['archivo_transcripcion']:
+            with open(ruta, encoding='utf-8') as f:
+                textos.append(f.read())
+        return textos
+
+    fallos = []
+    primera = transcribir()
+    textos = salidas()
+    directorio_a = os.path.join(cache, hash_archivo(manifiesto['archivo_audio'][0]))
+    with open(os.path.join(directorio_a, ARCHIVO_INFO), encoding='utf-8') as f:
+        cortes = json.load(f)['cortes']
+    if len(cortes) != len(SILENCIOS_PRUEBA) + 2:
+        fallos.append(f"cortes del clip con silencios: {cortes}")
+    for corte, (inicio, fin) in zip(cortes[1:-1], SILENCIOS_PRUEBA):
+        if not inicio * FRECUENCIA_WHISPER <= corte < fin * FRECUENCIA_WHISPER:
+            fallos.append(f"el corte {corte / FRECUENCIA_WHISPER:.2f} s no cae en el silencio {inicio}-{fin} s")
+    if len(os.listdir(cache)) != 2:
+        fallos.append(f"{len(os.listdir(cache))} carpetas en la caché para 2 audios distintos")
+    if not (textos[0] == textos[1] == textos[3] != textos[2]) or not all(textos):
+        fallos.append("las salidas de un mismo audio difieren o falta alguna")
+    if primera['Error'].any() or primera['Omitido'].any():
+        fallos.append("la primera ejecución omitió audios o tuvo errores")
+
+    # Reanudación: se borra un segmento y solo ese se vuelve a transcribir
+    os.remove(_ruta_segmento(directorio_a, 1))
+    reanudada = transcribir()
+    if reanudada['Transcritos'].tolist() != [1, 1, 0, 1] or salidas() != textos:
+        fallos.append(f"reanudación: transcritos {reanudada['Transcritos'].tolist()}, "
+                      f"salidas {'iguales' if salidas() == textos else 'distintas'}")
+
+    # Sin cambios: todos los audios salen de la caché
+    omitida = transcribir()
+    if not omitida['Omitido'].all() or omitida['Transcritos'].any() or salidas() != textos:
+        fallos.append("una ejecución sin cambios volvió a transcribir segmentos")
+    return fallos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe en paralelo las entrevistas con Whisper, con caché por segmento")
+    parser.add_argument('--manifiesto', help="CSV con las columnas archivo_audio y archivo_transcripcion")
+    parser.add_argument('--directorio', default='.', help="Sin manifiesto, usa los entrevista_limpia_*.wav de esta carpeta")
+    parser.add_argument('--cache', default=DIRECTORIO_CACHE)
+    parser.add_argument('--modelo', default='small')
+    parser.add_argument('--procesos', type=int, default=2)
+    parser.add_argument('--hilos-por-proceso', type=int, default=2)
+    parser.add_argument('--duracion-segmento', type=float, default=DURACION_SEGMENTO, help="Segundos por segmento")
+    parser.add_argument('--idioma', default='es', help="Idioma del audio ('auto' para detectarlo)")
+    parser.add_argument('--verificar', action='store_true',
+                        help="Verifica cortes, caché, reanudación y deduplicación con clips generados, sin Whisper")
+    args = parser.parse_args()
+
+    if args.verificar:
+        import sys
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as temporal:
+            fallos = verificar_transcripcion(temporal, args.procesos)
+        for fallo in fallos:
+            print(f"❌ {fallo}")
+        print(f"\n{'✓ Verificación superada' if not fallos else f'❌ {len(fallos)} comprobaciones fallidas'}")
+        sys.exit(1 if fallos else 0)
+
+    manifiesto = cargar_manifiesto(args.manifiesto) if args.manifiesto else manifiesto_desde_directorio(args.directorio)
+    df = transcribir_manifiesto(manifiesto, args.cache, args.modelo, args.procesos, args.hilos_por_proceso,
+                                args.duracion_segmento, None if args.idioma == 'auto' else args.idioma)
+    print(df.to_string() if not df.empty else "No se encontraron audios")